@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
 
 application = get_asgi_application()
+
+# Cancels a request's remaining work when its client disconnects (imported once settings are configured)
+from fns.deadlines import CancelOnDisconnect  # noqa: E402
+
+application = CancelOnDisconnect(application)
@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 from dotenv import load_dotenv
 import os
+import sys
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -48,6 +49,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'fns.middleware.RequestMetricsMiddleware',
+    'fns.profiling.ProfilingMiddleware',
+    'fns.middleware.CompressionMiddleware',
+    'fns.deadlines.DeadlineMiddleware',
     'corsheaders.middleware.CorsMiddleware', 
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -136,4 +141,104 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 CORS_ALLOW_ALL_ORIGINS = True
 
 load_dotenv()
-GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
\ No newline at end of file
+GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
+# Per-process cache of Firestore resume reads (see fns/repository.py)
+RESUME_CACHE_TTL_SECONDS = float(os.environ.get("RESUME_CACHE_TTL_SECONDS", 30))
+RESUME_CACHE_MAX_ENTRIES = int(os.environ.get("RESUME_CACHE_MAX_ENTRIES", 512))
+
+# Every Nth stored resume version is a full snapshot; the rest are deltas (see fns/versioning.py)
+RESUME_SNAPSHOT_INTERVAL = int(os.environ.get("RESUME_SNAPSHOT_INTERVAL", 10))
+
+# Where documents are stored: 'firestore', 'django' (the DATABASES default, sqlite) or 'memory'.
+# The non-Firestore backends are for offline load tests and benchmarks (see fns/storage.py).
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "firestore")
+
+# Verified Firebase ID-token cache (see fns/decorators.py).
+# FIREBASE_REVOCATION_CHECK: 'never' (trust until exp), 'interval' or 'always'.
+FIREBASE_REVOCATION_CHECK = os.environ.get("FIREBASE_REVOCATION_CHECK", "never")
+FIREBASE_REVOCATION_INTERVAL = int(os.environ.get("FIREBASE_REVOCATION_INTERVAL", 300))
+FIREBASE_TOKEN_CACHE_SIZE = int(os.environ.get("FIREBASE_TOKEN_CACHE_SIZE", 10000))
+# Background refresh of the token-signing certificates, which cache misses are verified against.
+# Off under `manage.py test`, which must not poll Google.
+TESTING = sys.argv[1:2] == ['test']
+FIREBASE_CERT_REFRESH_ENABLED = os.environ.get(
+    "FIREBASE_CERT_REFRESH_ENABLED", "false" if TESTING else "true").lower() == "true"
+FIREBASE_CERT_REFRESH_SECONDS = int(os.environ.get("FIREBASE_CERT_REFRESH_SECONDS", 60))
+
+# Requests slower than this are logged with their per-stage breakdown (0 disables it)
+SLOW_REQUEST_MS = int(os.environ.get("SLOW_REQUEST_MS", 5000))
+# When set, /api/metrics/ requires "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+# On-demand cProfile/tracemalloc captures of selected requests (see fns/profiling.py).
+# Off by default; when off the middleware is dropped from the chain entirely.
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "false").lower() == "true"
+# Admin token: "X-Profile: <token>" selects a request, "Authorization: Bearer <token>" reads /api/profiles/
+PROFILING_TOKEN = os.environ.get("PROFILING_TOKEN", "")
+PROFILING_SAMPLE_RATE = float(os.environ.get("PROFILING_SAMPLE_RATE", 0))
+PROFILING_USER_IDS = [uid for uid in os.environ.get("PROFILING_USER_IDS", "").split(",") if uid]
+PROFILING_TRACE_MEMORY = os.environ.get("PROFILING_TRACE_MEMORY", "true").lower() == "true"
+PROFILING_TRACEMALLOC_FRAMES = int(os.environ.get("PROFILING_TRACEMALLOC_FRAMES", 1))
+PROFILING_DIR = os.environ.get("PROFILING_DIR", "")
+PROFILING_MAX_REPORTS = int(os.environ.get("PROFILING_MAX_REPORTS", 50))
+
+# Speculative cache warming on a user's first request of a session (see fns/prewarm.py)
+PREWARM_ENABLED = os.environ.get("PREWARM_ENABLED", "true").lower() == "true"
+PREWARM_RESUMES = int(os.environ.get("PREWARM_RESUMES", 3))
+# CPUs the warmers of all worker processes may keep busy together
+PREWARM_CPU_BUDGET = float(os.environ.get("PREWARM_CPU_BUDGET", 0.5))
+PREWARM_SESSION_IDLE_SECONDS = int(os.environ.get("PREWARM_SESSION_IDLE_SECONDS", 1800))
+PREWARM_QUEUE_SIZE = int(os.environ.get("PREWARM_QUEUE_SIZE", 100))
+
+# Default humanizer tier: 'full' (spaCy + synonym embeddings) or 'lite' (model-free rules, see
+# transformer/lite.py; nothing else is loaded). Tailor/refine requests can ask for 'lite' either way.
+HUMANIZER_TIER = os.environ.get("HUMANIZER_TIER", "full")
+# Synonym-scoring embeddings (see transformer/embeddings.py): 'fp32' or 'int8' (dynamically quantized).
+HUMANIZER_EMBEDDING_BACKEND = os.environ.get("HUMANIZER_EMBEDDING_BACKEND", "fp32")
+# Torch intra-op threads per process; 0 = this process's share of the CPU quota
+HUMANIZER_TORCH_THREADS = int(os.environ.get("HUMANIZER_TORCH_THREADS", 0))
+
+# PDF uploads (see fns/ingest.py)
+RESUME_UPLOAD_MAX_BYTES = int(os.environ.get("RESUME_UPLOAD_MAX_BYTES", 10 * 1024 * 1024))
+RESUME_UPLOAD_MAX_PAGES = int(os.environ.get("RESUME_UPLOAD_MAX_PAGES", 10))
+RESUME_EXTRACT_TIMEOUT_SECONDS = float(os.environ.get("RESUME_EXTRACT_TIMEOUT_SECONDS", 5))
+GEMINI_CONVERT_TIMEOUT_SECONDS = float(os.environ.get("GEMINI_CONVERT_TIMEOUT_SECONDS", 120))
+GEMINI_TAILOR_TIMEOUT_SECONDS = float(os.environ.get("GEMINI_TAILOR_TIMEOUT_SECONDS", 120))
+
+# Gemini context caches for the stable part of tailor/refine prompts (see fns/context_cache.py)
+GEMINI_CONTEXT_CACHE_TTL_SECONDS = int(os.environ.get("GEMINI_CONTEXT_CACHE_TTL_SECONDS", 900))
+GEMINI_CONTEXT_CACHE_MAX_ENTRIES = int(os.environ.get("GEMINI_CONTEXT_CACHE_MAX_ENTRIES", 256))
+
+# Compiled-PDF cache shared by downloads and exports (see fns/artifacts.py); defaults to a temp directory
+PDF_CACHE_DIR = os.environ.get("PDF_CACHE_DIR", "")
+PDF_CACHE_MAX_BYTES = int(os.environ.get("PDF_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+# Concurrent pdflatex processes per worker for bulk exports
+PDF_COMPILE_WORKERS = int(os.environ.get("PDF_COMPILE_WORKERS", 4))
+
+# Job-fit scoring (see fns/scoring.py): cached document vectors and per-user indexes per process
+SCORING_VECTOR_CACHE_SIZE = int(os.environ.get("SCORING_VECTOR_CACHE_SIZE", 20000))
+SCORING_MAX_INDEXED_USERS = int(os.environ.get("SCORING_MAX_INDEXED_USERS", 1000))
+
+# Text/JSON responses at least this large are gzip/brotli compressed (see fns/middleware.py)
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", 1024))
+
+# Each request's work is abandoned after this long, or as soon as an ASGI client disconnects (see fns/deadlines.py); 0 = no limit
+REQUEST_DEADLINE_SECONDS = float(os.environ.get("REQUEST_DEADLINE_SECONDS", 180))
+# Threads that blocking Gemini calls run on, so a cancelled request can return without waiting for them.
+# This caps concurrent Gemini calls per process; keep it above the server's threads per worker.
+CANCELLABLE_CALL_WORKERS = int(os.environ.get("CANCELLABLE_CALL_WORKERS", 32))
+
+# Fair-share scheduling of conversion, tailor, refine and compile work, per process (see fns/scheduler.py)
+SCHEDULER_CAPACITY = int(os.environ.get("SCHEDULER_CAPACITY", 4))
+# Per user: jobs running at once, and jobs running or queued before further ones get a 429
+SCHEDULER_USER_CONCURRENCY = int(os.environ.get("SCHEDULER_USER_CONCURRENCY", 2))
+SCHEDULER_USER_BURST = int(os.environ.get("SCHEDULER_USER_BURST", 6))
+# Per-user shares of capacity as "uid:weight,uid:weight" (e.g. "alice:2"); unlisted users weigh 1
+SCHEDULER_USER_WEIGHTS = {
+    uid.strip(): float(weight)
+    for uid, weight in (entry.split(":", 1) for entry in os.environ.get("SCHEDULER_USER_WEIGHTS", "").split(",") if ":" in entry)
+    if float(weight) > 0
+}
+
+# Rendered HTML previews kept per process, keyed by LaTeX content hash (see fns/preview.py)
+PREVIEW_CACHE_SIZE = int(os.environ.get("PREVIEW_CACHE_SIZE", 256))
@@ -11,11 +11,17 @@ class FnsConfig(AppConfig):
     name = 'fns'
 
     def ready(self):
-        if not firebase_admin._apps:
-            key_path = os.path.join(settings.BASE_DIR, 'serviceAccountKey.json')
+        key_path = os.path.join(settings.BASE_DIR, 'serviceAccountKey.json')
+        offline_storage = getattr(settings, 'STORAGE_BACKEND', 'firestore') != 'firestore'
+        if not firebase_admin._apps and offline_storage and not os.path.exists(key_path):
+            print(f"⚠️ No serviceAccountKey.json; running with '{settings.STORAGE_BACKEND}' storage and without Firebase.")
+        elif not firebase_admin._apps:
             cred = credentials.Certificate(key_path)
             firebase_admin.initialize_app(cred)
             print("🔥 Firebase App Initialized for Token Verification 🔥")
+        if getattr(settings, 'HUMANIZER_TIER', 'full') == 'lite':
+            # The lite humanizer doesn't use NLTK
+            return
         try:
             print("🧠 Downloading NLTK resources for Humanizer...")
             from transformer.app import download_nltk_resources
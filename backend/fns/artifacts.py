@@ -0,0 +1,147 @@
+# fns/artifacts.py
+"""
+Compiled-PDF cache and the shared compile pool.
+
+PDFs are stored on disk keyed by the SHA-256 of their LaTeX source, so an
+unchanged resume is compiled once no matter how often it is downloaded or
+exported, and forked workers on the same machine share the cache. The
+least recently used files are evicted once the directory grows past
+PDF_CACHE_MAX_BYTES.
+
+`compile_pool()` is a process-wide bounded thread pool (pdflatex runs as a
+subprocess, so threads are enough) that bulk exports submit to, which caps
+how many pdflatex processes one worker runs at a time.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from .metrics import register_collector
+
+
+class PdfCache:
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._size = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(latex_content):
+        return hashlib.sha256(latex_content.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.pdf')
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                data = f.read()
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        os.utime(self._path(key))  # mtime doubles as last use for eviction
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key, data):
+        os.makedirs(self.directory, exist_ok=True)
+        # Write then rename so concurrent readers never see a partial file
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, self._path(key))
+        with self._lock:
+            if self._size is None:
+                self._size = self._disk_usage()
+            else:
+                self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def get_or_compile(self, latex_content, compile_fn):
+        """Cached PDF bytes for `latex_content`, compiling with `compile_fn` on a miss. None if compilation fails."""
+        if not latex_content:
+            return None
+        key = self.key(latex_content)
+        data = self.get(key)
+        if data is None:
+            data = compile_fn(latex_content)
+            if data:
+                self.put(key, data)
+        return data
+
+    def _entries(self):
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        entries = []
+        for name in names:
+            if name.endswith('.pdf'):
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+        return entries
+
+    def _disk_usage(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        # Drop least recently used files until the cache is at 80% of its budget
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in entries:
+            if total <= self.max_bytes * 0.8:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+                total -= size
+            except OSError:
+                pass
+        self._size = total
+
+
+pdf_cache = PdfCache(
+    getattr(settings, 'PDF_CACHE_DIR', None) or os.path.join(tempfile.gettempdir(), 'hireinator-pdf-cache'),
+    getattr(settings, 'PDF_CACHE_MAX_BYTES', 256 * 1024 * 1024),
+)
+
+
+def _collect_pdf_cache_metrics():
+    return [
+        ('hireinator_pdf_cache_hits_total', 'counter', 'PDFs served from the compiled-PDF cache.', pdf_cache.hits),
+        ('hireinator_pdf_cache_misses_total', 'counter', 'PDFs that had to be compiled.', pdf_cache.misses),
+    ]
+
+
+register_collector(_collect_pdf_cache_metrics)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def compile_pool():
+    """The process-wide pool for background PDF compiles, created on first use (i.e. after fork)."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'PDF_COMPILE_WORKERS', 4),
+                    thread_name_prefix='pdflatex',
+                )
+    return _pool
@@ -0,0 +1,120 @@
+# fns/conditional.py
+"""
+Conditional and partial GET helpers for the single-resume endpoints.
+
+A resume's ETag is derived from the fields that determine every
+representation of it (contentHash, lastUpdated and resumeName) plus the
+representation kind, so a client's If-None-Match is checked from the same
+single read that would build the response, before any PDF is compiled.
+"""
+
+import hashlib
+import re
+
+from django.http import HttpResponse
+
+from . import repository
+
+# What a resume's ETag is computed from
+ETAG_FIELDS = ['userId', 'contentHash', 'lastUpdated', 'resumeName']
+
+# `first-[last]` or a `-suffix` length; at least one number is required
+RANGE_RE = re.compile(r'^bytes=(?:(\d+)-(\d*)|-(\d+))$')
+
+
+def with_etag_fields(fields):
+    """`fields` plus what resume_etag needs, for the full read."""
+    return list(dict.fromkeys(fields + ETAG_FIELDS))
+
+
+def resume_etag(kind, data):
+    """Strong ETag for one representation ('detail', 'tex', 'pdf') of a resume."""
+    content = data.get('contentHash')
+    if content is None and 'latexContent' in data:
+        content = repository.content_hash(data['latexContent'])
+    if content is None:
+        return None
+    last_updated = data.get('lastUpdated')
+    stamp = last_updated.isoformat() if hasattr(last_updated, 'isoformat') else str(last_updated)
+    digest = hashlib.sha256(f"{kind}|{content}|{stamp}|{data.get('resumeName', '')}".encode('utf-8'))
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def etag_matches(request, etag):
+    if not etag:
+        return False
+    header = request.headers.get('If-None-Match', '')
+    if header.strip() == '*':
+        return True
+    # Compression middleware may have weakened the tag the client saw
+    candidates = [tag.strip().removeprefix('W/') for tag in header.split(',')]
+    return etag in candidates
+
+
+def read_resume(request, user_uid, resume_id, kind, fields):
+    """
+    Reads an owned resume for a GET of its `kind` representation and returns
+    (data, etag, not_modified), where `not_modified` is a 304 response when
+    the request's If-None-Match still matches, else None. `fields` must
+    include ETAG_FIELDS (see with_etag_fields).
+
+    A conditional request reads storage directly: a copy another process's
+    write has outdated would answer 304 for a changed resume.
+    """
+    conditional = 'If-None-Match' in request.headers
+    data = repository.get_owned_resume(user_uid, resume_id, fields, fresh=conditional)
+    etag = resume_etag(kind, data)
+    if conditional and etag_matches(request, etag):
+        return data, etag, with_validators(HttpResponse(status=304), etag)
+    return data, etag, None
+
+
+def with_validators(response, etag):
+    if etag:
+        response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def ranged_response(request, body, content_type, etag=None):
+    """
+    Serves `body` whole (200) or, for a single `Range: bytes=` request, the
+    requested slice (206). Unsatisfiable ranges get 416; malformed and
+    multi-range requests and stale If-Range validators get the whole body.
+    """
+    total = len(body)
+    if_range = request.headers.get('If-Range')
+    byte_range = None
+    if if_range is None or if_range == etag:
+        byte_range = _parse_range(request.headers.get('Range', ''), total)
+
+    if byte_range is not None:
+        start, end = byte_range
+        if start >= total or end < start:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{total}'
+            response['Accept-Ranges'] = 'bytes'
+            return with_validators(response, etag)
+
+        response = HttpResponse(body[start:end + 1], content_type=content_type, status=206)
+        response['Content-Range'] = f'bytes {start}-{end}/{total}'
+    else:
+        response = HttpResponse(body, content_type=content_type)
+    response['Accept-Ranges'] = 'bytes'
+    return with_validators(response, etag)
+
+
+def _parse_range(header, total):
+    """(start, end) of a single `bytes=` range, end clamped to the body; None if there is no valid one."""
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if not match:
+        return None
+    first, last, suffix = match.groups()
+    if suffix is not None:
+        # The final N bytes; `-0` is unsatisfiable
+        start = max(0, total - int(suffix)) if int(suffix) else total
+        return start, total - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    return start, min(int(last), total - 1) if last else total - 1
@@ -0,0 +1,160 @@
+# fns/context_cache.py
+"""
+Reuse of the stable part of Gemini prompts through explicit context caches.
+
+A tailor or refine prompt is the fixed instruction block plus a resume, a
+job description and the user's instructions. Consecutive calls share most
+of that: a user tailoring one base resume to several jobs resends the same
+resume, and an editor session refining one draft resends the same job
+description. The stable part is registered once as a Gemini cached content
+(the instructions as its system instruction, the stable section as its
+contents) and later calls only send what changed, referencing the cache by
+name.
+
+Caches are keyed by the content hash of everything they hold, so an edited
+resume or job description gets a new cache; when a session's key changes
+its previous cache is deleted. Contexts Gemini refuses to cache (e.g. below
+the model's minimum size) are remembered for a while and sent inline.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from . import deadlines, metrics
+from .metrics import register_collector
+
+# Stop using a cache this long before it expires, so in-flight calls don't race the TTL
+EXPIRY_MARGIN_SECONDS = 30
+# HTTP timeout of a cache create or delete, capped by what is left of the request's deadline
+CACHE_REQUEST_TIMEOUT_SECONDS = 30
+
+
+def context_key(model, system_instruction, contents):
+    digest = hashlib.sha256(model.encode('utf-8'))
+    for part in [system_instruction, *contents]:
+        digest.update(b'\x00' + hashlib.sha256(part.encode('utf-8')).digest())
+    return digest.hexdigest()[:32]
+
+
+class ContextCache:
+
+    def __init__(self, ttl_seconds=900, max_entries=256):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+        self._entries = OrderedDict()   # key -> (cache name, expires_at)
+        self._refused = {}              # key -> retry after
+        self._sessions = {}             # session -> key
+        self._lock = threading.Lock()
+
+    def cached_content(self, client, model, system_instruction, contents, session=None):
+        """
+        The name of a cached content holding `system_instruction` and
+        `contents`, creating it on first use; None if Gemini won't cache it.
+        """
+        key = context_key(model, system_instruction, contents)
+        now = time.monotonic()
+        stale = []
+        with self._lock:
+            if session is not None:
+                previous = self._sessions.get(session)
+                self._sessions[session] = key
+                if len(self._sessions) > self.max_entries * 4:
+                    self._sessions.pop(next(iter(self._sessions)))
+                # The session moved on to new content; drop its old cache unless another session uses it
+                if previous not in (None, key) and previous not in self._sessions.values():
+                    stale.append(self._entries.pop(previous, (None, 0))[0])
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] - EXPIRY_MARGIN_SECONDS > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                cached_name = entry[0]
+            else:
+                cached_name = None
+            refused = self._refused.get(key, 0) > now
+        self._delete(client, stale)
+        if cached_name is not None or refused:
+            return cached_name
+
+        try:
+            cache = deadlines.call(client.caches.create, model=model, config={
+                'system_instruction': system_instruction,
+                'contents': contents,
+                'ttl': f'{int(self.ttl_seconds)}s',
+                'display_name': f'hireinator-{key[:12]}',
+                'http_options': {'timeout': deadlines.timeout_ms(CACHE_REQUEST_TIMEOUT_SECONDS)},
+            })
+        except Exception as e:
+            print(f"⚠️ Gemini context cache unavailable, sending the prompt inline: {e}")
+            with self._lock:
+                self.failures += 1
+                self._refused[key] = time.monotonic() + self.ttl_seconds
+                if len(self._refused) > self.max_entries:
+                    self._refused = {k: t for k, t in self._refused.items() if t > time.monotonic()}
+            return None
+
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = (cache.name, now + self.ttl_seconds)
+            while len(self._entries) > self.max_entries:
+                stale.append(self._entries.popitem(last=False)[1][0])
+        self._delete(client, stale)
+        return cache.name
+
+    def invalidate(self, client, name):
+        """Forgets a cache Gemini no longer recognises (expired or deleted elsewhere)."""
+        with self._lock:
+            for key, (entry_name, _) in list(self._entries.items()):
+                if entry_name == name:
+                    del self._entries[key]
+        self._delete(client, [name])
+
+    @staticmethod
+    def _delete(client, names):
+        for name in names:
+            if not name:
+                continue
+            try:
+                deadlines.call(client.caches.delete, name=name, config={
+                    'http_options': {'timeout': deadlines.timeout_ms(CACHE_REQUEST_TIMEOUT_SECONDS)},
+                })
+            except Exception as e:
+                # It expires by itself anyway
+                print(f"⚠️ Could not delete Gemini context cache {name}: {e}")
+
+
+context_cache = ContextCache(
+    ttl_seconds=getattr(settings, 'GEMINI_CONTEXT_CACHE_TTL_SECONDS', 900),
+    max_entries=getattr(settings, 'GEMINI_CONTEXT_CACHE_MAX_ENTRIES', 256),
+)
+
+
+def record_usage(response):
+    """Counts a response's prompt tokens, split into those served from a context cache and the rest."""
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is None:
+        return
+    prompt = getattr(usage, 'prompt_token_count', None) or 0
+    cached = getattr(usage, 'cached_content_token_count', None) or 0
+    metrics.GEMINI_PROMPT_TOKENS.inc('true', amount=cached)
+    metrics.GEMINI_PROMPT_TOKENS.inc('false', amount=max(0, prompt - cached))
+
+
+def _collect_context_cache_metrics():
+    return [
+        ('hireinator_gemini_context_cache_hits_total', 'counter', 'Gemini calls that reused a context cache.',
+         context_cache.hits),
+        ('hireinator_gemini_context_cache_created_total', 'counter', 'Gemini context caches created.',
+         context_cache.misses),
+        ('hireinator_gemini_context_cache_failures_total', 'counter',
+         'Contexts Gemini refused to cache (sent inline instead).', context_cache.failures),
+    ]
+
+
+register_collector(_collect_context_cache_metrics)
@@ -0,0 +1,256 @@
+# fns/deadlines.py
+"""
+Request deadlines and cooperative cancellation.
+
+Every request gets a Deadline (REQUEST_DEADLINE_SECONDS from its start) that
+the pipeline stages read through `current()`. Under ASGI, `CancelOnDisconnect`
+also cancels it as soon as the server reports that the client went away.
+Long stages cooperate instead of running to completion:
+
+- `checkpoint()` between units of work (e.g. humanized chunks) raises
+  RequestCancelled once the request is cancelled or out of time;
+- `call()` waits for a blocking call (a Gemini request) on a side pool and
+  gives up on it the moment the request is cancelled;
+- `run_process()` kills a subprocess (pdflatex) on cancellation or timeout.
+
+RequestCancelled derives from BaseException, like asyncio.CancelledError, so
+the views' `except Exception` handlers don't turn it into a 500 or carry on;
+DeadlineMiddleware turns it into the response.
+"""
+
+import contextvars
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.http import JsonResponse
+
+from . import metrics
+
+SCOPE_KEY = 'hireinator.deadline'
+
+
+class RequestCancelled(BaseException):
+    """The request was abandoned: `reason` is 'deadline' or 'disconnected'."""
+
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class Deadline:
+
+    def __init__(self, seconds=None):
+        self.expires_at = time.monotonic() + seconds if seconds else None
+        self.reason = None
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def remaining(self):
+        """Seconds left, or None when there is no time limit."""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def cancelled(self):
+        if not self._event.is_set() and self.expires_at is not None and time.monotonic() >= self.expires_at:
+            self.cancel('deadline')
+        return self._event.is_set()
+
+    def cancel(self, reason):
+        """Thread-safe; runs the registered callbacks once."""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"⚠️ Cancellation callback failed: {e}")
+
+    def check(self):
+        if self.cancelled:
+            raise RequestCancelled(self.reason)
+
+    def on_cancel(self, callback):
+        """Calls `callback` when the request is cancelled (now, if it already is); returns an unregister function."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._discard(callback)
+        callback()
+        return lambda: None
+
+    def _discard(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+
+_current = contextvars.ContextVar('hireinator_deadline', default=None)
+
+
+def current():
+    """The running request's Deadline, or None outside a request (management commands, export pool threads)."""
+    return _current.get()
+
+
+@contextmanager
+def running_under(deadline):
+    """Makes `deadline` current outside a request, so background work (fns/prewarm.py) can be cancelled the same way."""
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def checkpoint():
+    deadline = _current.get()
+    if deadline is not None:
+        deadline.check()
+
+
+def timeout_ms(default_seconds):
+    """An HTTP timeout for a downstream call: `default_seconds`, capped by what is left of the deadline."""
+    deadline = _current.get()
+    remaining = deadline.remaining() if deadline is not None else None
+    seconds = default_seconds if remaining is None else min(default_seconds, remaining)
+    return max(1, int(seconds * 1000))
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _side_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'CANCELLABLE_CALL_WORKERS', 32),
+                    thread_name_prefix='cancellable',
+                )
+    return _pool
+
+
+def call(fn, *args, **kwargs):
+    """
+    Runs a blocking call on a side pool and waits for it, returning early with
+    RequestCancelled when the request is cancelled. The abandoned call keeps
+    its pool thread until its own timeout (see timeout_ms) ends it.
+    """
+    deadline = _current.get()
+    if deadline is None:
+        return fn(*args, **kwargs)
+    deadline.check()
+    future = _side_pool().submit(fn, *args, **kwargs)
+    settled = threading.Event()
+    future.add_done_callback(lambda _: settled.set())
+    unregister = deadline.on_cancel(settled.set)
+    try:
+        settled.wait(deadline.remaining())
+    finally:
+        unregister()
+    if future.done():
+        return future.result()
+    future.cancel()
+    if not deadline.cancelled:
+        deadline.cancel('deadline')
+    raise RequestCancelled(deadline.reason)
+
+
+def run_process(command, **kwargs):
+    """
+    subprocess.run(command, capture_output=True, check=True, **kwargs), except
+    that the process is killed as soon as the request is cancelled or runs
+    out of time, and RequestCancelled is raised instead.
+    """
+    deadline = _current.get()
+    if deadline is None:
+        return subprocess.run(command, capture_output=True, check=True, **kwargs)
+    deadline.check()
+    with subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, **kwargs) as process:
+        unregister = deadline.on_cancel(process.kill)
+        try:
+            stdout, stderr = process.communicate(timeout=deadline.remaining())
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            deadline.cancel('deadline')
+        finally:
+            unregister()
+    deadline.check()
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, command, stdout, stderr)
+    return subprocess.CompletedProcess(command, process.returncode, stdout, stderr)
+
+
+class DeadlineMiddleware:
+    """
+    Makes the request's Deadline current while the view runs and answers
+    requests that were cancelled: 504 past the deadline, 499 (nobody is
+    listening) after a disconnect.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.seconds = getattr(settings, 'REQUEST_DEADLINE_SECONDS', 0)
+
+    def __call__(self, request):
+        scope = getattr(request, 'scope', None) or {}
+        deadline = scope.get(SCOPE_KEY) or Deadline(self.seconds)
+        token = _current.set(deadline)
+        try:
+            return self.get_response(request)
+        except RequestCancelled as e:
+            if e.reason == 'deadline':
+                return JsonResponse({'error': 'The request took too long and was cancelled.'}, status=504)
+            return JsonResponse({'error': 'Client disconnected.'}, status=499)
+        finally:
+            _current.reset(token)
+            # Under ASGI a disconnect reaches here as the handler's CancelledError, so count from the deadline
+            if deadline.reason:
+                metrics.CANCELLED_REQUESTS.inc(deadline.reason)
+                print(f"🛑 Abandoned {request.method} {request.path}: {deadline.reason}")
+
+
+class CancelOnDisconnect:
+    """
+    ASGI wrapper that gives each HTTP request a Deadline (in the scope, for
+    DeadlineMiddleware) and cancels it when `http.disconnect` arrives, which
+    Django's handler listens for while the view runs.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        deadline = Deadline(getattr(settings, 'REQUEST_DEADLINE_SECONDS', 0))
+        response_complete = False
+
+        async def watched_receive():
+            message = await receive()
+            if message['type'] == 'http.disconnect' and not response_complete:
+                deadline.cancel('disconnected')
+            return message
+
+        async def watched_send(message):
+            nonlocal response_complete
+            if message['type'] == 'http.response.body' and not message.get('more_body', False):
+                response_complete = True
+            await send(message)
+
+        await self.app({**scope, SCOPE_KEY: deadline}, watched_receive, watched_send)
@@ -1,9 +1,257 @@
 # fns/decorators.py
 
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
 from functools import wraps
+
+import firebase_admin
+from django.conf import settings
 from django.http import JsonResponse
 from firebase_admin import auth
 
+from . import metrics, prewarm
+
+# How revocation is checked for tokens that are already cached:
+#   'never'    - a verified token is trusted until its `exp` (Firebase SDK default behaviour)
+#   'interval' - revocation is re-checked with Firebase at most every FIREBASE_REVOCATION_INTERVAL seconds
+#   'always'   - every request is fully verified with check_revoked=True (no caching)
+REVOCATION_CHECK = getattr(settings, 'FIREBASE_REVOCATION_CHECK', 'never')
+REVOCATION_INTERVAL = getattr(settings, 'FIREBASE_REVOCATION_INTERVAL', 300)
+CERT_REFRESH_ENABLED = getattr(settings, 'FIREBASE_CERT_REFRESH_ENABLED', True)
+CERT_REFRESH_SECONDS = getattr(settings, 'FIREBASE_CERT_REFRESH_SECONDS', 60)
+# Google's published certificates for the keys Firebase ID tokens are signed with
+PUBLIC_CERTIFICATES_URL = 'https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com'
+TOKEN_ISSUER_PREFIX = 'https://securetoken.google.com/'
+# Fetched certificates older than this are not used; verification goes through the SDK instead
+CERT_MAX_AGE_SECONDS = 3600
+CERT_FETCH_TIMEOUT_SECONDS = 10
+# A failed refresh is retried after 5s, then 10s, 20s, ... up to this
+CERT_RETRY_SECONDS = 5
+MAX_CERT_RETRY_SECONDS = 900
+
+
+class VerifiedTokenCache:
+    """
+    Decoded ID tokens keyed by a SHA-256 of the raw token, each kept until
+    the token's own `exp`. The raw token itself is never stored.
+    """
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(id_token):
+        return hashlib.sha256(id_token.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Returns (decoded_token, verified_at) or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                decoded, verified_at = entry
+                if decoded.get('exp', 0) > time.time():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def peek(self, key):
+        """The decoded token if it is cached and unexpired, without counting a lookup or checking revocation."""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[0].get('exp', 0) > time.time():
+            return entry[0]
+        return None
+
+    def put(self, key, decoded):
+        with self._lock:
+            self._entries[key] = (decoded, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+token_cache = VerifiedTokenCache(getattr(settings, 'FIREBASE_TOKEN_CACHE_SIZE', 10000))
+
+
+def _collect_token_metrics():
+    stats = token_cache.stats()
+    fetched_at = public_certificates['fetched_at']
+    return [
+        ('hireinator_token_cache_hits_total', 'counter', 'ID tokens served from the verified-token cache.', stats['hits']),
+        ('hireinator_token_cache_misses_total', 'counter', 'ID tokens verified with Firebase.', stats['misses']),
+        ('hireinator_token_cache_entries', 'gauge', 'Verified tokens currently cached.', stats['size']),
+        ('hireinator_firebase_cert_age_seconds', 'gauge', 'Seconds since the signing certificates were last fetched.',
+         time.time() - fetched_at if fetched_at else -1),
+        ('hireinator_firebase_cert_refresh_failures_total', 'counter', 'Failed signing-certificate refreshes.',
+         public_certificates['failures']),
+    ]
+
+
+metrics.register_collector(_collect_token_metrics)
+
+
+def verify_token(id_token):
+    """
+    Verifies a Firebase ID token, serving repeat tokens from the cache.
+    Raises the same firebase_admin.auth errors as auth.verify_id_token.
+    """
+    _start_cert_refresher()
+
+    if REVOCATION_CHECK == 'always':
+        return _verify_id_token(id_token, check_revoked=True)
+
+    key = token_cache.key(id_token)
+    entry = token_cache.get(key)
+    if entry is not None:
+        decoded, verified_at = entry
+        if REVOCATION_CHECK != 'interval' or time.time() - verified_at < REVOCATION_INTERVAL:
+            return decoded
+
+    decoded = _verify_id_token(id_token, check_revoked=REVOCATION_CHECK == 'interval')
+    token_cache.put(key, decoded)
+    return decoded
+
+
+def _verify_id_token(id_token, check_revoked=False):
+    """
+    Verifies a token against the background-refreshed certificates, so a
+    cache miss never waits on a key fetch. Falls back to auth.verify_id_token
+    when the certificates are missing or stale, don't hold the token's key
+    (a rotation the refresher hasn't seen yet), or no project id is known.
+    """
+    decoded = _verify_with_public_certificates(id_token)
+    if decoded is None:
+        return auth.verify_id_token(id_token, check_revoked=check_revoked)
+    if check_revoked:
+        _check_revoked(decoded)
+    return decoded
+
+
+def _project_id():
+    try:
+        return firebase_admin.get_app().project_id
+    except (AttributeError, ValueError):
+        return None
+
+
+def _verify_with_public_certificates(id_token):
+    """The decoded token, checked as the Firebase SDK checks it; None when it can't be verified locally."""
+    from google.auth import jwt
+
+    certs = public_certificates['certs']
+    project_id = _project_id()
+    if not certs or not project_id or time.time() - public_certificates['fetched_at'] > CERT_MAX_AGE_SECONDS:
+        return None
+    try:
+        header = jwt.decode_header(id_token)
+    except ValueError as e:
+        raise auth.InvalidIdTokenError(f'Malformed Firebase ID token: {e}', cause=e)
+    if header.get('kid') not in certs:
+        return None
+    if header.get('alg') != 'RS256':
+        raise auth.InvalidIdTokenError(f"Firebase ID token has incorrect algorithm {header.get('alg')!r}")
+    try:
+        claims = jwt.decode(id_token, certs=certs, audience=project_id)
+    except ValueError as e:
+        if 'expired' in str(e).lower():
+            raise auth.ExpiredIdTokenError('Firebase ID token has expired', e)
+        raise auth.InvalidIdTokenError(f'Invalid Firebase ID token: {e}', cause=e)
+
+    if claims.get('iss') != TOKEN_ISSUER_PREFIX + project_id:
+        raise auth.InvalidIdTokenError(f"Firebase ID token has incorrect issuer {claims.get('iss')!r}")
+    subject = claims.get('sub')
+    if not isinstance(subject, str) or not subject or len(subject) > 128:
+        raise auth.InvalidIdTokenError('Firebase ID token has an invalid subject')
+    if claims.get('auth_time', 0) > time.time():
+        raise auth.InvalidIdTokenError('Firebase ID token has an auth_time in the future')
+    claims['uid'] = subject
+    return claims
+
+
+def _check_revoked(decoded):
+    """The revocation check auth.verify_id_token(check_revoked=True) makes, for a locally verified token."""
+    user = auth.get_user(decoded['uid'])
+    if user.disabled:
+        raise auth.UserDisabledError('The user record is disabled.')
+    if user.tokens_valid_after_timestamp and decoded['iat'] * 1000 < user.tokens_valid_after_timestamp:
+        raise auth.RevokedIdTokenError('The Firebase ID token has been revoked.')
+
+
+# --- Background refresh of Google's public signing certificates ---
+
+_refresher_started = False
+_refresher_lock = threading.Lock()
+# The last certificates fetched ({key id: PEM}), when, and how many refreshes have failed
+public_certificates = {'certs': {}, 'fetched_at': 0.0, 'failures': 0}
+
+
+def _refresh_public_certificates(request):
+    """
+    Fetches the token-signing certificates from their public endpoint with a
+    google-auth transport. Verification reads them from
+    `public_certificates` (see _verify_id_token).
+    """
+    response = request(PUBLIC_CERTIFICATES_URL, method='GET', timeout=CERT_FETCH_TIMEOUT_SECONDS)
+    if response.status != 200:
+        raise RuntimeError(f"HTTP {response.status} from {PUBLIC_CERTIFICATES_URL}")
+    certs = json.loads(response.data)
+    public_certificates.update(certs=certs, fetched_at=time.time())
+    return certs
+
+
+def _refresh_once(request, failures):
+    """One refresh; returns (seconds until the next one, consecutive failures)."""
+    try:
+        _refresh_public_certificates(request)
+        return CERT_REFRESH_SECONDS, 0
+    except Exception as e:
+        failures += 1
+        public_certificates['failures'] += 1
+        delay = min(CERT_RETRY_SECONDS * 2 ** (failures - 1), MAX_CERT_RETRY_SECONDS)
+        print(f"⚠️ WARNING: Refreshing Firebase signing certificates failed ({failures} in a row), "
+              f"retrying in {delay}s: {e}")
+        return delay, failures
+
+
+def _refresh_loop():
+    import google.auth.transport.requests
+    request = google.auth.transport.requests.Request()
+    failures = 0
+    while True:
+        delay, failures = _refresh_once(request, failures)
+        time.sleep(delay)
+
+
+def _start_cert_refresher():
+    global _refresher_started
+    if _refresher_started or not CERT_REFRESH_ENABLED or CERT_REFRESH_SECONDS <= 0:
+        return
+    with _refresher_lock:
+        if not _refresher_started:
+            _refresher_started = True
+            threading.Thread(target=_refresh_loop, name='firebase-cert-refresh', daemon=True).start()
+
+
 def firebase_auth_required(f):
     @wraps(f)
     def decorated_function(request, *args, **kwargs):
@@ -11,27 +259,35 @@ def firebase_auth_required(f):
         auth_header = request.headers.get('Authorization')
         if not auth_header or not auth_header.startswith('Bearer '):
             return JsonResponse({'error': 'Authorization header missing or invalid'}, status=401)
-        
+
         id_token = auth_header.split(' ').pop()
 
         try:
-            # 2. Verify the token using the Firebase Admin SDK
-            decoded_token = auth.verify_id_token(id_token)
-            
+            # 2. Verify the token (repeat tokens are served from the verified-token cache)
+            with metrics.span('auth'):
+                decoded_token = verify_token(id_token)
+
             # 3. Add the decoded token (and user UID) to the request object
             #    so the view can access it.
             request.user_id = decoded_token['uid']
             request.firebase_user = decoded_token
 
-        except auth.InvalidIdTokenError:
-            return JsonResponse({'error': 'Invalid Firebase ID token'}, status=403)
         except auth.ExpiredIdTokenError:
             return JsonResponse({'error': 'Firebase ID token has expired'}, status=403)
+        except auth.RevokedIdTokenError:
+            return JsonResponse({'error': 'Firebase ID token has been revoked'}, status=403)
+        except auth.InvalidIdTokenError:
+            return JsonResponse({'error': 'Invalid Firebase ID token'}, status=403)
+        except auth.UserDisabledError:
+            return JsonResponse({'error': 'Firebase user account is disabled'}, status=403)
         except Exception as e:
             # Handle other potential errors during verification
             return JsonResponse({'error': f'An error occurred during token verification: {e}'}, status=500)
-        
-        # 4. If token is valid, call the original view function
+
+        # 4. The first request of a session warms the user's caches in the background
+        prewarm.prewarmer.note_request(request.user_id, decoded_token)
+
+        # 5. If token is valid, call the original view function
         return f(request, *args, **kwargs)
-    
-    return decorated_function
\ No newline at end of file
+
+    return decorated_function
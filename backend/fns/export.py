@@ -0,0 +1,148 @@
+# fns/export.py
+"""
+Bulk export of a user's resumes as a ZIP archive, generated incrementally.
+
+The archive is written into a small buffer that is drained after every
+entry, so a StreamingHttpResponse can send it while later PDFs are still
+compiling and the whole archive is never in memory. All .tex entries come
+first; PDFs follow in the order their compiles finish. At most `window`
+compiles are in flight at a time and each PDF is dropped once written, so
+a slow reader holds back the compiles instead of piling up finished PDFs.
+
+A compile refused by the fair-share scheduler (fns/scheduler.py) because
+the user's burst quota is taken, e.g. by a refine in another tab, is
+retried once the quota has had time to free up; only resumes pdflatex
+can't compile are listed as failed.
+"""
+
+import re
+import subprocess
+import time
+import traceback
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from django.conf import settings
+
+from .artifacts import compile_pool, pdf_cache
+from .scheduler import QueueFull
+
+FORMATS = ('pdf', 'tex')
+
+
+class _ChunkSink:
+    """Write-only file object for ZipFile that hands out what was written so far."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        chunks, self._chunks = self._chunks, []
+        return b''.join(chunks)
+
+
+def archive_names(resumes):
+    """Maps resume_id -> a unique, filesystem-safe base name derived from resumeName."""
+    names, used = {}, set()
+    for resume_id, data in resumes:
+        base = re.sub(r'[^\w\- .]+', '_', data.get('resumeName') or 'resume').strip(' ._') or 'resume'
+        name = base[:80]
+        if name.lower() in used:
+            name = f"{base[:70]}-{resume_id[:8]}"
+        used.add(name.lower())
+        names[resume_id] = name
+    return names
+
+
+def _zip_info(filename, timestamp, compress):
+    info = zipfile.ZipInfo(filename, date_time=time.localtime(timestamp)[:6])
+    info.compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+    return info
+
+
+def stream_resume_archive(resumes, compile_fn, formats=FORMATS, window=None):
+    """
+    Yields the bytes of a ZIP holding each resume's .tex and/or compiled .pdf.
+    `resumes` is [(resume_id, data)] with at least latexContent and resumeName.
+    Resumes that fail to compile (`compile_fn` returns None or raises
+    CalledProcessError) are listed in export-errors.txt instead.
+    `window` caps the compiles in flight (default: the compile pool's size).
+    """
+    names = archive_names(resumes)
+    now = time.time()
+    sink = _ChunkSink()
+    window = max(1, window or getattr(settings, 'PDF_COMPILE_WORKERS', 4))
+    pending = iter(resumes if 'pdf' in formats else [])
+    futures = {}
+
+    def submit(resume_id, data):
+        futures[compile_pool().submit(pdf_cache.get_or_compile, data.get('latexContent', ''), compile_fn)] = \
+            (resume_id, data)
+
+    def submit_next():
+        for resume_id, data in pending:
+            submit(resume_id, data)
+            return
+
+    def next_pdf():
+        """(resume_id, PDF bytes or None if it doesn't compile), or None when a throttled compile was resubmitted."""
+        # Takes the finished future out of `futures`, so nothing holds its PDF once it is written
+        future = next(iter(wait(futures, return_when=FIRST_COMPLETED).done))
+        resume_id, data = futures.pop(future)
+        try:
+            pdf_bytes = future.result()
+        except QueueFull as e:
+            # Waited out here rather than on a compile-pool thread, which other users' exports share
+            time.sleep(e.retry_after)
+            submit(resume_id, data)
+            return None
+        except subprocess.CalledProcessError:
+            print(f"❌ Export compile failed for {resume_id}:\n{traceback.format_exc()}")
+            pdf_bytes = None
+        submit_next()
+        return resume_id, pdf_bytes
+
+    try:
+        with zipfile.ZipFile(sink, mode='w') as archive:
+            if 'tex' in formats:
+                for resume_id, data in resumes:
+                    archive.writestr(_zip_info(f"{names[resume_id]}.tex", now, compress=True),
+                                     data.get('latexContent', ''))
+                    yield sink.drain()
+
+            for _ in range(window):
+                submit_next()
+            failed = []
+            while futures:
+                result = next_pdf()
+                if result is None:
+                    continue
+                resume_id, pdf_bytes = result
+                if not pdf_bytes:
+                    failed.append(names[resume_id])
+                    continue
+                # PDFs are already compressed
+                archive.writestr(_zip_info(f"{names[resume_id]}.pdf", now, compress=False), pdf_bytes)
+                result = pdf_bytes = None
+                yield sink.drain()
+
+            if failed:
+                archive.writestr(_zip_info('export-errors.txt', now, compress=True),
+                                 "These resumes could not be compiled to PDF:\n" + "\n".join(sorted(failed)) + "\n")
+        yield sink.drain()
+    finally:
+        # The client went away (or we finished): don't compile what nobody will receive
+        for future in futures:
+            future.cancel()
@@ -0,0 +1,223 @@
+# fns/fakes.py
+"""
+Deterministic stand-ins for the external services the views call, used by the
+load-test harness (`manage.py loadtest`) and the test suite:
+
+- FakeGeminiClient: answers `client.models.generate_content(...)` with a canned
+  TailoredResumeResponse (or PDF-conversion result) after a configurable delay,
+  and keeps `client.caches` context caches so prompt-token savings show up.
+- stub_compile_latex_to_pdf_bytes: replaces the pdflatex subprocess.
+- fake_verify_token: accepts `loadtest-<uid>` bearer tokens without Firebase.
+"""
+
+import itertools
+import random
+import re
+import threading
+import time
+
+from firebase_admin import auth
+
+FAKE_TOKEN_PREFIX = 'loadtest-'
+
+SAMPLE_RESUME_TEX = r"""\documentclass{article}
+\usepackage[a4paper, margin=1in]{geometry}
+\begin{document}
+\section*{Jane Doe}
+jane@example.com | +1 555 0100
+
+\section*{Summary}
+Backend engineer with six years of experience building web services in Python.
+
+\section*{Experience}
+\textbf{Acme Corp} -- Senior Engineer
+\begin{itemize}
+  \item Built the billing pipeline that processes 2M invoices per month.
+  \item Cut p95 API latency by 40\% by moving hot reads to a cache.
+\end{itemize}
+
+\section*{Education}
+B.Sc. Computer Science, State University
+\end{document}
+"""
+
+
+def count_tokens(parts):
+    """Rough token count (about four characters per token), which is all the fake needs."""
+    if isinstance(parts, str):
+        parts = [parts]
+    return sum(len(part) for part in parts or [] if isinstance(part, str)) // 4
+
+
+class FakeUsage:
+    def __init__(self, prompt_token_count, cached_content_token_count):
+        self.prompt_token_count = prompt_token_count
+        self.cached_content_token_count = cached_content_token_count
+
+
+class FakeResponse:
+    def __init__(self, parsed, usage_metadata=None):
+        self.parsed = parsed
+        self.usage_metadata = usage_metadata
+
+
+class FakeCachedContent:
+    def __init__(self, name, token_count):
+        self.name = name
+        self.token_count = token_count
+
+
+class FakeCaches:
+    def __init__(self, client):
+        self._client = client
+        self._caches = {}
+        self._ids = itertools.count(1)
+
+    def create(self, model, config):
+        config = config or {}
+        token_count = count_tokens(config.get('system_instruction')) + count_tokens(config.get('contents'))
+        if token_count < self._client.min_cache_tokens:
+            raise ValueError(f"Cached content is too small: {token_count} < {self._client.min_cache_tokens} tokens")
+        cache = FakeCachedContent(f'cachedContents/fake-{next(self._ids)}', token_count)
+        with self._client._lock:
+            self._caches[cache.name] = cache
+        return cache
+
+    def get(self, name):
+        with self._client._lock:
+            cache = self._caches.get(name)
+        if cache is None:
+            raise ValueError(f"Cached content {name} not found")
+        return cache
+
+    def delete(self, name, config=None):
+        with self._client._lock:
+            self._caches.pop(name, None)
+
+    def __len__(self):
+        return len(self._caches)
+
+
+class FakeModels:
+    def __init__(self, client):
+        self._client = client
+
+    def generate_content(self, model, contents, config=None):
+        client = self._client
+        config = config or {}
+        cached_tokens = 0
+        if config.get('cached_content'):
+            cached_tokens = client.caches.get(config['cached_content']).token_count
+        uncached_tokens = count_tokens(contents) + count_tokens(config.get('system_instruction'))
+        with client._lock:
+            client.calls += 1
+            client.uncached_prompt_tokens += uncached_tokens
+            client.cached_prompt_tokens += cached_tokens
+            call_number = client.calls
+        delay = client.latency + client.token_latency * uncached_tokens
+        if delay:
+            jitter = delay * client.jitter
+            time.sleep(max(0.0, delay + random.uniform(-jitter, jitter)))
+        if client.failure_rate and random.random() < client.failure_rate:
+            raise RuntimeError(f"Fake Gemini failure on call {call_number}")
+
+        schema = config.get('response_schema')
+        usage = FakeUsage(uncached_tokens + cached_tokens, cached_tokens)
+        return FakeResponse(client.respond(schema, contents), usage)
+
+
+class FakeGeminiClient:
+    """
+    Mimics the parts of google.genai.Client the views use. Tailor requests get
+    a template with one placeholder per paragraph of the Summary and
+    Experience sections of SAMPLE_RESUME_TEX; anything else with a
+    `resume_tex` field (PDF conversion) gets the sample resume itself.
+    `token_latency` adds time per uncached prompt token, and contexts smaller
+    than `min_cache_tokens` can't be cached, as with the real API.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.2, failure_rate=0.0, token_latency=0.0, min_cache_tokens=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.token_latency = token_latency
+        self.min_cache_tokens = min_cache_tokens
+        self.calls = 0
+        self.uncached_prompt_tokens = 0
+        self.cached_prompt_tokens = 0
+        self._lock = threading.Lock()
+        self.models = FakeModels(self)
+        self.caches = FakeCaches(self)
+
+    def respond(self, schema, contents):
+        from .views import ContentChunk, TailoredResumeResponse
+
+        if schema is TailoredResumeResponse:
+            template, chunks = tailored_template(SAMPLE_RESUME_TEX)
+            return TailoredResumeResponse(
+                latex_template=template,
+                content_chunks=[ContentChunk(title=key, content=text) for key, text in chunks],
+            )
+        if schema is not None and 'resume_tex' in getattr(schema, 'model_fields', {}):
+            return schema(ai_response='Converted.', resume_tex=SAMPLE_RESUME_TEX)
+        raise ValueError(f"FakeGeminiClient has no canned response for schema {schema!r}")
+
+
+def tailored_template(latex):
+    """
+    Splits `latex` into a template and its content the way Gemini is asked to:
+    every `\\item` line and every plain paragraph line becomes a placeholder.
+    """
+    lines, chunks = [], []
+    for line in latex.splitlines():
+        item = re.match(r'^(\s*\\item\s+)(.+)$', line)
+        if item:
+            key = f'item_{len(chunks) + 1}'
+            chunks.append((key, item.group(2)))
+            lines.append(f'{item.group(1)}{{{key}}}')
+        elif line.strip() and not line.lstrip().startswith('\\') and len(line) > 40:
+            key = f'paragraph_{len(chunks) + 1}'
+            chunks.append((key, line.strip()))
+            lines.append(f'{{{key}}}')
+        else:
+            lines.append(line)
+    return '\n'.join(lines) + '\n', chunks
+
+
+# Smallest well-formed single-page PDF
+STUB_PDF_BYTES = (
+    b"%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n"
+    b"2 0 obj<</Type/Pages/Kids[3 0 R]/Count 1>>endobj\n"
+    b"3 0 obj<</Type/Page/Parent 2 0 R/MediaBox[0 0 612 792]>>endobj\n"
+    b"trailer<</Root 1 0 R>>\n%%EOF\n"
+)
+
+
+def make_stub_compiler(latency=0.0):
+    """Returns a drop-in for views.compile_latex_to_pdf_bytes that sleeps instead of running pdflatex."""
+    def stub_compile_latex_to_pdf_bytes(latex_content: str):
+        if latency:
+            time.sleep(latency)
+        if not latex_content:
+            return None
+        return STUB_PDF_BYTES
+    return stub_compile_latex_to_pdf_bytes
+
+
+def fake_token(uid):
+    return f'{FAKE_TOKEN_PREFIX}{uid}'
+
+
+def fake_verify_token(id_token):
+    """Drop-in for decorators.verify_token accepting only fake_token() values."""
+    if not id_token.startswith(FAKE_TOKEN_PREFIX):
+        raise auth.InvalidIdTokenError('Not a load-test token')
+    uid = id_token[len(FAKE_TOKEN_PREFIX):]
+    return {'uid': uid, 'exp': time.time() + 3600}
+
+
+class FakeHumanizer:
+    """Passthrough for AcademicTextHumanizer when spaCy/SentenceTransformer cost should be excluded."""
+
+    def humanize_text(self, text, use_passive=False, use_synonyms=False):
+        return text
@@ -0,0 +1,237 @@
+# fns/ingest.py
+"""
+PDF upload ingestion.
+
+Uploads are streamed to a temporary file (never held in memory whole) with
+the size limit enforced while streaming: a request whose Content-Length is
+already over the limit is refused before its body is read, and
+UploadLimitHandler stops reading one that turns out larger. The PDF's text layer is then
+extracted locally with pypdf, with light layout hints (headings, bullets,
+link targets), so the model gets a few KB of structured text instead of the
+binary PDF. Scanned or image-only PDFs, documents whose extraction fails or
+exceeds its time budget, and installs without pypdf fall back to sending
+the binary PDF.
+"""
+
+import os
+import re
+import statistics
+import time
+
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+
+from .metrics import span
+
+MAX_UPLOAD_BYTES = getattr(settings, 'RESUME_UPLOAD_MAX_BYTES', 10 * 1024 * 1024)
+MAX_PAGES = getattr(settings, 'RESUME_UPLOAD_MAX_PAGES', 10)
+EXTRACT_TIMEOUT_SECONDS = getattr(settings, 'RESUME_EXTRACT_TIMEOUT_SECONDS', 5.0)
+# Fewer extracted characters per page than this means there's no real text layer
+MIN_TEXT_CHARS_PER_PAGE = 200
+# Room for the multipart boundaries and the other form fields on top of the file
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+BULLET_RE = re.compile(r'^\s*[•●▪■◦‣∙·\-–—*]\s+')
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class InvalidPdf(Exception):
+    pass
+
+
+class ExtractionTimeout(Exception):
+    pass
+
+
+class UploadLimitHandler(FileUploadHandler):
+    """
+    Passes file data on to the next upload handler until more than
+    `max_bytes` have arrived, then stops reading the request body.
+    `exceeded` tells the view the files it got are incomplete.
+    """
+
+    def __init__(self, request=None, max_bytes=None):
+        super().__init__(request)
+        self.max_bytes = max_bytes or MAX_UPLOAD_BYTES
+        self.received = 0
+        self.exceeded = False
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_bytes:
+            self.exceeded = True
+            raise StopUpload(connection_reset=True)
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+
+def limit_upload(request, max_bytes=None):
+    """
+    Refuses the request from its Content-Length alone when that is over the
+    limit, and otherwise installs an UploadLimitHandler (returned) for the
+    body. Must run before request.FILES or request.POST is first used.
+    """
+    max_bytes = max_bytes or MAX_UPLOAD_BYTES
+    try:
+        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        content_length = 0
+    if content_length > max_bytes + MULTIPART_OVERHEAD_BYTES:
+        raise UploadTooLarge(f"Upload is {content_length} bytes; the limit is {max_bytes}.")
+    handler = UploadLimitHandler(request, max_bytes)
+    request.upload_handlers.insert(0, handler)
+    return handler
+
+
+class IngestedPdf:
+    """
+    A spooled upload. `text` is the structured text layer, or None when the
+    binary PDF at `path` has to be sent instead (`fallback_reason` says why).
+    """
+
+    def __init__(self, path, size, page_count=0, text=None, fallback_reason=None):
+        self.path = path
+        self.size = size
+        self.page_count = page_count
+        self.text = text
+        self.fallback_reason = fallback_reason
+
+    @property
+    def has_text(self):
+        return self.text is not None
+
+    def read_bytes(self):
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+
+def spool_upload(uploaded_file, directory, max_bytes=None):
+    """Writes the upload to `directory` chunk by chunk; returns (path, size)."""
+    max_bytes = max_bytes or MAX_UPLOAD_BYTES
+    if uploaded_file.size is not None and uploaded_file.size > max_bytes:
+        raise UploadTooLarge(f"Upload is {uploaded_file.size} bytes; the limit is {max_bytes}.")
+
+    path = os.path.join(directory, 'upload.pdf')
+    size = 0
+    with open(path, 'wb') as f:
+        for chunk in uploaded_file.chunks():
+            if size == 0 and not chunk.lstrip()[:5].startswith(b'%PDF-'):
+                raise InvalidPdf("The uploaded file is not a PDF.")
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge(f"Upload exceeds the {max_bytes} byte limit.")
+            f.write(chunk)
+    if size == 0:
+        raise InvalidPdf("The uploaded file is empty.")
+    return path, size
+
+
+def extract_structured_text(path, max_pages=None, timeout=None):
+    """
+    Returns (text, page_count, fallback_reason); text is None when the
+    binary PDF should be used instead.
+    """
+    max_pages = max_pages or MAX_PAGES
+    timeout = timeout or EXTRACT_TIMEOUT_SECONDS
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        return None, 0, 'pypdf is not installed'
+
+    deadline = time.perf_counter() + timeout
+    try:
+        reader = PdfReader(path)
+        if reader.is_encrypted:
+            reader.decrypt('')
+        page_count = len(reader.pages)
+    except Exception as e:
+        return None, 0, f'unreadable PDF ({type(e).__name__})'
+    if page_count > max_pages:
+        raise InvalidPdf(f"The PDF has {page_count} pages; at most {max_pages} are accepted.")
+
+    pages = []
+    total_chars = 0
+    for number, page in enumerate(reader.pages, start=1):
+        try:
+            page_text = _extract_page(page, deadline)
+        except ExtractionTimeout:
+            return None, page_count, f'text extraction exceeded {timeout:g}s'
+        except Exception as e:
+            return None, page_count, f'text extraction failed on page {number} ({type(e).__name__})'
+        total_chars += sum(1 for char in page_text if char.isalnum())
+        pages.append(f"[Page {number}]\n{page_text}")
+
+    if total_chars < MIN_TEXT_CHARS_PER_PAGE * max(1, page_count):
+        return None, page_count, 'no usable text layer (scanned or image-only PDF)'
+    return '\n\n'.join(pages), page_count, None
+
+
+def _extract_page(page, deadline):
+    # Font size and weight of every text run, to tell headings from body text
+    runs = []
+
+    def check_deadline(operator, operands, cm, tm):
+        # Called before every content-stream operator, so one slow page can't overrun the budget
+        if time.perf_counter() > deadline:
+            raise ExtractionTimeout()
+
+    def visit(text, cm, tm, font_dict, font_size):
+        text = text.strip()
+        if text:
+            scale = abs(tm[3]) * abs(cm[3]) or 1
+            base_font = str((font_dict or {}).get('/BaseFont', ''))
+            runs.append((text, font_size * scale, 'bold' in base_font.lower()))
+
+    check_deadline(None, None, None, None)
+    raw = page.extract_text(visitor_operand_before=check_deadline, visitor_text=visit) or ''
+
+    headings = set()
+    if runs:
+        body_size = statistics.median(size for _, size, _ in runs)
+        for text, size, bold in runs:
+            if len(text) <= 60 and (size >= body_size * 1.15 or (bold and text.isupper())):
+                headings.add(text)
+
+    lines = []
+    for line in raw.splitlines():
+        stripped = line.strip()
+        if not stripped:
+            continue
+        if stripped in headings or (stripped.isupper() and len(stripped) <= 40 and any(c.isalpha() for c in stripped)):
+            lines.append(f"## {stripped}")
+        elif BULLET_RE.match(line):
+            lines.append(f"- {BULLET_RE.sub('', line).strip()}")
+        else:
+            lines.append(re.sub(r'\s{2,}', '  ', stripped))
+
+    links = _link_targets(page)
+    if links:
+        lines.append("Links: " + ", ".join(links))
+    return '\n'.join(lines)
+
+
+def _link_targets(page):
+    links = []
+    for annotation in page.get('/Annots') or []:
+        try:
+            action = annotation.get_object().get('/A') or {}
+            uri = action.get('/URI')
+        except Exception:
+            continue
+        if uri and str(uri) not in links:
+            links.append(str(uri))
+    return links
+
+
+def ingest_pdf(uploaded_file, directory):
+    """Spools the upload into `directory` and extracts its text layer when it has one."""
+    with span('ingest.spool'):
+        path, size = spool_upload(uploaded_file, directory)
+    with span('ingest.extract'):
+        text, page_count, reason = extract_structured_text(path)
+    return IngestedPdf(path, size, page_count, text, reason)
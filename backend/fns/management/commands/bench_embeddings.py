@@ -0,0 +1,65 @@
+# fns/management/commands/bench_embeddings.py
+
+import multiprocessing
+
+from django.core.management.base import BaseCommand, CommandError
+
+SAMPLE_SENTENCES = [
+    "Built the billing pipeline that processes two million invoices per month.",
+    "Cut p95 API latency by forty percent by moving hot reads to a cache.",
+    "Led a team of five engineers through a migration to Kubernetes.",
+    "Designed an event-driven ingestion service in Python and Go.",
+    "Mentored junior developers and ran the weekly architecture review.",
+    "Improved test coverage from 40% to 85% across the core services.",
+    "Partnered with product managers to define the quarterly roadmap.",
+    "Reduced cloud spend by rightsizing compute and storage.",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks the humanizer's embedding backends: model load time, resident "
+        "memory and encode throughput (each backend in a fresh process), plus how "
+        "often the quantized model picks the same synonym as fp32."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backends', default='fp32,int8', help="Comma-separated backends to benchmark.")
+        parser.add_argument('--threads', type=int, default=0, help="Torch threads (0 = this process's CPU share).")
+        parser.add_argument('--repeat', type=int, default=5, help="Encode passes over the sample texts.")
+        parser.add_argument('--texts', type=int, default=256, help="Number of texts encoded per pass.")
+        parser.add_argument('--skip-parity', action='store_true', help="Don't run the synonym-parity check.")
+
+    def handle(self, *args, **options):
+        from transformer import embeddings
+
+        backends = [name.strip() for name in options['backends'].split(',') if name.strip()]
+        unknown = set(backends) - set(embeddings.BACKENDS)
+        if unknown:
+            raise CommandError(f"Unknown backend(s) {sorted(unknown)}; expected {embeddings.BACKENDS}.")
+
+        texts = [SAMPLE_SENTENCES[i % len(SAMPLE_SENTENCES)] for i in range(options['texts'])]
+        # 'spawn' so each backend's memory is measured from a clean interpreter
+        context = multiprocessing.get_context('spawn')
+        results = []
+        for backend in backends:
+            with context.Pool(1) as pool:
+                results.append(pool.apply(embeddings.benchmark_backend, (backend, texts), {
+                    'threads': options['threads'] or None, 'repeat': options['repeat'],
+                }))
+
+        self.stdout.write(f"{'backend':>8} {'threads':>8} {'load s':>8} {'model MB':>9} {'peak MB':>8} {'texts/s':>9}")
+        for result in results:
+            self.stdout.write(
+                f"{result['backend']:>8} {result['threads']:>8} {result['load_seconds']:>8.2f} "
+                f"{result['model_rss_mb']:>9.0f} {result['peak_rss_mb']:>8.0f} {result['texts_per_second']:>9.0f}"
+            )
+
+        if not options['skip_parity'] and 'int8' in backends:
+            reference = embeddings.load_sentence_model(backend='fp32')
+            quantized = embeddings.load_sentence_model(backend='int8')
+            agreement = embeddings.synonym_agreement(reference, quantized)
+            self.stdout.write(
+                f"\nSynonym choices agreeing with fp32: {agreement:.0%} "
+                f"of {len(embeddings.PARITY_PROBES)} probes"
+            )
@@ -0,0 +1,55 @@
+# fns/management/commands/bench_humanizer.py
+
+import multiprocessing
+
+from django.core.management.base import BaseCommand, CommandError
+
+from fns.fakes import SAMPLE_RESUME_TEX, tailored_template
+
+SAMPLE_CHUNKS = [
+    "Backend engineer with six years of experience building web services in Python. I've led teams that "
+    "didn't just ship features but also kept them fast and easy to operate.",
+    "Built the billing pipeline that processes two million invoices per month. It's still the main source "
+    "of revenue reporting.",
+    "Cut p95 API latency by forty percent by moving hot reads to a cache, which helped the team hit its SLOs.",
+    "Set up the CI pipeline and used it to check every change against the integration suite.",
+    "Mentored junior developers and ran the weekly architecture review; we'd often use it to fix design issues early.",
+    "Improved test coverage from 40\\% to 85\\% across the core services \\& tooling.",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks the 'full' and 'lite' humanizer tiers on the same resume chunks: "
+        "load time, resident memory and per-chunk latency (each tier in a fresh process)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tiers', default='full,lite', help="Comma-separated tiers to benchmark.")
+        parser.add_argument('--repeat', type=int, default=3, help="Passes over the sample chunks.")
+        parser.add_argument('--texts', type=int, default=64, help="Number of chunks per pass.")
+
+    def handle(self, *args, **options):
+        from transformer import lite
+
+        tiers = [name.strip() for name in options['tiers'].split(',') if name.strip()]
+        unknown = set(tiers) - set(lite.TIERS)
+        if unknown:
+            raise CommandError(f"Unknown tier(s) {sorted(unknown)}; expected {lite.TIERS}.")
+
+        pool_texts = SAMPLE_CHUNKS + [text for _, text in tailored_template(SAMPLE_RESUME_TEX)[1]]
+        texts = [pool_texts[i % len(pool_texts)] for i in range(options['texts'])]
+        # 'spawn' so each tier's memory is measured from a clean interpreter
+        context = multiprocessing.get_context('spawn')
+        results = []
+        for tier in tiers:
+            with context.Pool(1) as pool:
+                results.append(pool.apply(lite.benchmark_tier, (tier, texts), {'repeat': options['repeat']}))
+
+        self.stdout.write(f"{'tier':>6} {'load s':>8} {'model MB':>9} {'peak MB':>8} {'mean ms':>8} {'p95 ms':>8} {'texts/s':>9}")
+        for result in results:
+            self.stdout.write(
+                f"{result['tier']:>6} {result['load_seconds']:>8.2f} {result['model_rss_mb']:>9.0f} "
+                f"{result['peak_rss_mb']:>8.0f} {result['mean_ms']:>8.2f} {result['p95_ms']:>8.2f} "
+                f"{result['texts_per_second']:>9.0f}"
+            )
@@ -0,0 +1,74 @@
+# fns/management/commands/bench_versions.py
+
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from fns import versioning
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks the resume version-history format: compression ratio and "
+        "reconstruction cost. Versions are taken from .tex files (in the order "
+        "given) or from a user's resumes in Firestore (oldest first)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('tex_files', nargs='*', help="Successive versions of a resume, as .tex files.")
+        parser.add_argument('--user', help="Use every resume of this Firestore user as the version chain.")
+        parser.add_argument('--interval', type=int, default=versioning.DEFAULT_SNAPSHOT_INTERVAL,
+                            help="Snapshot interval to benchmark.")
+        parser.add_argument('--repeat', type=int, default=20, help="Timing repetitions per version.")
+
+    def handle(self, *args, **options):
+        texts = self._load_texts(options)
+        if len(texts) < 2:
+            raise CommandError("Need at least two versions to benchmark.")
+        interval = options['interval']
+
+        started = time.perf_counter()
+        entries = []
+        previous = None
+        for version, text in enumerate(texts):
+            entries.append(versioning.build_entry(version, text, previous, interval))
+            previous = text
+        encode_ms = (time.perf_counter() - started) * 1000
+
+        raw_bytes = sum(entry['textBytes'] for entry in entries)
+        stored_bytes = sum(entry['storedBytes'] for entry in entries)
+        full_zlib_bytes = sum(len(versioning.compress_text(text)) for text in texts)
+        snapshots = sum(1 for entry in entries if entry['kind'] == versioning.SNAPSHOT)
+
+        rebuild_ms = []
+        for version, text in enumerate(texts):
+            chain = [entries[number] for number in versioning.chain_for(version, interval)]
+            if versioning.reconstruct(chain) != text:
+                raise CommandError(f"Version {version} did not round-trip.")
+            started = time.perf_counter()
+            for _ in range(options['repeat']):
+                versioning.reconstruct(chain)
+            rebuild_ms.append((time.perf_counter() - started) * 1000 / options['repeat'])
+
+        self.stdout.write(f"Versions:               {len(texts)} ({snapshots} snapshots, interval {interval})")
+        self.stdout.write(f"Raw LaTeX:              {raw_bytes:,} bytes")
+        self.stdout.write(f"Full copy, zlib each:   {full_zlib_bytes:,} bytes ({raw_bytes / full_zlib_bytes:.1f}x)")
+        self.stdout.write(f"Snapshot + deltas:      {stored_bytes:,} bytes ({raw_bytes / stored_bytes:.1f}x)")
+        self.stdout.write(f"Encode all versions:    {encode_ms:.1f} ms")
+        self.stdout.write(
+            f"Reconstruct one version: mean {statistics.mean(rebuild_ms):.3f} ms, "
+            f"max {max(rebuild_ms):.3f} ms"
+        )
+
+    def _load_texts(self, options):
+        if options['user']:
+            from fns import repository
+            resumes = repository.list_user_resumes(options['user'], ['latexContent'])
+            return [data.get('latexContent', '') for _, data in reversed(resumes)]
+
+        texts = []
+        for path in options['tex_files']:
+            with open(path, encoding='utf-8') as f:
+                texts.append(f.read())
+        return texts
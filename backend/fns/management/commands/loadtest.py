@@ -0,0 +1,383 @@
+# fns/management/commands/loadtest.py
+
+import multiprocessing
+import os
+import random
+import resource
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from fns import fakes, repository
+from fns.storage import SERVER_TIMESTAMP, MemoryStorage, set_storage
+
+DEFAULT_MIX = 'tailor=1,refine=1,download=2,detail=3,list=3'
+OPERATIONS = ('tailor', 'refine', 'download', 'detail', 'list')
+# Operations that go through the fair-share scheduler, compared across users for fairness
+SCHEDULED_OPERATIONS = ('tailor', 'refine', 'download')
+
+JOB_DESCRIPTION = (
+    "We are hiring a backend engineer to design and scale Python web services, "
+    "own our billing APIs and improve latency across the platform."
+)
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise CommandError(f"Unknown operation {name!r} in --mix; expected one of {', '.join(OPERATIONS)}.")
+        try:
+            mix[name] = float(weight or 1)
+        except ValueError:
+            raise CommandError(f"Invalid weight {weight!r} for {name!r} in --mix.")
+    if not any(mix.values()):
+        raise CommandError("--mix needs at least one operation with a positive weight.")
+    return mix
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def jain_index(values):
+    """Jain's fairness index: 1.0 when all values are equal, 1/n when one user gets everything."""
+    values = [value for value in values if value > 0]
+    if not values:
+        return 1.0
+    return sum(values) ** 2 / (len(values) * sum(value * value for value in values))
+
+
+def current_rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Workload:
+    """Seeded users and the request each operation sends for them."""
+
+    def __init__(self, users):
+        self.users = users  # [(uid, base_resume_id)]
+
+    @classmethod
+    def seed(cls, user_count):
+        users = []
+        for number in range(user_count):
+            uid = f'loadtest-user-{number}'
+            repository.get_storage().set(repository.USERS_COLLECTION, uid, {
+                'customInstructions': 'Keep it to one page.',
+            })
+            resume_id = repository.create_resume_with_history({
+                'userId': uid,
+                'resumeName': f'Base resume {number}',
+                'latexContent': fakes.SAMPLE_RESUME_TEX,
+                'isDraft': False,
+                'createdAt': SERVER_TIMESTAMP,
+                'lastUpdated': SERVER_TIMESTAMP,
+            })
+            users.append((uid, resume_id))
+        return cls(users)
+
+    def send(self, client, operation, uid, resume_id, rng):
+        auth = {'HTTP_AUTHORIZATION': f'Bearer {fakes.fake_token(uid)}'}
+        if operation == 'tailor':
+            return client.post('/api/tailor-resume/', {
+                'base_resume_id': resume_id,
+                'job_description': JOB_DESCRIPTION,
+                'new_resume_name': f'Tailored {rng.randrange(10**6)}',
+            }, **auth)
+        if operation == 'refine':
+            return client.post(f'/api/resumes/{resume_id}/refine/', {
+                'instruction': 'Emphasise latency work.',
+            }, **auth)
+        if operation == 'download':
+            return client.get(f'/api/resumes/{resume_id}/download/', **auth)
+        if operation == 'detail':
+            return client.get(f'/api/resumes/{resume_id}/', **auth)
+        return client.get('/api/resumes/', **auth)
+
+
+def run_level(workload, mix, concurrency, duration, seed, heavy_clients=0):
+    """
+    Runs `concurrency` closed-loop client threads for `duration` seconds, plus
+    `heavy_clients` threads that all batch-refine as the first user (who then
+    gets no regular clients).
+    """
+    operations = list(mix)
+    weights = [mix[name] for name in operations]
+    latencies = {name: [] for name in operations}
+    errors = {name: 0 for name in operations}
+    by_user = {}  # uid -> [(operation, seconds, status)]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+    regular_users = workload.users[1:] if heavy_clients and len(workload.users) > 1 else workload.users
+
+    def worker(number, heavy=False):
+        rng = random.Random(seed * 7919 + number)
+        client = Client()
+        uid, resume_id = workload.users[0] if heavy else regular_users[number % len(regular_users)]
+        local_latencies = {name: [] for name in operations}
+        local_errors = {name: 0 for name in operations}
+        local_samples = []
+        while time.perf_counter() < deadline:
+            operation = 'refine' if heavy else rng.choices(operations, weights)[0]
+            started = time.perf_counter()
+            try:
+                response = workload.send(client, operation, uid, resume_id, rng)
+                status = response.status_code
+            except Exception:
+                status = 599
+            elapsed = time.perf_counter() - started
+            local_samples.append((operation, elapsed, status))
+            if operation in local_latencies:
+                local_latencies[operation].append(elapsed)
+                if status >= 400:
+                    local_errors[operation] += 1
+        with lock:
+            for name in operations:
+                latencies[name].extend(local_latencies[name])
+                errors[name] += local_errors[name]
+            by_user.setdefault(uid, []).extend(local_samples)
+
+    from fns import views
+
+    gemini = views.gemini_client
+    tokens_before = (gemini.uncached_prompt_tokens, gemini.cached_prompt_tokens)
+    threads = [threading.Thread(target=worker, args=(number,), daemon=True) for number in range(concurrency)]
+    threads += [threading.Thread(target=worker, args=(concurrency + number, True), daemon=True)
+                for number in range(heavy_clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {
+        'elapsed': time.perf_counter() - started,
+        'latencies': latencies,
+        'errors': errors,
+        'by_user': by_user,
+        'rss_mb': [current_rss_mb()],
+        'peak_rss_mb': [peak_rss_mb()],
+        # (uncached, cached) prompt tokens the fake Gemini client was sent during this level
+        'prompt_tokens': [gemini.uncached_prompt_tokens - tokens_before[0],
+                          gemini.cached_prompt_tokens - tokens_before[1]],
+    }
+
+
+def _run_in_child(queue, workload, mix, concurrency, duration, seed, heavy_clients):
+    try:
+        queue.put(run_level(workload, mix, concurrency, duration, seed, heavy_clients))
+    except BaseException as e:
+        queue.put(e)
+
+
+def run_level_forked(workload, mix, concurrency, duration, processes, seed, heavy_clients=0):
+    """Splits `concurrency` (and `heavy_clients`) client threads across `processes` forked copies of this process."""
+    context = multiprocessing.get_context('fork')
+    queue = context.Queue()
+    children = []
+    for number in range(processes):
+        threads = concurrency // processes + (1 if number < concurrency % processes else 0)
+        heavy = heavy_clients // processes + (1 if number < heavy_clients % processes else 0)
+        if threads or heavy:
+            child = context.Process(target=_run_in_child,
+                                    args=(queue, workload, mix, threads, duration, seed + number, heavy))
+            child.start()
+            children.append(child)
+
+    results = [queue.get() for _ in children]
+    for child in children:
+        child.join()
+    for result in results:
+        if isinstance(result, BaseException):
+            raise CommandError(f"Load-test worker process failed: {result}")
+
+    merged = {
+        'elapsed': max(result['elapsed'] for result in results),
+        'latencies': {name: [] for name in mix},
+        'errors': {name: 0 for name in mix},
+        'by_user': {},
+        'rss_mb': [],
+        'peak_rss_mb': [],
+        'prompt_tokens': [0, 0],
+    }
+    for result in results:
+        for name in mix:
+            merged['latencies'][name].extend(result['latencies'][name])
+            merged['errors'][name] += result['errors'][name]
+        for uid, samples in result['by_user'].items():
+            merged['by_user'].setdefault(uid, []).extend(samples)
+        merged['rss_mb'].extend(result['rss_mb'])
+        merged['peak_rss_mb'].extend(result['peak_rss_mb'])
+        merged['prompt_tokens'] = [total + part for total, part in zip(merged['prompt_tokens'], result['prompt_tokens'])]
+    return merged
+
+
+class Command(BaseCommand):
+    help = (
+        "Offline load test: drives the real views through Django's test client at "
+        "rising concurrency, with a fake Gemini client, in-memory storage and a stub "
+        "(or real) pdflatex, and reports throughput, latency percentiles and "
+        "per-process memory for each level."
+    )
+    # The URL checks would import fns.views before handle() can prepare it
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', default='1,2,4,8,16',
+                            help="Comma-separated concurrency levels (client threads in flight).")
+        parser.add_argument('--duration', type=float, default=10.0, help="Seconds to run each level.")
+        parser.add_argument('--warmup', type=float, default=2.0, help="Seconds of single-client warm-up before the first level.")
+        parser.add_argument('--processes', type=int, default=1,
+                            help="Fork this many worker processes per level and split the clients between them.")
+        parser.add_argument('--users', type=int, default=20, help="Number of seeded users (each with one base resume).")
+        parser.add_argument('--mix', default=DEFAULT_MIX,
+                            help=f"Weighted operation mix, e.g. {DEFAULT_MIX!r}.")
+        parser.add_argument('--gemini-latency', type=float, default=2.0, help="Seconds each fake Gemini call takes.")
+        parser.add_argument('--gemini-failure-rate', type=float, default=0.0, help="Fraction of fake Gemini calls that fail.")
+        parser.add_argument('--gemini-token-latency', type=float, default=0.0,
+                            help="Extra seconds per uncached prompt token of each fake Gemini call.")
+        parser.add_argument('--gemini-min-cache-tokens', type=int, default=0,
+                            help="Smallest context the fake Gemini accepts into a context cache.")
+        parser.add_argument('--compiler', choices=['stub', 'real'], default='stub',
+                            help="'stub' skips pdflatex; 'real' runs it.")
+        parser.add_argument('--compile-latency', type=float, default=0.5, help="Seconds the stub compiler takes.")
+        parser.add_argument('--humanizer', choices=['real', 'fake'], default='real',
+                            help="'fake' replaces the spaCy/SentenceTransformer humanizer with a passthrough.")
+        parser.add_argument('--heavy-clients', type=int, default=0,
+                            help="Extra client threads that all batch-refine as one user, to measure per-user fairness.")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        try:
+            levels = [int(level) for level in options['concurrency'].split(',') if level.strip()]
+        except ValueError:
+            raise CommandError("--concurrency must be a comma-separated list of integers.")
+        if not levels or min(levels) < 1:
+            raise CommandError("--concurrency levels must be positive.")
+        if options['processes'] < 1:
+            raise CommandError("--processes must be at least 1.")
+        if options['heavy_clients'] < 0:
+            raise CommandError("--heavy-clients cannot be negative.")
+        mix = parse_mix(options['mix'])
+
+        # fns.views builds a real Gemini client at import time; it is replaced below
+        if not settings.GEMINI_API_KEY:
+            settings.GEMINI_API_KEY = 'loadtest'
+        from fns import decorators, views
+
+        patches = [
+            (views, 'gemini_client', fakes.FakeGeminiClient(
+                latency=options['gemini_latency'], failure_rate=options['gemini_failure_rate'],
+                token_latency=options['gemini_token_latency'], min_cache_tokens=options['gemini_min_cache_tokens'])),
+            (decorators, 'verify_token', fakes.fake_verify_token),
+        ]
+        if options['compiler'] == 'stub':
+            stub = fakes.make_stub_compiler(options['compile_latency'])
+            patches.append((views, 'compile_latex_to_pdf_bytes', views.timed('pdflatex')(stub)))
+        if options['humanizer'] == 'fake':
+            patches.append((views, 'humanizer', fakes.FakeHumanizer()))
+
+        originals = [(module, name, getattr(module, name)) for module, name, _ in patches]
+        for module, name, value in patches:
+            setattr(module, name, value)
+        set_storage(MemoryStorage())
+        repository.resume_cache.clear()
+        try:
+            self._run(levels, mix, options)
+        finally:
+            for module, name, value in originals:
+                setattr(module, name, value)
+            set_storage(None)
+            repository.resume_cache.clear()
+
+    def _run(self, levels, mix, options):
+        workload = Workload.seed(options['users'])
+        self.stdout.write(
+            f"Seeded {options['users']} users. Mix: {', '.join(f'{k}={v:g}' for k, v in mix.items())}; "
+            f"Gemini {options['gemini_latency']:.2f}s, compiler {options['compiler']}, "
+            f"humanizer {options['humanizer']}, {options['processes']} process(es)."
+        )
+        if options['warmup'] > 0:
+            run_level(workload, mix, 1, options['warmup'], options['seed'])
+        self.stdout.write(f"RSS after warm-up: {current_rss_mb():.0f} MB\n")
+
+        header = (f"{'conc':>5} {'req/s':>8} {'requests':>9} {'errors':>7} "
+                  f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'rss MB':>12}")
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        breakdowns = []
+        for level in levels:
+            if options['processes'] > 1:
+                result = run_level_forked(workload, mix, level, options['duration'],
+                                          options['processes'], options['seed'], options['heavy_clients'])
+            else:
+                result = run_level(workload, mix, level, options['duration'], options['seed'],
+                                   options['heavy_clients'])
+
+            everything = sorted(value for values in result['latencies'].values() for value in values)
+            errors = sum(result['errors'].values())
+            rss = result['rss_mb']
+            rss_text = f"{max(rss):.0f}" if len(rss) == 1 else f"{min(rss):.0f}-{max(rss):.0f}"
+            self.stdout.write(
+                f"{level:>5} {len(everything) / result['elapsed']:>8.1f} {len(everything):>9} {errors:>7} "
+                f"{percentile(everything, 50) * 1000:>8.0f} {percentile(everything, 95) * 1000:>8.0f} "
+                f"{percentile(everything, 99) * 1000:>8.0f} {(everything[-1] if everything else 0) * 1000:>8.0f} "
+                f"{rss_text:>12}"
+            )
+            breakdowns.append((level, result))
+
+        self.stdout.write("\nPer-operation latency (p50 / p95 ms, errors):")
+        for level, result in breakdowns:
+            parts = []
+            for name, values in result['latencies'].items():
+                values = sorted(values)
+                parts.append(f"{name} {percentile(values, 50) * 1000:.0f}/{percentile(values, 95) * 1000:.0f}"
+                             f" ({result['errors'][name]})")
+            self.stdout.write(f"{level:>5}: " + ', '.join(parts))
+        self._report_fairness(breakdowns, heavy_uid=workload.users[0][0] if options['heavy_clients'] else None)
+        self.stdout.write("\nGemini prompt tokens (uncached / from context caches):")
+        for level, result in breakdowns:
+            uncached, cached = result['prompt_tokens']
+            share = cached / (uncached + cached) if uncached + cached else 0.0
+            self.stdout.write(f"{level:>5}: {uncached} / {cached} ({share:.0%} cached)")
+        self.stdout.write(f"\nPeak RSS (this process): {peak_rss_mb():.0f} MB")
+
+    def _report_fairness(self, breakdowns, heavy_uid):
+        self.stdout.write(f"\nPer-user fairness ({'/'.join(SCHEDULED_OPERATIONS)}; p50 / p95 ms, 429s; "
+                          f"Jain index over the other users' mean latency):")
+        for level, result in breakdowns:
+            groups = {'heavy': [], 'others': []}
+            rejected = {'heavy': 0, 'others': 0}
+            means = []
+            for uid, samples in result['by_user'].items():
+                group = 'heavy' if uid == heavy_uid else 'others'
+                served = [seconds for operation, seconds, status in samples
+                          if operation in SCHEDULED_OPERATIONS and status < 400]
+                rejected[group] += sum(1 for operation, _, status in samples
+                                       if operation in SCHEDULED_OPERATIONS and status == 429)
+                groups[group].extend(served)
+                if served and group == 'others':
+                    means.append(sum(served) / len(served))
+            parts = []
+            for group in ('others', 'heavy') if heavy_uid else ('others',):
+                values = sorted(groups[group])
+                parts.append(f"{group} {percentile(values, 50) * 1000:.0f}/{percentile(values, 95) * 1000:.0f}"
+                             f" ({rejected[group]})")
+            self.stdout.write(f"{level:>5}: " + ', '.join(parts) + f", Jain {jain_index(means):.3f}")
@@ -0,0 +1,211 @@
+# fns/metrics.py
+"""
+Per-stage latency instrumentation for the resume pipelines.
+
+Code marks its stages with `span('name')`. Every span is aggregated into a
+process-wide histogram, and when it runs inside a request (see
+fns.middleware.RequestMetricsMiddleware) it is also added to that request's
+trace so slow requests can be logged with their stage breakdown. Everything
+is exposed in Prometheus text format by `render_prometheus()`.
+"""
+
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+_local = threading.local()
+
+
+def count_round_trip(n=1):
+    """Called by the data layer once per network round trip it makes on this thread."""
+    _local.round_trips = getattr(_local, 'round_trips', 0) + n
+
+
+def round_trips():
+    return getattr(_local, 'round_trips', 0)
+
+
+# --- Metric types ---
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Counter:
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # [per-bucket counts (+Inf last), sum, count]
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += bucket_count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), label_values + (le,))} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.labels, label_values)} {total}")
+                lines.append(f"{self.name}_count{_labels(self.labels, label_values)} {count}")
+        return lines
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{escaped}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+STAGE_SECONDS = Histogram('hireinator_stage_duration_seconds', 'Duration of pipeline stages.', ['stage'])
+STAGE_ERRORS = Counter('hireinator_stage_errors_total', 'Pipeline stages that raised an exception.', ['stage'])
+STAGE_ROUND_TRIPS = Counter('hireinator_stage_round_trips_total', 'Storage round trips made inside each stage.', ['stage'])
+REQUEST_SECONDS = Histogram('hireinator_request_duration_seconds', 'Total request duration.', ['view'])
+REQUESTS = Counter('hireinator_requests_total', 'Requests served.', ['view', 'status'])
+SLOW_REQUESTS = Counter('hireinator_slow_requests_total', 'Requests slower than SLOW_REQUEST_MS.', ['view'])
+CANCELLED_REQUESTS = Counter('hireinator_cancelled_requests_total',
+                             'Requests abandoned past their deadline or after a disconnect.', ['reason'])
+GEMINI_PROMPT_TOKENS = Counter('hireinator_gemini_prompt_tokens_total',
+                               'Gemini prompt tokens, split by whether a context cache served them.', ['cached'])
+PROFILES = Counter('hireinator_profiles_total',
+                   'Requests selected for profiling: captured, or skipped while another capture ran.', ['outcome'])
+
+_metrics = [STAGE_SECONDS, STAGE_ERRORS, STAGE_ROUND_TRIPS, REQUEST_SECONDS, REQUESTS, SLOW_REQUESTS, CANCELLED_REQUESTS,
+            GEMINI_PROMPT_TOKENS, PROFILES]
+_collectors = []
+
+
+def register_collector(collect):
+    """
+    Registers a callable returning [(name, type, help, value), ...] for values
+    owned elsewhere (cache sizes, hit counters); it is called at scrape time.
+    """
+    _collectors.append(collect)
+
+
+# --- Spans and request traces ---
+
+_current_trace = contextvars.ContextVar('hireinator_trace', default=None)
+
+
+class RequestTrace:
+    """The spans recorded while serving one request, in completion order."""
+
+    def __init__(self):
+        self.spans = []
+        self.started = time.perf_counter()
+
+    @property
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def summary(self):
+        parts = []
+        for stage, elapsed_ms, trips in self.spans:
+            part = f"{stage}={elapsed_ms:.0f}ms"
+            if trips:
+                part += f" ({trips} round trip{'s' if trips != 1 else ''})"
+            parts.append(part)
+        return ", ".join(parts) or "no stages recorded"
+
+
+def start_trace():
+    """Starts a trace for the current request; returns (trace, reset_token)."""
+    trace = RequestTrace()
+    return trace, _current_trace.set(trace)
+
+
+def end_trace(reset_token):
+    _current_trace.reset(reset_token)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def span(stage):
+    """Times a pipeline stage: `with span('gemini'): ...`"""
+    start = time.perf_counter()
+    trips_before = round_trips()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        trips = round_trips() - trips_before
+        STAGE_SECONDS.observe(elapsed, stage)
+        if trips:
+            STAGE_ROUND_TRIPS.inc(stage, amount=trips)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.spans.append((stage, elapsed * 1000, trips))
+
+
+def timed(stage):
+    """Decorator form of span()."""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# --- Exposition ---
+
+def render_prometheus():
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for collect in _collectors:
+        for name, metric_type, help_text, value in collect():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.append(f"{name} {value}")
+    return '\n'.join(lines) + '\n'
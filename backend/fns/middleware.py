@@ -0,0 +1,100 @@
+# fns/middleware.py
+
+import gzip
+import time
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from . import metrics
+
+
+class RequestMetricsMiddleware:
+    """
+    Times every request, records it in the request histograms and gives the
+    view a trace that collects its pipeline spans. Requests slower than
+    SLOW_REQUEST_MS are logged with their stage breakdown (0 disables this).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_request_ms = getattr(settings, 'SLOW_REQUEST_MS', 0)
+
+    def __call__(self, request):
+        trace, reset_token = metrics.start_trace()
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.end_trace(reset_token)
+
+        elapsed = time.perf_counter() - start
+        match = getattr(request, 'resolver_match', None)
+        view = match.url_name if match and match.url_name else 'unmatched'
+        metrics.REQUEST_SECONDS.observe(elapsed, view)
+        metrics.REQUESTS.inc(view, str(response.status_code))
+
+        if self.slow_request_ms and elapsed * 1000 >= self.slow_request_ms:
+            metrics.SLOW_REQUESTS.inc(view)
+            print(f"🐢 Slow request {request.method} {request.path} ({view}) "
+                  f"{elapsed * 1000:.0f}ms [{response.status_code}]: {trace.summary()}")
+        return response
+
+
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json')
+
+
+def _accepts(request, coding):
+    for part in request.headers.get('Accept-Encoding', '').split(','):
+        name, _, params = part.strip().partition(';')
+        if name.strip().lower() == coding:
+            return params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
+
+
+class CompressionMiddleware:
+    """
+    Brotli (when installed) or gzip for text and JSON responses of at least
+    COMPRESS_MIN_BYTES. Streaming, partial and already-encoded responses
+    (PDFs, ZIP exports, byte ranges) are left alone.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.min_bytes = getattr(settings, 'COMPRESS_MIN_BYTES', 1024)
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (response.streaming or response.status_code != 200 or response.has_header('Content-Encoding')
+                or not response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES)):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if len(response.content) < self.min_bytes:
+            return response
+
+        if brotli is not None and _accepts(request, 'br'):
+            coding, compressed = 'br', brotli.compress(response.content, quality=5)
+        elif _accepts(request, 'gzip'):
+            coding, compressed = 'gzip', gzip.compress(response.content, compresslevel=6, mtime=0)
+        else:
+            return response
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = coding
+        # The encoded bytes differ from the identity representation the strong tag names
+        etag = response.get('ETag')
+        if etag and not etag.startswith('W/'):
+            response['ETag'] = f'W/{etag}'
+        return response
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('collection', models.CharField(max_length=64)),
+                ('doc_id', models.CharField(max_length=128)),
+                ('user_id', models.CharField(blank=True, max_length=128, null=True)),
+                ('sort_key', models.DateTimeField(blank=True, null=True)),
+                ('updated_key', models.DateTimeField(blank=True, null=True)),
+                ('data', models.JSONField(default=dict)),
+            ],
+            options={
+                'indexes': [
+                    models.Index(fields=['collection', 'user_id', 'sort_key'], name='document_user_listing'),
+                    models.Index(fields=['collection', 'user_id', 'updated_key'], name='document_user_updates'),
+                ],
+                'constraints': [models.UniqueConstraint(fields=('collection', 'doc_id'), name='unique_document_per_collection')],
+            },
+        ),
+    ]
@@ -1,3 +1,28 @@
 from django.db import models
 
-# Create your models here.
+
+class StoredDocument(models.Model):
+    """
+    A document of the 'django' storage backend (see fns/storage.py).
+    `user_id`, `sort_key` and `updated_key` mirror the document's userId,
+    createdAt and lastUpdated so per-user listings can be filtered and
+    ordered in SQL.
+    """
+    collection = models.CharField(max_length=64)
+    doc_id = models.CharField(max_length=128)
+    user_id = models.CharField(max_length=128, null=True, blank=True)
+    sort_key = models.DateTimeField(null=True, blank=True)
+    updated_key = models.DateTimeField(null=True, blank=True)
+    data = models.JSONField(default=dict)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['collection', 'doc_id'], name='unique_document_per_collection'),
+        ]
+        indexes = [
+            models.Index(fields=['collection', 'user_id', 'sort_key'], name='document_user_listing'),
+            models.Index(fields=['collection', 'user_id', 'updated_key'], name='document_user_updates'),
+        ]
+
+    def __str__(self):
+        return f"{self.collection}/{self.doc_id}"
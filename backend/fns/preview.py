@@ -0,0 +1,457 @@
+# fns/preview.py
+"""
+In-process LaTeX-to-HTML preview for the editor.
+
+Resumes use a small subset of LaTeX: the article class, sections, lists,
+text styles, size changes, hyperlinks and a few symbols. This module renders
+exactly that subset, in milliseconds, so the refine loop doesn't need a
+pdflatex round trip for every preview. Anything outside the subset (tables,
+custom macros, graphics, real math) is reported in `unsupported`; such a
+preview is incomplete and the client should fall back to the compiled PDF.
+
+Rendered previews are cached by the content hash of their LaTeX.
+"""
+
+import html
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import List, NamedTuple
+
+from django.conf import settings
+
+from . import repository
+from .metrics import register_collector
+
+# Markers in rendered output; they can't occur in escaped text
+_ITEM = '\x00item\x00'
+_PARAGRAPH = '\x00par\x00'
+
+SECTIONS = {'section': 'h2', 'subsection': 'h3', 'subsubsection': 'h4', 'paragraph': 'h5'}
+TEXT_STYLES = {
+    'textbf': ('<strong>', '</strong>'),
+    'textit': ('<em>', '</em>'),
+    'emph': ('<em>', '</em>'),
+    'textsl': ('<em>', '</em>'),
+    'underline': ('<u>', '</u>'),
+    'texttt': ('<code>', '</code>'),
+    'textsc': ('<span class="sc">', '</span>'),
+    'textsf': ('<span class="sf">', '</span>'),
+    'textrm': ('', ''),
+    'textnormal': ('', ''),
+    'textmd': ('', ''),
+    'textup': ('', ''),
+    'mbox': ('', ''),
+    'text': ('', ''),
+    'makebox': ('', ''),
+}
+# Declarations that style the rest of the enclosing group
+DECLARATIONS = {
+    'bfseries': ('<strong>', '</strong>'), 'bf': ('<strong>', '</strong>'),
+    'itshape': ('<em>', '</em>'), 'it': ('<em>', '</em>'), 'em': ('<em>', '</em>'), 'slshape': ('<em>', '</em>'),
+    'scshape': ('<span class="sc">', '</span>'), 'sc': ('<span class="sc">', '</span>'),
+    'ttfamily': ('<code>', '</code>'), 'tt': ('<code>', '</code>'),
+    'centering': ('<div class="center">', '</div>'),
+    'raggedright': ('', ''), 'raggedleft': ('<div class="right">', '</div>'),
+    'normalfont': ('', ''), 'mdseries': ('', ''), 'upshape': ('', ''), 'rmfamily': ('', ''),
+    'sffamily': ('<span class="sf">', '</span>'),
+}
+SIZES = ('tiny', 'scriptsize', 'footnotesize', 'small', 'normalsize', 'large', 'Large', 'LARGE', 'huge', 'Huge')
+SYMBOLS = {
+    '&': '&amp;', '%': '%', '$': '$', '#': '#', '_': '_', '{': '{', '}': '}', ' ': ' ', ',': '&thinsp;',
+    ';': '&ensp;', ':': '&ensp;', '!': '', '/': '', '-': '', '@': '',
+    'textbar': '|', 'textbullet': '•', 'ldots': '…', 'dots': '…', 'textendash': '–', 'textemdash': '—',
+    'textasciitilde': '~', 'textbackslash': '\\', 'textasciicircum': '^', 'textless': '&lt;', 'textgreater': '&gt;',
+    'S': '§', 'P': '¶', 'copyright': '©', 'textregistered': '®', 'texttrademark': '™', 'pounds': '£',
+    'euro': '€', 'LaTeX': 'LaTeX', 'TeX': 'TeX', 'quad': '&emsp;', 'qquad': '&emsp;&emsp;', 'enspace': '&ensp;',
+    'hfill': ' ', 'hrulefill': ' ', 'newline': '<br>', 'linebreak': '<br>', 'par': _PARAGRAPH,
+    'noindent': '', 'indent': '', 'smallskip': _PARAGRAPH, 'medskip': _PARAGRAPH, 'bigskip': _PARAGRAPH,
+    'newpage': '', 'pagebreak': '', 'clearpage': '', 'nopagebreak': '', 'selectfont': '', 'protect': '',
+    'hline': '<hr>', 'titlerule': '<hr>', 'hrule': '<hr>', 'item': _ITEM,
+}
+MATH_SYMBOLS = {
+    'bullet': '•', 'cdot': '·', 'cdots': '⋯', 'ldots': '…', 'times': '×', 'sim': '~', 'approx': '≈',
+    'pm': '±', 'leq': '≤', 'geq': '≥', 'le': '≤', 'ge': '≥', 'neq': '≠', 'rightarrow': '→', 'to': '→',
+    'leftarrow': '←', 'Rightarrow': '⇒', 'uparrow': '↑', 'downarrow': '↓', 'circ': '∘', 'diamond': '⋄',
+    'star': '⋆', 'ast': '∗', 'vert': '|', 'mid': '|', 'infty': '∞', 'degree': '°', '%': '%', '&': '&amp;',
+    '#': '#', '$': '$', '_': '_', '{': '{', '}': '}', ',': '&thinsp;', ';': ' ', ' ': ' ', 'quad': '&emsp;',
+    'alpha': 'α', 'beta': 'β', 'mu': 'μ', 'sigma': 'σ', 'pi': 'π', 'Delta': 'Δ',
+}
+ACCENTS = {"'": '\u0301', '`': '\u0300', '^': '\u0302', '"': '\u0308', '~': '\u0303', '=': '\u0304',
+           '.': '\u0307', 'c': '\u0327', 'v': '\u030c', 'u': '\u0306', 'H': '\u030b', 'r': '\u030a'}
+LISTS = {'itemize': 'ul', 'enumerate': 'ol', 'description': 'dl'}
+BLOCKS = {'center': 'center', 'flushleft': 'left', 'flushright': 'right', 'minipage': 'minipage',
+          'quote': 'quote', 'quotation': 'quote', 'small': 'small', 'footnotesize': 'footnotesize'}
+# Layout commands rendered as nothing: {command: number of mandatory arguments to drop}
+IGNORED = {
+    'vspace': 1, 'hspace': 1, 'setlength': 2, 'addtolength': 2, 'pagestyle': 1, 'thispagestyle': 1,
+    'fontsize': 2, 'phantom': 1, 'hphantom': 1, 'vphantom': 1, 'label': 1, 'linespread': 1, 'setlist': 1,
+    'enlargethispage': 1, 'rule': 2, 'hyphenation': 1, 'titlespacing': 4, 'titleformat': 5,
+}
+SAFE_URL_RE = re.compile(r'^(https?:|mailto:|tel:)', re.IGNORECASE)
+COMMAND_RE = re.compile(r'[A-Za-z@]+\*?')
+
+STYLESHEET = """
+body { font-family: 'Latin Modern Roman', 'Computer Modern Serif', Georgia, serif; font-size: 11pt;
+       line-height: 1.35; color: #111; margin: 0; background: #fff; }
+main { max-width: 6.5in; margin: 0 auto; padding: 0.75in 0.5in; }
+h2 { font-size: 1.35em; margin: 1em 0 0.35em; } h3 { font-size: 1.15em; margin: 0.8em 0 0.3em; }
+h4, h5 { font-size: 1em; margin: 0.6em 0 0.2em; }
+ul, ol { margin: 0.3em 0; padding-left: 1.6em; } li { margin: 0.1em 0; }
+dl { margin: 0.3em 0; } dd { margin-left: 1.6em; }
+a { color: inherit; } hr { border: 0; border-top: 0.5pt solid #111; margin: 0.2em 0; }
+.par { height: 0.6em; } .center { text-align: center; } .right { text-align: right; }
+.quote { margin: 0 2em; } .sc { font-variant: small-caps; } .sf { font-family: Helvetica, Arial, sans-serif; }
+.tiny { font-size: 0.5em; } .scriptsize { font-size: 0.7em; } .footnotesize { font-size: 0.8em; }
+.small { font-size: 0.9em; } .large { font-size: 1.2em; } .Large { font-size: 1.44em; }
+.LARGE { font-size: 1.73em; } .huge { font-size: 2.07em; } .Huge { font-size: 2.49em; }
+.label { font-weight: bold; } .unsupported { background: #fde8e8; }
+"""
+
+
+class Preview(NamedTuple):
+    html: str
+    unsupported: List[str]
+
+    @property
+    def complete(self):
+        return not self.unsupported
+
+
+class _Renderer:
+
+    def __init__(self, source):
+        self.src = source
+        self.pos = 0
+        self.unsupported = []
+
+    def flag(self, construct):
+        if construct not in self.unsupported:
+            self.unsupported.append(construct)
+
+    # --- Low-level reading ---
+
+    def peek(self):
+        return self.src[self.pos] if self.pos < len(self.src) else ''
+
+    def skip_space(self):
+        while self.pos < len(self.src) and self.src[self.pos] in ' \t\n':
+            self.pos += 1
+
+    def read_command_name(self):
+        match = COMMAND_RE.match(self.src, self.pos)
+        if match:
+            self.pos = match.end()
+            return match.group()
+        name = self.src[self.pos:self.pos + 1]
+        self.pos += 1
+        return name
+
+    def read_raw_group(self):
+        """The verbatim text of the next {...} argument (or a single token), braces balanced."""
+        self.skip_space()
+        if self.peek() != '{':
+            if self.peek() == '\\':
+                self.pos += 1
+                return '\\' + self.read_command_name()
+            char = self.peek()
+            self.pos += 1
+            return char
+        depth, start = 0, self.pos
+        while self.pos < len(self.src):
+            char = self.src[self.pos]
+            if char == '\\':
+                self.pos += 2
+                continue
+            if char == '{':
+                depth += 1
+            elif char == '}':
+                depth -= 1
+                if depth == 0:
+                    self.pos += 1
+                    return self.src[start + 1:self.pos - 1]
+            self.pos += 1
+        return self.src[start + 1:]
+
+    def read_optional(self):
+        """The verbatim text of an optional [...] argument, or None."""
+        saved = self.pos
+        self.skip_space()
+        if self.peek() != '[':
+            self.pos = saved
+            return None
+        depth, start = 0, self.pos
+        while self.pos < len(self.src):
+            char = self.src[self.pos]
+            if char in '[{':
+                depth += 1
+            elif char in ']}':
+                depth -= 1
+                if depth == 0:
+                    self.pos += 1
+                    return self.src[start + 1:self.pos - 1]
+            self.pos += 1
+        return self.src[start + 1:]
+
+    def render_group(self):
+        """Renders the next {...} argument (or single token) to HTML."""
+        self.skip_space()
+        if self.peek() == '{':
+            self.pos += 1
+            return self.render(stop='}')
+        return self.render_fragment(self.read_raw_group())
+
+    def render_fragment(self, text):
+        inner = _Renderer(text)
+        rendered = inner.render()
+        for construct in inner.unsupported:
+            self.flag(construct)
+        return rendered
+
+    # --- Rendering ---
+
+    def render(self, stop=None):
+        """
+        Renders until `stop` ('}' or an environment name, consumed) or the end.
+        Declarations (\\bfseries, \\small) wrap the rest of the current group.
+        """
+        out = []
+        while self.pos < len(self.src):
+            char = self.src[self.pos]
+            if char == '\\':
+                self.pos += 1
+                if self.src.startswith('end', self.pos) and not self.src[self.pos + 3:self.pos + 4].isalpha():
+                    self.pos += 3
+                    name = self.read_raw_group()
+                    if name == stop:
+                        return ''.join(out)
+                    continue
+                name = self.read_command_name()
+                if name in DECLARATIONS or name in SIZES or name == 'color':
+                    if name == 'color':
+                        self.read_raw_group()
+                        opening, closing = '', ''
+                    elif name in SIZES:
+                        opening, closing = f'<span class="{name}">', '</span>'
+                    else:
+                        opening, closing = DECLARATIONS[name]
+                    return ''.join(out) + opening + self.render(stop) + closing
+                out.append(self.command(name))
+            elif char == '{':
+                self.pos += 1
+                out.append(self.render(stop='}'))
+            elif char == '}':
+                self.pos += 1
+                if stop == '}':
+                    return ''.join(out)
+            elif char == '%':
+                end = self.src.find('\n', self.pos)
+                self.pos = len(self.src) if end == -1 else end + 1
+            elif char == '$':
+                out.append(self.math())
+            elif char == '~':
+                self.pos += 1
+                out.append('&nbsp;')
+            elif char == '&':
+                self.pos += 1
+                self.flag('& (alignment)')
+                out.append(' ')
+            elif char in '^_':
+                self.pos += 1
+                self.flag(f'{char} outside math')
+            else:
+                match = re.compile(r'[^\\{}%$~&^_]+').match(self.src, self.pos)
+                self.pos = match.end()
+                out.append(self.text(match.group()))
+        return ''.join(out)
+
+    def text(self, raw):
+        if re.search(r'\n[ \t]*\n', raw):
+            return _PARAGRAPH.join(self.text(part) for part in re.split(r'\n[ \t]*\n\s*', raw))
+        raw = re.sub(r'\s+', ' ', raw)
+        raw = raw.replace('---', '—').replace('--', '–').replace('``', '“').replace("''", '”').replace('`', '‘')
+        return html.escape(raw, quote=False).replace("'", '’')
+
+    def math(self):
+        display = self.src.startswith('$$', self.pos)
+        self.pos += 2 if display else 1
+        end = self.src.find('$$' if display else '$', self.pos)
+        if end == -1:
+            end = len(self.src)
+        body = self.src[self.pos:end]
+        self.pos = end + (2 if display else 1)
+        tokens = re.findall(r'\\[A-Za-z]+|\\.|\{[^{}]*\}|[^\\]', body)
+        return f'<span class="math">{self.math_tokens(tokens).strip()}</span>'
+
+    def math_tokens(self, tokens):
+        out = []
+        tokens = iter(tokens)
+        for token in tokens:
+            if token in ('^', '_'):
+                tag = 'sup' if token == '^' else 'sub'
+                argument = next(tokens, '')
+                out.append(f'<{tag}>{self.math_tokens(self.math_split(argument))}</{tag}>')
+            elif token.startswith('{'):
+                out.append(self.math_tokens(self.math_split(token)))
+            elif token.startswith('\\'):
+                symbol = MATH_SYMBOLS.get(token[1:])
+                if symbol is None:
+                    self.flag(f'${token}$')
+                    symbol = html.escape(token)
+                out.append(symbol)
+            elif not token.isspace():
+                out.append(html.escape(token))
+        return ''.join(out)
+
+    @staticmethod
+    def math_split(token):
+        if token.startswith('{') and token.endswith('}'):
+            token = token[1:-1]
+        return re.findall(r'\\[A-Za-z]+|\\.|\{[^{}]*\}|[^\\]', token)
+
+    def command(self, name):
+        base = name.rstrip('*')
+        if base in SECTIONS:
+            self.read_optional()
+            tag = SECTIONS[base]
+            return f'<{tag}>{self.render_group()}</{tag}>'
+        if base in TEXT_STYLES:
+            if base == 'makebox':
+                self.read_optional()
+                self.read_optional()
+            opening, closing = TEXT_STYLES[base]
+            return opening + self.render_group() + closing
+        if name == '\\':
+            self.read_optional()
+            return '<br>'
+        if name == 'item':
+            label = self.read_optional()
+            return _ITEM + (f'<span class="label">{self.render_fragment(label)}</span> ' if label is not None else '')
+        if name in SYMBOLS:
+            if name.isalpha():
+                # Control words swallow the spaces after them
+                match = re.compile(r'[ \t]*\n?[ \t]*').match(self.src, self.pos)
+                if not self.src.startswith('\n', match.end()):
+                    self.pos = match.end()
+            return SYMBOLS[name]
+        if name in ACCENTS:
+            letter = self.read_raw_group()
+            letter = {'\\i': 'i', '\\j': 'j'}.get(letter, letter)
+            return html.escape(unicodedata.normalize('NFC', letter + ACCENTS[name]))
+        if base in IGNORED:
+            self.read_optional()
+            for _ in range(IGNORED[base]):
+                self.read_raw_group()
+            return '<hr>' if base == 'rule' else ''
+        if name == 'href':
+            url = self.read_raw_group().strip().replace('\\#', '#').replace('\\%', '%').replace('\\_', '_')
+            label = self.render_group()
+            return self.link(url, label)
+        if name == 'url':
+            url = self.read_raw_group().strip()
+            return self.link(url, html.escape(url))
+        if name == 'textcolor':
+            self.read_optional()
+            self.read_raw_group()
+            return self.render_group()
+        if name == 'begin':
+            return self.environment(self.read_raw_group().strip())
+        # Preamble-only commands that can also appear in the body harmlessly
+        if name in ('documentclass', 'usepackage'):
+            self.read_optional()
+            self.read_raw_group()
+            return ''
+        self.flag(f'\\{name}')
+        return f'<span class="unsupported">{html.escape(name)}</span>'
+
+    def link(self, url, label):
+        if not SAFE_URL_RE.match(url):
+            url = f'https://{url}' if re.match(r'^[\w.-]+\.[a-z]{2,}(/|$)', url, re.IGNORECASE) else ''
+        if not url:
+            return label
+        return f'<a href="{html.escape(url)}" target="_blank" rel="noopener noreferrer">{label}</a>'
+
+    def environment(self, name):
+        if name in LISTS:
+            self.read_optional()
+            body = self.render(stop=name)
+            items = body.split(_ITEM)[1:]
+            if LISTS[name] == 'dl':
+                return '<dl>' + ''.join(f'<dd>{item.strip()}</dd>' for item in items) + '</dl>'
+            return f'<{LISTS[name]}>' + ''.join(f'<li>{item.strip()}</li>' for item in items) + f'</{LISTS[name]}>'
+        if name in BLOCKS:
+            if name == 'minipage':
+                self.read_optional()
+                self.read_raw_group()
+            return f'<div class="{BLOCKS[name]}">{self.render(stop=name)}</div>'
+        if name == 'document':
+            return self.render(stop=name)
+        self.flag(f'\\begin{{{name}}}')
+        return f'<div class="unsupported">{self.render(stop=name)}</div>'
+
+
+def _finish(body):
+    body = body.replace(_ITEM, '')
+    body = re.sub(f'(?:{re.escape(_PARAGRAPH)}\\s*)+', '<div class="par"></div>', body)
+    return re.sub(r'(<div class="par"></div>\s*)+$', '', body.strip())
+
+
+def render_preview(latex):
+    """Renders a resume's LaTeX to a standalone HTML document; see Preview.unsupported for what was skipped."""
+    start = latex.find('\\begin{document}')
+    body = latex[start + len('\\begin{document}'):] if start != -1 else latex
+    end = body.find('\\end{document}')
+    if end != -1:
+        body = body[:end]
+
+    # The preamble is skipped: macros it defines show up as unknown commands where the body uses them
+    renderer = _Renderer(body)
+    rendered = _finish(renderer.render())
+    document = (
+        '<!DOCTYPE html><html><head><meta charset="utf-8">'
+        f'<style>{STYLESHEET}</style></head><body><main>{rendered}</main></body></html>'
+    )
+    return Preview(document, renderer.unsupported)
+
+
+class PreviewCache:
+    """LRU of rendered previews keyed by the content hash of their LaTeX."""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_render(self, latex):
+        key = repository.content_hash(latex)
+        with self._lock:
+            preview = self._entries.get(key)
+            if preview is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return preview
+            self.misses += 1
+        preview = render_preview(latex)
+        with self._lock:
+            self._entries[key] = preview
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return preview
+
+
+preview_cache = PreviewCache(getattr(settings, 'PREVIEW_CACHE_SIZE', 256))
+
+
+def _collect_preview_metrics():
+    return [
+        ('hireinator_preview_cache_hits_total', 'counter', 'HTML previews served from the preview cache.',
+         preview_cache.hits),
+        ('hireinator_preview_cache_misses_total', 'counter', 'HTML previews that had to be rendered.',
+         preview_cache.misses),
+    ]
+
+
+register_collector(_collect_preview_metrics)
@@ -0,0 +1,232 @@
+# fns/prewarm.py
+"""
+Speculative per-user cache warming after login.
+
+The first download, preview or ranking after a user signs in usually misses
+every cache. When firebase_auth_required sees the first request of a user's
+session (a new Firebase `auth_time`, or no request from them for
+PREWARM_SESSION_IDLE_SECONDS), the user is queued here, and a single
+low-priority background thread then, for their PREWARM_RESUMES most
+recently updated resumes:
+
+- compiles the PDF into the shared PDF cache (fns/artifacts.py),
+- renders the HTML preview (fns/preview.py),
+- brings their job-fit index up to date (fns/scoring.py). This only happens
+  when the embedding model is already loaded; the warmer never loads one.
+
+The warmer stays out of the way of interactive work:
+
+- The thread, and the pdflatex processes it starts, run at a raised nice
+  level.
+- It only starts a step while the fair-share scheduler (fns/scheduler.py)
+  has nothing running or queued.
+- A step in progress is cancelled the moment an interactive job is queued.
+  It runs under its own Deadline, so pdflatex is killed just as for an
+  abandoned request, and the user is retried later.
+- Its CPU use is held to PREWARM_CPU_BUDGET CPUs, shared across the
+  server's worker processes, by sleeping between steps. A step's CPU time is
+  the warmer thread's own plus that of the child processes reaped meanwhile
+  (its pdflatex runs), so time spent waiting on storage isn't charged. Child
+  CPU is only known per process, so an interactive compile finishing during
+  a step is charged too, which errs towards sleeping longer.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+from django.conf import settings
+
+from . import deadlines, repository
+from .metrics import register_collector
+from .scheduler import scheduler
+
+# How often a paused warmer re-checks whether the scheduler has gone idle
+IDLE_POLL_SECONDS = 0.5
+MAX_TRACKED_SESSIONS = 10000
+
+
+def _workers():
+    for name in ('WEB_CONCURRENCY', 'GUNICORN_WORKERS'):
+        value = os.environ.get(name, '')
+        if value.isdigit() and int(value) > 0:
+            return int(value)
+    return 1
+
+
+class Prewarmer:
+
+    def __init__(self, enabled=True, resumes_per_user=3, cpu_budget=0.5, session_idle_seconds=1800, queue_size=100):
+        self.enabled = enabled
+        self.resumes_per_user = resumes_per_user
+        # This process's share of the machine-wide budget, as a fraction of one CPU
+        self.duty_cycle = min(1.0, cpu_budget / _workers())
+        self.session_idle_seconds = session_idle_seconds
+        self.queue_size = queue_size
+        self.warmed = 0
+        self.compiled = 0
+        self.preempted = 0
+        self.dropped = 0
+        self._sessions = OrderedDict()   # user -> (auth_time, last seen)
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._deadline = None
+
+    # --- Called on every authenticated request ---
+
+    def note_request(self, user_uid, decoded_token):
+        """Queues the user for warming if this request starts a new session. Cheap enough for every request."""
+        if not self.enabled or self.duty_cycle <= 0:
+            return
+        marker = decoded_token.get('auth_time')
+        now = time.monotonic()
+        with self._lock:
+            previous = self._sessions.get(user_uid)
+            self._sessions[user_uid] = (marker, now)
+            self._sessions.move_to_end(user_uid)
+            if len(self._sessions) > MAX_TRACKED_SESSIONS:
+                self._sessions.popitem(last=False)
+            if previous is not None and previous[0] == marker and now - previous[1] < self.session_idle_seconds:
+                return
+            if user_uid in self._queue:
+                return
+            if len(self._queue) >= self.queue_size:
+                self.dropped += 1
+                return
+            self._queue.append(user_uid)
+            self._start()
+        self._wake.set()
+
+    def _start(self):
+        # Started on first use, i.e. in the worker process rather than a preloading master
+        if self._thread is None:
+            scheduler.on_enqueue(self._preempt)
+            self._thread = threading.Thread(target=self._run, name='prewarm', daemon=True)
+            self._thread.start()
+
+    def _preempt(self):
+        deadline = self._deadline
+        if deadline is not None:
+            deadline.cancel('preempted')
+
+    # --- Background thread ---
+
+    def _run(self):
+        try:
+            # Linux applies nice per thread, and children inherit it
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+        except (AttributeError, OSError):
+            pass
+        while True:
+            self._wake.wait()
+            with self._lock:
+                if not self._queue:
+                    self._wake.clear()
+                    continue
+                user_uid = self._queue.popleft()
+            try:
+                self._warm_user(user_uid)
+                with self._lock:
+                    self.warmed += 1
+            except deadlines.RequestCancelled:
+                with self._lock:
+                    self.preempted += 1
+                    # Steps already done are cache hits next time
+                    if user_uid not in self._queue:
+                        self._queue.appendleft(user_uid)
+            except Exception as e:
+                print(f"⚠️ Pre-warming caches for {user_uid} failed: {e}")
+
+    def _warm_user(self, user_uid):
+        from . import preview, scoring, views
+        from .artifacts import pdf_cache
+
+        rows = self._step(repository.list_user_resumes, user_uid, ['lastUpdated'])
+        rows.sort(key=lambda row: _timestamp(row[1].get('lastUpdated')), reverse=True)
+        resume_ids = [resume_id for resume_id, _ in rows[:self.resumes_per_user]]
+        if not resume_ids:
+            return
+        resumes = self._step(repository.get_resumes, resume_ids, views.CONTENT_READ_FIELDS)
+
+        for resume_id in resume_ids:
+            latex = (resumes.get(resume_id) or {}).get('latexContent')
+            if not latex:
+                continue
+            if self._step(pdf_cache.get, pdf_cache.key(latex)) is None:
+                # Looked up at call time, so tests and the load harness can swap the compiler
+                if self._step(pdf_cache.get_or_compile, latex, views.compile_latex_to_pdf_bytes):
+                    with self._lock:
+                        self.compiled += 1
+            self._step(preview.preview_cache.get_or_render, latex)
+
+        self._step(scoring.warm_index, user_uid)
+
+    def _step(self, fn, *args):
+        """Runs one unit of work once interactive work is idle, cancellably, then sleeps off its CPU budget."""
+        while True:
+            while scheduler.stats() != (0, 0):
+                time.sleep(IDLE_POLL_SECONDS)
+            deadline = self._deadline = deadlines.Deadline()
+            # From here on a newly queued job cancels the step; one that slipped in before waits it out
+            if scheduler.stats() == (0, 0):
+                break
+        started = _cpu_seconds()
+        try:
+            with deadlines.running_under(deadline):
+                deadline.check()
+                return fn(*args)
+        finally:
+            self._deadline = None
+            busy = _cpu_seconds() - started
+            time.sleep(busy * (1 - self.duty_cycle) / self.duty_cycle)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'queued': len(self._queue),
+                'warmed': self.warmed,
+                'compiled': self.compiled,
+                'preempted': self.preempted,
+                'dropped': self.dropped,
+            }
+
+
+def _cpu_seconds():
+    """CPU time of the calling thread plus that of this process's reaped child processes."""
+    times = os.times()
+    return time.thread_time() + times.children_user + times.children_system
+
+
+def _timestamp(value):
+    try:
+        return value.timestamp()
+    except (AttributeError, TypeError, ValueError):
+        return 0.0
+
+
+prewarmer = Prewarmer(
+    enabled=getattr(settings, 'PREWARM_ENABLED', True),
+    resumes_per_user=getattr(settings, 'PREWARM_RESUMES', 3),
+    cpu_budget=getattr(settings, 'PREWARM_CPU_BUDGET', 0.5),
+    session_idle_seconds=getattr(settings, 'PREWARM_SESSION_IDLE_SECONDS', 1800),
+    queue_size=getattr(settings, 'PREWARM_QUEUE_SIZE', 100),
+)
+
+
+def _collect_prewarm_metrics():
+    stats = prewarmer.stats()
+    return [
+        ('hireinator_prewarm_queued', 'gauge', 'Users waiting for speculative cache warming.', stats['queued']),
+        ('hireinator_prewarm_users_total', 'counter', 'Users whose caches were warmed after login.', stats['warmed']),
+        ('hireinator_prewarm_compiles_total', 'counter', 'PDFs compiled speculatively.', stats['compiled']),
+        ('hireinator_prewarm_preempted_total', 'counter', 'Warming steps cancelled for interactive work.',
+         stats['preempted']),
+        ('hireinator_prewarm_dropped_total', 'counter', 'Sessions not warmed because the queue was full.',
+         stats['dropped']),
+    ]
+
+
+register_collector(_collect_prewarm_metrics)
@@ -0,0 +1,280 @@
+# fns/profiling.py
+"""
+On-demand CPU and memory captures of individual requests.
+
+With PROFILING_ENABLED set, ProfilingMiddleware profiles selected requests
+with cProfile and tracemalloc and stores a report under an id generated
+here (returned in the X-Request-Id header; a client-sent one is ignored, so
+it can't pick or overwrite report names). A request is selected when
+
+- it carries `X-Profile: <PROFILING_TOKEN>`,
+- its Firebase user is listed in PROFILING_USER_IDS; the user is looked up
+  in the verified-token cache only, so the middleware never verifies a
+  token itself and a session's very first request isn't selected, or
+- it falls in the PROFILING_SAMPLE_RATE random sample.
+
+Only one request is captured at a time: cProfile and tracemalloc are
+process-wide, and overlapping captures would attribute each other's work.
+The profile covers the request thread, i.e. the view, humanizer and
+template/compile code; Gemini calls run on the cancellable-call pool (see
+fns/deadlines.py) and show up as the time spent waiting for them. The
+report also carries the request's stage spans, which split wall time by
+layer.
+
+Reports (a JSON summary and the raw pstats dump, for snakeviz and friends)
+are kept in PROFILING_DIR, newest PROFILING_MAX_REPORTS only, and served to
+holders of PROFILING_TOKEN by the profiles/ views.
+When PROFILING_ENABLED is off the middleware removes itself from the chain
+(MiddlewareNotUsed) and requests pay nothing.
+"""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import re
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from . import metrics
+
+TOP_N = 30
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+def reports_dir():
+    return getattr(settings, 'PROFILING_DIR', None) or os.path.join(tempfile.gettempdir(), 'hireinator-profiles')
+
+
+def is_admin(request):
+    """Whether the request carries the profiling admin token (never true when no token is configured)."""
+    token = getattr(settings, 'PROFILING_TOKEN', '')
+    return bool(token) and request.headers.get('Authorization') == f'Bearer {token}'
+
+
+# --- Report building ---
+
+def _function_rows(stats, sort_key):
+    rows = []
+    for (filename, lineno, name), (primitive_calls, calls, tottime, cumtime, _) in stats.stats.items():
+        rows.append({
+            'function': f'{filename}:{lineno}({name})',
+            'calls': calls,
+            'primitiveCalls': primitive_calls,
+            'ownSeconds': round(tottime, 6),
+            'cumulativeSeconds': round(cumtime, 6),
+        })
+    rows.sort(key=lambda row: row[sort_key], reverse=True)
+    return rows[:TOP_N]
+
+
+def _allocation_rows(before, after):
+    rows = []
+    for stat in after.compare_to(before, 'lineno')[:TOP_N]:
+        frame = stat.traceback[0]
+        rows.append({
+            'site': f'{frame.filename}:{frame.lineno}',
+            'sizeDiffBytes': stat.size_diff,
+            'sizeBytes': stat.size,
+            'countDiff': stat.count_diff,
+        })
+    return rows
+
+
+def build_report(request_id, request, status_code, elapsed, profiler, snapshots, peak_bytes, trace, reason):
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    report = {
+        'requestId': request_id,
+        'method': request.method,
+        'path': request.path,
+        'status': status_code,
+        'userId': getattr(request, 'user_id', None),
+        'reason': reason,
+        'capturedAt': time.time(),
+        'elapsedMs': round(elapsed * 1000, 1),
+        'cpuSeconds': round(stats.total_tt, 6),
+        'stages': [{'stage': stage, 'ms': round(ms, 1), 'roundTrips': trips} for stage, ms, trips in trace.spans]
+                  if trace is not None else [],
+        'topFunctionsByCumulative': _function_rows(stats, 'cumulativeSeconds'),
+        'topFunctionsByOwnTime': _function_rows(stats, 'ownSeconds'),
+        'memory': None,
+    }
+    if snapshots is not None:
+        before, after = snapshots
+        report['memory'] = {
+            'peakTracedBytes': peak_bytes,
+            'netAllocatedBytes': sum(stat.size_diff for stat in after.compare_to(before, 'filename')),
+            'topAllocationSites': _allocation_rows(before, after),
+        }
+    return report
+
+
+# --- Report storage ---
+
+class ReportStore:
+    """JSON summaries and pstats dumps on disk, keyed by request id, newest `max_reports` kept."""
+
+    def __init__(self, directory, max_reports=50):
+        self.directory = directory
+        self.max_reports = max_reports
+        self._lock = threading.Lock()
+
+    def _path(self, request_id, extension):
+        return os.path.join(self.directory, f'{request_id}.{extension}')
+
+    def save(self, report, profiler):
+        os.makedirs(self.directory, exist_ok=True)
+        request_id = report['requestId']
+        with self._lock:
+            profiler.dump_stats(self._path(request_id, 'prof'))
+            with open(self._path(request_id, 'json'), 'w', encoding='utf-8') as f:
+                json.dump(report, f)
+            self._prune()
+
+    def _prune(self):
+        reports = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.name.endswith('.json')),
+            key=lambda entry: entry.stat().st_mtime,
+        )
+        for entry in reports[:max(0, len(reports) - self.max_reports)]:
+            request_id = entry.name[:-len('.json')]
+            for extension in ('json', 'prof'):
+                try:
+                    os.remove(self._path(request_id, extension))
+                except FileNotFoundError:
+                    pass
+
+    def list(self):
+        """Newest first, without the function and allocation tables."""
+        if not os.path.isdir(self.directory):
+            return []
+        summaries = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith('.json'):
+                continue
+            try:
+                with open(entry.path, encoding='utf-8') as f:
+                    report = json.load(f)
+            except (OSError, ValueError):
+                continue
+            summaries.append({key: report.get(key) for key in (
+                'requestId', 'method', 'path', 'status', 'userId', 'reason', 'capturedAt', 'elapsedMs', 'cpuSeconds',
+            )})
+        summaries.sort(key=lambda summary: summary['capturedAt'] or 0, reverse=True)
+        return summaries
+
+    def get(self, request_id):
+        try:
+            with open(self._path(request_id, 'json'), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def pstats_path(self, request_id):
+        path = self._path(request_id, 'prof')
+        return path if os.path.exists(path) else None
+
+
+report_store = ReportStore(reports_dir(), getattr(settings, 'PROFILING_MAX_REPORTS', 50))
+
+# cProfile and tracemalloc are process-wide: one capture at a time
+_capture_lock = threading.Lock()
+
+
+# --- Middleware ---
+
+class ProfilingMiddleware:
+    """
+    Captures a cProfile profile and tracemalloc allocation diff of selected
+    requests (see the module docstring). Goes after RequestMetricsMiddleware
+    so the request's stage spans are available to the report.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.token = getattr(settings, 'PROFILING_TOKEN', '')
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0)
+        self.user_ids = set(getattr(settings, 'PROFILING_USER_IDS', ()))
+        self.trace_memory = getattr(settings, 'PROFILING_TRACE_MEMORY', True)
+
+    def _reason(self, request):
+        if self.token and request.headers.get('X-Profile') == self.token:
+            return 'header'
+        if self.user_ids and self._user_id(request) in self.user_ids:
+            return 'user'
+        if self.sample_rate and random.random() < self.sample_rate:
+            return 'sample'
+        return None
+
+    @staticmethod
+    def _user_id(request):
+        auth_header = request.headers.get('Authorization', '')
+        if not auth_header.startswith('Bearer '):
+            return None
+        from .decorators import token_cache
+        decoded = token_cache.peek(token_cache.key(auth_header.split(' ').pop()))
+        return decoded.get('uid') if decoded else None
+
+    def __call__(self, request):
+        reason = self._reason(request)
+        if reason is None:
+            return self.get_response(request)
+        if not _capture_lock.acquire(blocking=False):
+            metrics.PROFILES.inc('skipped')
+            return self.get_response(request)
+        try:
+            return self._capture(request, reason)
+        finally:
+            _capture_lock.release()
+
+    def _capture(self, request, reason):
+        request_id = uuid.uuid4().hex[:16]
+
+        started_tracing = False
+        before = None
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(getattr(settings, 'PROFILING_TRACEMALLOC_FRAMES', 1))
+                started_tracing = True
+            tracemalloc.reset_peak()
+            before = tracemalloc.take_snapshot()
+
+        profiler = cProfile.Profile()
+        status_code = 500
+        start = time.perf_counter()
+        try:
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+            status_code = response.status_code
+            response['X-Request-Id'] = request_id
+            return response
+        finally:
+            elapsed = time.perf_counter() - start
+            snapshots, peak_bytes = None, None
+            if before is not None:
+                snapshots = (before, tracemalloc.take_snapshot())
+                peak_bytes = tracemalloc.get_traced_memory()[1]
+                if started_tracing:
+                    tracemalloc.stop()
+            try:
+                report = build_report(request_id, request, status_code, elapsed, profiler, snapshots, peak_bytes,
+                                      metrics.current_trace(), reason)
+                report_store.save(report, profiler)
+                metrics.PROFILES.inc('captured')
+                print(f"🔬 Profiled {request.method} {request.path} as {request_id} ({reason}): "
+                      f"{report['elapsedMs']:.0f}ms, {report['cpuSeconds']:.3f}s profiled CPU")
+            except Exception as e:
+                print(f"⚠️ Could not save profile {request_id}: {e}")
@@ -0,0 +1,508 @@
+# fns/repository.py
+"""
+Read-through access to the `resumes` and `users` collections.
+
+All views go through this module instead of fetching documents themselves.
+It sits on the configured storage backend (Firestore by default, see
+fns/storage.py). Resume reads are kept in a small per-process TTL/LRU cache
+which is invalidated whenever this process writes the document. Other
+processes only see such a write once their copy expires, so reads whose
+result feeds a write, or a conditional response, pass `fresh=True` to go
+to storage (and refresh the cached copy).
+"""
+
+import base64
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+
+from django.conf import settings
+
+from . import versioning
+from . import metrics
+from .storage import SERVER_TIMESTAMP, get_storage
+
+RESUMES_COLLECTION = 'resumes'
+USERS_COLLECTION = 'users'
+# One document per stored version, with id '<resumeId>_<version>' (see fns/versioning.py)
+VERSIONS_COLLECTION = 'resumeVersions'
+VERSION_META_FIELDS = ['version', 'kind', 'storedBytes', 'textBytes', 'createdAt']
+
+SNAPSHOT_INTERVAL = getattr(settings, 'RESUME_SNAPSHOT_INTERVAL', versioning.DEFAULT_SNAPSHOT_INTERVAL)
+
+# Field projections used by the views. `userId` is always needed for the ownership check.
+OWNER_FIELDS = ['userId']
+RESUME_META_FIELDS = ['userId', 'resumeName', 'originalFilename', 'isDraft', 'createdAt', 'lastUpdated']
+RESUME_CONTENT_FIELDS = ['userId', 'resumeName', 'latexContent']
+RESUME_DETAIL_FIELDS = RESUME_META_FIELDS + ['latexContent', 'jobDescription', 'versionCount']
+# What commit_resume_version needs to know about the current version
+RESUME_VERSIONING_FIELDS = ['latexContent', 'versionCount', 'snapshotVersion']
+# Fields returned by the paginated resume list.
+RESUME_LIST_FIELDS = ['resumeName', 'originalFilename', 'isDraft', 'createdAt', 'lastUpdated']
+# Enough to tell whether a resume's content (or target job) changed without reading it (see fns/scoring.py)
+RESUME_FINGERPRINT_FIELDS = ['resumeName', 'contentHash', 'jobDescription']
+
+
+def content_hash(text):
+    """The value stored in a resume's `contentHash` field whenever its latexContent is written."""
+    return hashlib.sha256((text or '').encode('utf-8')).hexdigest()[:32]
+
+
+def _with_content_hash(data):
+    if 'latexContent' in data:
+        return {**data, 'contentHash': content_hash(data['latexContent'])}
+    return data
+
+
+class ResumeNotFound(Exception):
+    pass
+
+
+class ResumePermissionDenied(Exception):
+    pass
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class ResumeCache:
+    """
+    A thread-safe LRU cache with a per-entry TTL.
+
+    Each entry remembers which fields it holds (None meaning the whole
+    document), so a projected read can be served from a wider cached read
+    but never the other way around.
+    """
+
+    def __init__(self, max_entries=512, ttl_seconds=30.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, fields=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, cached_fields, data = entry
+                if expires_at < time.monotonic():
+                    del self._entries[key]
+                elif cached_fields is None or (fields is not None and set(fields) <= cached_fields):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return _project(data, fields)
+            self.misses += 1
+            return None
+
+    def put(self, key, data, fields=None):
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (
+                time.monotonic() + self.ttl_seconds,
+                None if fields is None else set(fields),
+                dict(data),
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def _project(data, fields):
+    if fields is None:
+        return dict(data)
+    return {field: data[field] for field in fields if field in data}
+
+
+resume_cache = ResumeCache(
+    max_entries=getattr(settings, 'RESUME_CACHE_MAX_ENTRIES', 512),
+    ttl_seconds=getattr(settings, 'RESUME_CACHE_TTL_SECONDS', 30.0),
+)
+
+
+@contextmanager
+def _round_trip(stage):
+    """Times one storage round trip as a pipeline span and counts it."""
+    with metrics.span(stage):
+        yield
+        metrics.count_round_trip()
+
+
+def _collect_cache_metrics():
+    return [
+        ('hireinator_resume_cache_hits_total', 'counter', 'Resume reads served from the cache.', resume_cache.hits),
+        ('hireinator_resume_cache_misses_total', 'counter', 'Resume reads that went to storage.', resume_cache.misses),
+    ]
+
+
+metrics.register_collector(_collect_cache_metrics)
+
+
+# --- Reads ---
+
+def get_resume(resume_id, fields=None, fresh=False):
+    """
+    Returns the resume as a dict (optionally projected), or None if it doesn't
+    exist. `fresh` skips the cache, for reads another process may have outdated.
+    """
+    cached = None if fresh else resume_cache.get(resume_id, fields)
+    if cached is not None:
+        return cached
+
+    with _round_trip('storage.get'):
+        data = get_storage().get(RESUMES_COLLECTION, resume_id, fields)
+    if data is None:
+        return None
+
+    resume_cache.put(resume_id, data, fields)
+    return data
+
+
+def get_owned_resume(user_uid, resume_id, fields=None, fresh=False):
+    """
+    Returns the resume if it exists and belongs to `user_uid`.
+    Raises ResumeNotFound or ResumePermissionDenied otherwise.
+    """
+    fields = _with_owner(fields)
+    return _check_owner(user_uid, resume_id, get_resume(resume_id, fields, fresh))
+
+
+def get_owned_resume_and_user(user_uid, resume_id, resume_fields=None, user_fields=None, fresh=False):
+    """
+    Fetches an owned resume together with its owner's profile.
+
+    On a resume cache miss (or with `fresh`) both documents are read in a
+    single `get_all` round trip instead of two serial reads. Returns
+    (resume_data, user_data).
+    """
+    resume_fields = _with_owner(resume_fields)
+    cached = None if fresh else resume_cache.get(resume_id, resume_fields)
+    if cached is not None:
+        return _check_owner(user_uid, resume_id, cached), get_user(user_uid, user_fields)
+
+    field_paths = None
+    if resume_fields is not None and user_fields is not None:
+        field_paths = list(dict.fromkeys(resume_fields + list(user_fields)))
+
+    resume_key, user_key = (RESUMES_COLLECTION, resume_id), (USERS_COLLECTION, user_uid)
+    with _round_trip('storage.get_all'):
+        found = get_storage().get_all([resume_key, user_key], field_paths)
+
+    resume_data = found.get(resume_key)
+    if resume_data is not None:
+        resume_data = _project(resume_data, resume_fields)
+        resume_cache.put(resume_id, resume_data, resume_fields)
+    user_data = _project(found.get(user_key, {}), user_fields)
+
+    return _check_owner(user_uid, resume_id, resume_data), user_data
+
+
+def _with_owner(fields):
+    if fields is not None and 'userId' not in fields:
+        return ['userId', *fields]
+    return fields
+
+
+def _check_owner(user_uid, resume_id, data):
+    if data is None:
+        raise ResumeNotFound(resume_id)
+    if data.get('userId') != user_uid:
+        raise ResumePermissionDenied(resume_id)
+    return data
+
+
+def get_resumes(resume_ids, fields=None):
+    """
+    Bulk read. Returns {resume_id: data} for the ids that exist, fetching
+    every cache miss in a single `get_all` round trip.
+    """
+    found, missing = {}, []
+    for resume_id in dict.fromkeys(resume_ids):
+        cached = resume_cache.get(resume_id, fields)
+        if cached is not None:
+            found[resume_id] = cached
+        else:
+            missing.append(resume_id)
+
+    if missing:
+        keys = [(RESUMES_COLLECTION, resume_id) for resume_id in missing]
+        with _round_trip('storage.get_all'):
+            fetched = get_storage().get_all(keys, fields)
+        for (_, resume_id), data in fetched.items():
+            resume_cache.put(resume_id, data, fields)
+            found[resume_id] = data
+    return found
+
+
+def list_user_resumes(user_uid, fields=None):
+    """Returns [(resume_id, data), ...] for every resume the user owns, newest first."""
+    with _round_trip('storage.query'):
+        return get_storage().query_by_user(RESUMES_COLLECTION, user_uid, fields=fields)
+
+
+def encode_cursor(created_at, resume_id):
+    payload = json.dumps({'t': created_at.isoformat(), 'id': resume_id}).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(payload['t']), payload['id']
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor(cursor) from e
+
+
+def _query_page(user_uid, limit, cursor, fields):
+    """Returns (rows, next_cursor, etag) for one page, reading `fields` plus what the cursor and ETag need."""
+    start_after = decode_cursor(cursor) if cursor else None
+
+    # Fetch one extra document to find out whether another page exists.
+    with _round_trip('storage.query'):
+        rows = get_storage().query_by_user(
+            RESUMES_COLLECTION, user_uid, limit=limit + 1, start_after=start_after,
+            fields=list(dict.fromkeys(['createdAt', 'lastUpdated', *fields])),
+        )
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last_id, last_data = rows[-1]
+        next_cursor = encode_cursor(last_data['createdAt'], last_id)
+
+    # Every resume write stamps lastUpdated, so ids and stamps identify the page contents
+    digest = hashlib.sha256()
+    digest.update(json.dumps(
+        [[(resume_id, data.get('lastUpdated')) for resume_id, data in rows], next_cursor], default=str,
+    ).encode())
+    return rows, next_cursor, f'"{digest.hexdigest()[:32]}"'
+
+
+def list_user_resumes_page(user_uid, limit=20, cursor=None, fields=RESUME_LIST_FIELDS):
+    """
+    Returns one page of the user's resumes, newest first, projected to `fields`.
+
+    The result is a dict with `resumes` ([{'id': ..., **fields}]), `nextCursor`
+    (None on the last page) and `etag`, which changes whenever a resume on the
+    page changes, or the page gains or loses one.
+
+    Pages are always read from storage, never from a per-process cache: a
+    rename or delete handled by another worker must show on the next load.
+    """
+    rows, next_cursor, etag = _query_page(user_uid, limit, cursor, fields)
+    resumes = [{'id': resume_id, **{field: data.get(field) for field in fields}} for resume_id, data in rows]
+    return {'resumes': resumes, 'nextCursor': next_cursor, 'etag': etag}
+
+
+def resume_page_etag(user_uid, limit=20, cursor=None):
+    """
+    The `etag` list_user_resumes_page would return for this page, from a
+    query projected to ids and timestamps. Always read from storage, like
+    the other conditional checks (another process may have changed the page).
+    """
+    return _query_page(user_uid, limit, cursor, [])[2]
+
+
+def get_user(user_uid, fields=None):
+    """Returns the user's profile document as a dict ({} if it doesn't exist yet)."""
+    # User profiles are written directly by the frontend, so they are never cached here.
+    with _round_trip('storage.get'):
+        data = get_storage().get(USERS_COLLECTION, user_uid, fields)
+    return data or {}
+
+
+# --- Writes (each one invalidates the cached copy) ---
+
+def create_resume(data):
+    """Adds a new resume document and returns its id."""
+    with _round_trip('storage.write'):
+        resume_id = get_storage().add(RESUMES_COLLECTION, _with_content_hash(data))
+    resume_cache.invalidate(resume_id)
+    return resume_id
+
+
+def update_resume(resume_id, data):
+    with _round_trip('storage.write'):
+        get_storage().update(RESUMES_COLLECTION, resume_id, _with_content_hash(data))
+    resume_cache.invalidate(resume_id)
+
+
+def delete_resume(resume_id, version_count=0):
+    """Deletes a resume and its stored version history."""
+    delete_resumes({resume_id: version_count})
+
+
+def delete_resumes(version_counts):
+    """
+    Deletes several resumes (a {resume_id: version_count} mapping) together
+    with their version history, using batched writes (at most 500 per batch).
+    """
+    refs = []
+    for resume_id, version_count in version_counts.items():
+        refs.append((resume_id, None))
+        refs.extend((resume_id, version) for version in range(version_count or 0))
+
+    for start in range(0, len(refs), WriteBatch.MAX_WRITES):
+        with WriteBatch() as batch:
+            for resume_id, version in refs[start:start + WriteBatch.MAX_WRITES]:
+                if version is None:
+                    batch.delete_resume(resume_id)
+                else:
+                    batch.delete_version(resume_id, version)
+
+
+# --- Version history ---
+
+def version_doc_id(resume_id, version):
+    return f"{resume_id}_{version:06d}"
+
+
+def create_resume_with_history(data):
+    """Creates a resume and stores its content as version 0, in one batch. Returns the new id."""
+    with WriteBatch() as batch:
+        resume_id = batch.create_resume({**data, 'versionCount': 1, 'snapshotVersion': 0})
+        batch.add_version(resume_id, data['userId'], versioning.build_entry(0, data['latexContent']))
+    return resume_id
+
+
+def commit_resume_version(resume_id, user_uid, current, new_latex, extra_fields=None):
+    """
+    Replaces the resume's latexContent with `new_latex` and appends it to the
+    version history, in a single batch.
+
+    `current` is the resume as read (it must include
+    RESUME_VERSIONING_FIELDS). Resumes created before version history existed
+    get their current content stored as version 0 first. Returns the new
+    version number.
+    """
+    current_latex = current.get('latexContent', '')
+    version_count = current.get('versionCount') or 0
+    snapshot_version = current.get('snapshotVersion')
+
+    with WriteBatch() as batch:
+        if version_count == 0:
+            batch.add_version(resume_id, user_uid, versioning.build_entry(0, current_latex))
+            version_count, snapshot_version = 1, 0
+        entry = versioning.build_entry(version_count, new_latex, current_latex, SNAPSHOT_INTERVAL, snapshot_version)
+        batch.add_version(resume_id, user_uid, entry)
+        fields = {**(extra_fields or {}), 'latexContent': new_latex, 'versionCount': version_count + 1}
+        if 'snapshotVersion' in entry:
+            fields['snapshotVersion'] = entry['snapshotVersion']
+        batch.update_resume(resume_id, fields)
+    return version_count
+
+
+def list_versions(resume_id, version_count):
+    """Returns metadata (no content) for every stored version, oldest first."""
+    if not version_count:
+        return []
+    keys = [(VERSIONS_COLLECTION, version_doc_id(resume_id, version)) for version in range(version_count)]
+    with _round_trip('storage.get_all'):
+        versions = list(get_storage().get_all(keys, VERSION_META_FIELDS).values())
+    return sorted(versions, key=lambda version: version['version'])
+
+
+def _get_version_entries(resume_id, numbers):
+    keys = [(VERSIONS_COLLECTION, version_doc_id(resume_id, number)) for number in numbers]
+    with _round_trip('storage.get_all'):
+        entries = list(get_storage().get_all(keys).values())
+    return sorted(entries, key=lambda entry: entry['version'])
+
+
+def get_version_text(resume_id, version):
+    """
+    Rebuilds the LaTeX of one version from its nearest snapshot and the deltas after it.
+
+    The chain is first read as the current SNAPSHOT_INTERVAL lays it out
+    (one round trip). History written under another interval may start
+    further back; then the oldest entry's snapshotVersion says where, or,
+    for entries that predate it, the read steps back one interval at a time.
+    """
+    entries = _get_version_entries(resume_id, versioning.chain_for(version, SNAPSHOT_INTERVAL))
+    if not entries or entries[-1]['version'] != version:
+        raise ResumeNotFound(version_doc_id(resume_id, version))
+    while not any(entry['kind'] == versioning.SNAPSHOT for entry in entries) and entries[0]['version'] > 0:
+        oldest = entries[0]['version']
+        start = entries[0].get('snapshotVersion')
+        if start is None or start >= oldest:
+            start = max(0, oldest - SNAPSHOT_INTERVAL)
+        older = _get_version_entries(resume_id, range(start, oldest))
+        if not older:
+            break
+        entries = older + entries
+    return versioning.reconstruct(entries)
+
+
+class WriteBatch:
+    """
+    Groups writes that belong together into one atomic commit (one round trip).
+
+        with repository.WriteBatch() as batch:
+            new_id = batch.create_resume({...})
+            batch.update_resume(other_id, {...})
+
+    The batch commits when the block exits without an exception, and the
+    cached copies of every touched resume are invalidated afterwards.
+    """
+    MAX_WRITES = 500
+
+    def __init__(self):
+        self._storage = get_storage()
+        self._batch = self._storage.batch()
+        self._touched = []
+
+    def create_resume(self, data):
+        resume_id = self._storage.new_id(RESUMES_COLLECTION)
+        self._batch.set(RESUMES_COLLECTION, resume_id, _with_content_hash(data))
+        self._touched.append(resume_id)
+        return resume_id
+
+    def add_version(self, resume_id, user_uid, entry):
+        # `create` fails the whole batch if another writer already stored this version
+        self._batch.create(VERSIONS_COLLECTION, version_doc_id(resume_id, entry['version']), {
+            **entry,
+            'resumeId': resume_id,
+            'userId': user_uid,
+            'createdAt': SERVER_TIMESTAMP,
+        })
+
+    def delete_version(self, resume_id, version):
+        self._batch.delete(VERSIONS_COLLECTION, version_doc_id(resume_id, version))
+
+    def update_resume(self, resume_id, data):
+        self._batch.update(RESUMES_COLLECTION, resume_id, _with_content_hash(data))
+        self._touched.append(resume_id)
+
+    def delete_resume(self, resume_id):
+        self._batch.delete(RESUMES_COLLECTION, resume_id)
+        self._touched.append(resume_id)
+
+    def commit(self):
+        with _round_trip('storage.write'):
+            self._batch.commit()
+        for resume_id in self._touched:
+            resume_cache.invalidate(resume_id)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        return False
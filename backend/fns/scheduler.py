@@ -0,0 +1,232 @@
+# fns/scheduler.py
+"""
+Per-user fair-share scheduling of expensive work (PDF conversion, tailor,
+refine, pdflatex compiles).
+
+Each worker process admits at most SCHEDULER_CAPACITY expensive jobs at a
+time. Waiting jobs are ordered by start-time fair queuing: a job's virtual
+start tag is max(the virtual clock, the finish tag of its user's previous
+job), and its finish tag adds the job's cost (COSTS, by kind) divided by the
+user's weight (SCHEDULER_USER_WEIGHTS, 1 by default). Jobs start in
+start-tag order, so each user with queued work gets a share of capacity
+proportional to their weight however much they submit, and a user
+batch-refining only delays their own queue. On top of that, a user may run at most
+SCHEDULER_USER_CONCURRENCY jobs at once and have at most SCHEDULER_USER_BURST
+running or queued; past that the job is refused with QueueFull (a 429 with
+Retry-After).
+
+Waiting honours the request's deadline (see fns/deadlines.py): a cancelled
+request leaves the queue immediately. Queue waits are recorded as
+`queue.<kind>` spans. State is per process, like the caches.
+"""
+
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.http import JsonResponse
+
+from . import deadlines
+from .metrics import register_collector, span
+
+# Relative cost of each kind of job, roughly its service time
+COSTS = {'convert': 2.0, 'tailor': 4.0, 'refine': 4.0, 'compile': 1.0}
+
+
+class QueueFull(Exception):
+    """The user already has their burst quota of expensive work running or queued."""
+
+    def __init__(self, retry_after):
+        super().__init__("Too many requests in progress; try again shortly.")
+        self.retry_after = retry_after
+
+
+class _Job:
+    __slots__ = ('user', 'kind', 'start', 'finish', 'seq', 'granted', 'enqueued_at')
+
+    def __init__(self, user, kind, start, finish, seq):
+        self.user = user
+        self.kind = kind
+        self.start = start
+        self.finish = finish
+        self.seq = seq
+        self.granted = False
+        self.enqueued_at = time.monotonic()
+
+
+class FairScheduler:
+
+    def __init__(self, capacity=4, user_concurrency=2, user_burst=6, costs=None, user_weights=None):
+        self.capacity = capacity
+        self.user_concurrency = user_concurrency
+        self.user_burst = user_burst
+        self.costs = dict(costs or COSTS)
+        # user -> relative share of capacity; users not listed get 1
+        self.user_weights = dict(user_weights or {})
+        self.rejected = 0
+        self._cond = threading.Condition()
+        self._queue = []
+        self._running = {}
+        self._pending = {}     # user -> running + queued
+        self._last_finish = {}
+        self._clock = 0.0
+        self._seq = itertools.count()
+        # Exponentially weighted service time per kind, for wait estimates
+        self._service = {}
+        self._enqueue_listeners = []
+
+    # --- Public API ---
+
+    @contextmanager
+    def slot(self, user, kind):
+        """Holds one unit of capacity for `user` while the block runs; blocks until it is their turn."""
+        job = self._enqueue(user, kind)
+        for callback in list(self._enqueue_listeners):
+            callback()
+        deadline = deadlines.current()
+        unregister = deadline.on_cancel(self._wake) if deadline is not None else (lambda: None)
+        try:
+            with span(f'queue.{kind}'):
+                self._wait(job, deadline)
+        except BaseException:
+            unregister()
+            self._finish(job, None)
+            raise
+        unregister()
+        started = time.monotonic()
+        try:
+            yield job
+        finally:
+            self._finish(job, time.monotonic() - started)
+
+    def run(self, user, kind, fn, *args, **kwargs):
+        with self.slot(user, kind):
+            return fn(*args, **kwargs)
+
+    def on_enqueue(self, callback):
+        """Calls `callback()` whenever a job is admitted to the queue, so background work can get out of its way."""
+        self._enqueue_listeners.append(callback)
+
+    def status(self, user):
+        """The user's running job count and, for each queued job, its position and estimated wait."""
+        with self._cond:
+            order = sorted(self._queue, key=lambda job: (job.start, job.seq))
+            queued, ahead_seconds = [], 0.0
+            for position, job in enumerate(order, start=1):
+                ahead_seconds += self._expected(job.kind)
+                if job.user == user:
+                    queued.append({
+                        'kind': job.kind,
+                        'position': position,
+                        'estimatedWaitSeconds': round(ahead_seconds / max(self.capacity, 1), 1),
+                    })
+            return {
+                'running': self._running.get(user, 0),
+                'queued': queued,
+                'capacity': self.capacity,
+                'inFlight': sum(self._running.values()),
+                'queueLength': len(self._queue),
+            }
+
+    def stats(self):
+        with self._cond:
+            return sum(self._running.values()), len(self._queue)
+
+    # --- Internals (all under self._cond) ---
+
+    def _expected(self, kind):
+        return self._service.get(kind, self.costs.get(kind, 1.0))
+
+    def _enqueue(self, user, kind):
+        with self._cond:
+            if self._pending.get(user, 0) >= self.user_burst:
+                self.rejected += 1
+                queued_ahead = sum(self._expected(job.kind) for job in self._queue)
+                raise QueueFull(retry_after=max(1, int(queued_ahead / max(self.capacity, 1)) + 1))
+            start = max(self._clock, self._last_finish.get(user, 0.0))
+            finish = start + self.costs.get(kind, 1.0) / self.user_weights.get(user, 1.0)
+            job = _Job(user, kind, start, finish, next(self._seq))
+            self._last_finish[user] = finish
+            self._pending[user] = self._pending.get(user, 0) + 1
+            self._queue.append(job)
+            self._dispatch()
+            return job
+
+    def _dispatch(self):
+        granted = False
+        while sum(self._running.values()) < self.capacity:
+            eligible = [job for job in self._queue if self._running.get(job.user, 0) < self.user_concurrency]
+            if not eligible:
+                break
+            job = min(eligible, key=lambda job: (job.start, job.seq))
+            self._queue.remove(job)
+            job.granted = True
+            self._running[job.user] = self._running.get(job.user, 0) + 1
+            self._clock = max(self._clock, job.start)
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def _wait(self, job, deadline):
+        with self._cond:
+            while not job.granted:
+                if deadline is not None:
+                    deadline.check()
+                    remaining = deadline.remaining()
+                    self._cond.wait(min(remaining, 1.0) if remaining is not None else None)
+                else:
+                    self._cond.wait()
+
+    def _finish(self, job, service_seconds):
+        with self._cond:
+            if job.granted:
+                self._running[job.user] -= 1
+                if not self._running[job.user]:
+                    del self._running[job.user]
+            elif job in self._queue:
+                self._queue.remove(job)
+            self._pending[job.user] -= 1
+            if not self._pending[job.user]:
+                del self._pending[job.user]
+                # An idle user's tag is behind the clock anyway; don't keep it forever
+                if self._last_finish.get(job.user, 0.0) <= self._clock:
+                    self._last_finish.pop(job.user, None)
+            if not self._pending:
+                self._last_finish.clear()
+            if service_seconds is not None:
+                previous = self._service.get(job.kind)
+                self._service[job.kind] = service_seconds if previous is None else 0.8 * previous + 0.2 * service_seconds
+            self._dispatch()
+
+    def _wake(self):
+        with self._cond:
+            self._cond.notify_all()
+
+
+scheduler = FairScheduler(
+    capacity=getattr(settings, 'SCHEDULER_CAPACITY', 4),
+    user_concurrency=getattr(settings, 'SCHEDULER_USER_CONCURRENCY', 2),
+    user_burst=getattr(settings, 'SCHEDULER_USER_BURST', 6),
+    user_weights=getattr(settings, 'SCHEDULER_USER_WEIGHTS', {}),
+)
+
+
+def busy_response(error):
+    response = JsonResponse({'error': str(error), 'retryAfterSeconds': error.retry_after}, status=429)
+    response['Retry-After'] = str(error.retry_after)
+    return response
+
+
+def _collect_scheduler_metrics():
+    in_flight, queued = scheduler.stats()
+    return [
+        ('hireinator_scheduler_in_flight', 'gauge', 'Expensive jobs running in this process.', in_flight),
+        ('hireinator_scheduler_queued', 'gauge', 'Expensive jobs waiting for capacity in this process.', queued),
+        ('hireinator_scheduler_rejected_total', 'counter', 'Jobs refused because the user was over their burst quota.',
+         scheduler.rejected),
+    ]
+
+
+register_collector(_collect_scheduler_metrics)
@@ -0,0 +1,298 @@
+# fns/scoring.py
+"""
+Local job-fit scoring: ranks a user's resumes against a job description
+with sentence embeddings, before any Gemini call is spent.
+
+Texts are split into short passages (the embedding model only reads ~128
+tokens), embedded in batches with normalized vectors, and averaged into one
+unit vector per document. Vectors are cached by content hash, so an
+unchanged resume or job description is never embedded twice.
+
+Each user has a ResumeIndex: a NumPy matrix with one row per resume plus
+one per saved jobDescription. Ranking reads only the resumes' fingerprint
+fields (name, contentHash, jobDescription); rows are added, replaced or
+dropped for resumes whose hash changed, and only those resumes' LaTeX is
+fetched and embedded.
+"""
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+
+from . import repository
+from .metrics import span
+
+MAX_PASSAGE_WORDS = 80
+# How much a resume's saved target job counts towards its score
+JOB_WEIGHT = 0.3
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def set_model(model):
+    """Shares an already loaded SentenceTransformer (fns.views passes the humanizer's)."""
+    global _model
+    _model = model
+
+
+def get_model():
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                from transformer.embeddings import load_sentence_model
+                _model = load_sentence_model(backend=getattr(settings, 'HUMANIZER_EMBEDDING_BACKEND', 'fp32'))
+    return _model
+
+
+# --- Text preparation ---
+
+def latex_to_text(latex):
+    """Drops the preamble, comments and LaTeX commands, keeping the words a reader would see."""
+    body = latex.split('\\begin{document}', 1)[-1].split('\\end{document}', 1)[0]
+    body = re.sub(r'(?<!\\)%.*', '', body)
+    body = re.sub(r'\\(?:begin|end)\{[^}]*\}(?:\[[^\]]*\]|\{[^}]*\})*', '\n', body)
+    body = re.sub(r'\\(?:section|subsection)\*?\{([^}]*)\}', r'\n\1\n', body)
+    body = re.sub(r'\\item\b', '\n', body)
+    body = re.sub(r'\\[a-zA-Z@]+\*?(?:\[[^\]]*\])?', ' ', body)
+    body = body.replace('\\\\', '\n')
+    body = re.sub(r'\\(.)', r'\1', body)
+    body = re.sub(r'[{}$&~^_]', ' ', body)
+    return re.sub(r'[ \t]+', ' ', body).strip()
+
+
+def passages(text, max_words=MAX_PASSAGE_WORDS):
+    """
+    Splits text on blank lines/lines, then packs lines into passages of at
+    most `max_words` words. A line longer than that is split across passages.
+    """
+    result, current = [], []
+    for line in text.splitlines():
+        words = line.split()
+        if not words:
+            continue
+        if current and len(current) + len(words) > max_words:
+            result.append(' '.join(current))
+            current = []
+        while len(words) > max_words:
+            result.append(' '.join(words[:max_words]))
+            words = words[max_words:]
+        current.extend(words)
+    if current:
+        result.append(' '.join(current))
+    return result
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:32]
+
+
+# --- Vector cache ---
+
+class VectorCache:
+    """LRU of document vectors keyed by content hash."""
+
+    def __init__(self, max_entries=20000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+            return vector
+
+    def put(self, key, vector):
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+vector_cache = VectorCache(getattr(settings, 'SCORING_VECTOR_CACHE_SIZE', 20000))
+
+
+def embed_documents(documents):
+    """
+    Unit vectors for {key: text}, keyed the same way. `key` must be a hash of
+    the text; cached vectors are reused and all misses are embedded in one batch.
+    """
+    vectors, pending = {}, {}
+    for key, text in documents.items():
+        cached = vector_cache.get(key)
+        if cached is not None:
+            vectors[key] = cached
+        else:
+            pending[key] = passages(text) or ['']
+
+    if pending:
+        flat = [passage for chunks in pending.values() for passage in chunks]
+        with span('scoring.embed'):
+            embedded = np.asarray(get_model().encode(flat, batch_size=32, normalize_embeddings=True),
+                                  dtype=np.float32)
+        offset = 0
+        for key, chunks in pending.items():
+            vector = embedded[offset:offset + len(chunks)].mean(axis=0)
+            offset += len(chunks)
+            norm = np.linalg.norm(vector)
+            vector = vector / norm if norm else vector
+            vector_cache.put(key, vector)
+            vectors[key] = vector
+    return vectors
+
+
+# --- Per-user index ---
+
+class ResumeIndex:
+    """
+    One row per resume in `resume_matrix` (and its saved job description's
+    vector in `job_matrix`, zeros when there is none). Rows are updated in
+    place as resumes change.
+    """
+
+    def __init__(self, dimensions):
+        self.ids = []
+        self.names = []
+        self.hashes = []
+        self.job_hashes = []
+        self.resume_matrix = np.zeros((0, dimensions), dtype=np.float32)
+        self.job_matrix = np.zeros((0, dimensions), dtype=np.float32)
+        self.lock = threading.Lock()
+
+    def remove_missing(self, keep_ids):
+        keep = [row for row, resume_id in enumerate(self.ids) if resume_id in keep_ids]
+        if len(keep) == len(self.ids):
+            return
+        self.ids = [self.ids[row] for row in keep]
+        self.names = [self.names[row] for row in keep]
+        self.hashes = [self.hashes[row] for row in keep]
+        self.job_hashes = [self.job_hashes[row] for row in keep]
+        self.resume_matrix = self.resume_matrix[keep]
+        self.job_matrix = self.job_matrix[keep]
+
+    def upsert(self, resume_id, name, resume_hash, resume_vector, job_hash, job_vector):
+        if resume_id in self.ids:
+            row = self.ids.index(resume_id)
+            self.names[row], self.hashes[row], self.job_hashes[row] = name, resume_hash, job_hash
+            self.resume_matrix[row] = resume_vector
+            self.job_matrix[row] = job_vector
+        else:
+            self.ids.append(resume_id)
+            self.names.append(name)
+            self.hashes.append(resume_hash)
+            self.job_hashes.append(job_hash)
+            self.resume_matrix = np.vstack([self.resume_matrix, resume_vector[None, :]])
+            self.job_matrix = np.vstack([self.job_matrix, job_vector[None, :]])
+
+    def top_k(self, query, k):
+        """[(row, score, resume_score, job_score)] best first."""
+        if not self.ids:
+            return []
+        resume_scores = self.resume_matrix @ query
+        job_scores = self.job_matrix @ query
+        has_job = np.any(self.job_matrix != 0, axis=1)
+        scores = np.where(has_job, (1 - JOB_WEIGHT) * resume_scores + JOB_WEIGHT * job_scores, resume_scores)
+        k = min(k, len(scores))
+        rows = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        rows = rows[np.argsort(-scores[rows], kind='stable')]
+        return [(int(row), float(scores[row]), float(resume_scores[row]),
+                 float(job_scores[row]) if has_job[row] else None) for row in rows]
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+MAX_INDEXED_USERS = getattr(settings, 'SCORING_MAX_INDEXED_USERS', 1000)
+
+
+def _index_for(user_uid, dimensions):
+    with _indexes_lock:
+        index = _indexes.get(user_uid)
+        if index is None or index.resume_matrix.shape[1] != dimensions:
+            index = _indexes[user_uid] = ResumeIndex(dimensions)
+        _indexes.move_to_end(user_uid)
+        while len(_indexes) > MAX_INDEXED_USERS:
+            _indexes.popitem(last=False)
+        return index
+
+
+def refresh_index(user_uid, query_vector):
+    """Brings the user's index up to date with their resumes; returns it."""
+    fingerprints = repository.list_user_resumes(user_uid, repository.RESUME_FINGERPRINT_FIELDS)
+    index = _index_for(user_uid, query_vector.shape[0])
+
+    with index.lock:
+        index.remove_missing({resume_id for resume_id, _ in fingerprints})
+        known = dict(zip(index.ids, zip(index.hashes, index.job_hashes, index.names)))
+
+        changed = []
+        for resume_id, data in fingerprints:
+            job_description = (data.get('jobDescription') or '').strip()
+            job_hash = text_hash(job_description) if job_description else None
+            entry = (data.get('contentHash'), job_hash, data.get('resumeName', ''))
+            # Resumes written before contentHash existed are re-read every time
+            if entry[0] is None or known.get(resume_id) != entry:
+                changed.append((resume_id, data, job_description, job_hash))
+        if not changed:
+            return index
+
+        contents = repository.get_resumes([resume_id for resume_id, *_ in changed], ['latexContent'])
+        documents = {}
+        rows = []
+        for resume_id, data, job_description, job_hash in changed:
+            latex = (contents.get(resume_id) or {}).get('latexContent', '')
+            resume_hash = data.get('contentHash') or repository.content_hash(latex)
+            documents[f'resume:{resume_hash}'] = latex_to_text(latex)
+            if job_hash:
+                documents[f'job:{job_hash}'] = job_description
+            rows.append((resume_id, data.get('resumeName', ''), resume_hash, job_hash))
+
+        vectors = embed_documents(documents)
+        zeros = np.zeros_like(query_vector)
+        for resume_id, name, resume_hash, job_hash in rows:
+            index.upsert(resume_id, name, resume_hash if resume_id in contents else None,
+                         vectors[f'resume:{resume_hash}'], job_hash,
+                         vectors[f'job:{job_hash}'] if job_hash else zeros)
+    return index
+
+
+def warm_index(user_uid):
+    """
+    Brings the user's index up to date ahead of their first ranking (see
+    fns/prewarm.py). Does nothing, and returns False, while no model is loaded.
+    """
+    model = _model
+    if model is None:
+        return False
+    refresh_index(user_uid, np.zeros(model.get_sentence_embedding_dimension(), dtype=np.float32))
+    return True
+
+
+def rank_resumes(user_uid, job_description, k=5):
+    """
+    The user's `k` best-fitting resumes for `job_description`:
+    [{'id', 'resumeName', 'score', 'resumeScore', 'jobScore'}], best first.
+    `jobScore` compares with the job the resume was tailored for, if any.
+    """
+    job_description = job_description.strip()
+    key = f'job:{text_hash(job_description)}'
+    query = embed_documents({key: job_description})[key]
+    index = refresh_index(user_uid, query)
+    with index.lock, span('scoring.search'):
+        return [
+            {
+                'id': index.ids[row],
+                'resumeName': index.names[row],
+                'score': round(score, 4),
+                'resumeScore': round(resume_score, 4),
+                'jobScore': None if job_score is None else round(job_score, 4),
+            }
+            for row, score, resume_score, job_score in index.top_k(query, k)
+        ]
@@ -0,0 +1,414 @@
+# fns/storage.py
+"""
+Document storage backends.
+
+Everything the app persists goes through the small interface below, so the
+same code can run against Firestore in production, the Django database
+(`backend/db.sqlite3` by default) or a plain in-process dict for offline
+load tests and benchmarks. The backend is chosen with the STORAGE_BACKEND
+setting: 'firestore' (default), 'django' or 'memory'.
+
+Documents are plain dicts. Any value equal to SERVER_TIMESTAMP is replaced
+with the commit time by the backend, like Firestore's sentinel.
+"""
+
+import abc
+import base64
+import copy
+import threading
+import uuid
+from datetime import datetime, timezone
+
+from django.conf import settings
+
+
+class _ServerTimestamp:
+    def __repr__(self):
+        return 'SERVER_TIMESTAMP'
+
+
+SERVER_TIMESTAMP = _ServerTimestamp()
+
+
+class DocumentNotFound(Exception):
+    pass
+
+
+class DocumentExists(Exception):
+    pass
+
+
+def _project(data, fields):
+    if fields is None:
+        return data
+    return {field: data[field] for field in fields if field in data}
+
+
+def _resolve_timestamps(data, now):
+    return {key: now if value is SERVER_TIMESTAMP else value for key, value in data.items()}
+
+
+def _new_id():
+    return uuid.uuid4().hex[:20]
+
+
+class BaseStorage(abc.ABC):
+    """
+    Interface shared by every backend. Keys are (collection, doc_id) pairs.
+
+    Query results are [(doc_id, data), ...]. `start_after` is the
+    (order_value, doc_id) pair of the last document of the previous page.
+    """
+
+    def get(self, collection, doc_id, fields=None):
+        return self.get_all([(collection, doc_id)], fields).get((collection, doc_id))
+
+    @abc.abstractmethod
+    def get_all(self, keys, fields=None):
+        """Returns {(collection, doc_id): data} for the keys that exist."""
+
+    def new_id(self, collection):
+        return _new_id()
+
+    def add(self, collection, data):
+        doc_id = self.new_id(collection)
+        with self.batch() as batch:
+            batch.create(collection, doc_id, data)
+        return doc_id
+
+    def set(self, collection, doc_id, data):
+        with self.batch() as batch:
+            batch.set(collection, doc_id, data)
+
+    def update(self, collection, doc_id, data):
+        with self.batch() as batch:
+            batch.update(collection, doc_id, data)
+
+    def delete(self, collection, doc_id):
+        with self.batch() as batch:
+            batch.delete(collection, doc_id)
+
+    @abc.abstractmethod
+    def query_by_user(self, collection, user_id, order_by='createdAt', descending=True,
+                      limit=None, start_after=None, fields=None):
+        """The user's documents ordered by `order_by` (documents without it are left out)."""
+
+    @abc.abstractmethod
+    def batch(self):
+        """A new BaseBatch for this backend."""
+
+
+class BaseBatch(abc.ABC):
+    """
+    Collects writes and applies them atomically on commit(). Used as a
+    context manager, it commits when the block exits without an exception.
+    """
+
+    def __init__(self):
+        self.writes = []
+
+    def create(self, collection, doc_id, data):
+        self.writes.append(('create', collection, doc_id, data))
+
+    def set(self, collection, doc_id, data):
+        self.writes.append(('set', collection, doc_id, data))
+
+    def update(self, collection, doc_id, data):
+        self.writes.append(('update', collection, doc_id, data))
+
+    def delete(self, collection, doc_id):
+        self.writes.append(('delete', collection, doc_id, None))
+
+    @abc.abstractmethod
+    def commit(self):
+        """Applies every collected write, or none of them."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        return False
+
+
+# --- Firestore ---
+
+class FirestoreStorage(BaseStorage):
+
+    def __init__(self):
+        from firebase_admin import firestore
+        self._firestore = firestore
+        self.client = firestore.client()
+
+    def _ref(self, collection, doc_id):
+        return self.client.collection(collection).document(doc_id)
+
+    def _to_firestore(self, data):
+        return {key: self._firestore.SERVER_TIMESTAMP if value is SERVER_TIMESTAMP else value
+                for key, value in data.items()}
+
+    def get_all(self, keys, fields=None):
+        if len(keys) == 1:
+            ref = self._ref(*keys[0])
+            snapshots = [ref.get(field_paths=fields) if fields else ref.get()]
+        else:
+            snapshots = self.client.get_all([self._ref(*key) for key in keys], field_paths=fields)
+
+        found = {}
+        for snapshot in snapshots:
+            if snapshot.exists:
+                found[(snapshot.reference.parent.id, snapshot.id)] = snapshot.to_dict() or {}
+        return found
+
+    def new_id(self, collection):
+        return self.client.collection(collection).document().id
+
+    def query_by_user(self, collection, user_id, order_by='createdAt', descending=True,
+                      limit=None, start_after=None, fields=None):
+        direction = self._firestore.Query.DESCENDING if descending else self._firestore.Query.ASCENDING
+        query = (
+            self.client.collection(collection)
+            .where(filter=self._firestore.FieldFilter('userId', '==', user_id))
+            .order_by(order_by, direction=direction)
+            .order_by('__name__', direction=direction)
+        )
+        if fields:
+            query = query.select(list(dict.fromkeys([order_by, *fields])))
+        if start_after:
+            order_value, doc_id = start_after
+            query = query.start_after({order_by: order_value, '__name__': doc_id})
+        if limit:
+            query = query.limit(limit)
+        return [(snapshot.id, snapshot.to_dict() or {}) for snapshot in query.stream()]
+
+    def batch(self):
+        return FirestoreBatch(self)
+
+
+class FirestoreBatch(BaseBatch):
+
+    def __init__(self, storage):
+        super().__init__()
+        self.storage = storage
+
+    def commit(self):
+        if not self.writes:
+            return
+        batch = self.storage.client.batch()
+        for op, collection, doc_id, data in self.writes:
+            ref = self.storage._ref(collection, doc_id)
+            if op == 'delete':
+                batch.delete(ref)
+            else:
+                getattr(batch, op)(ref, self.storage._to_firestore(data))
+        batch.commit()
+
+
+# --- In-memory ---
+
+class MemoryStorage(BaseStorage):
+    """Keeps every collection in a dict. Data is copied in and out, like a remote store."""
+
+    def __init__(self):
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    def get_all(self, keys, fields=None):
+        found = {}
+        with self._lock:
+            for collection, doc_id in keys:
+                data = self._collections.get(collection, {}).get(doc_id)
+                if data is not None:
+                    found[(collection, doc_id)] = copy.deepcopy(_project(data, fields))
+        return found
+
+    def query_by_user(self, collection, user_id, order_by='createdAt', descending=True,
+                      limit=None, start_after=None, fields=None):
+        with self._lock:
+            rows = [(doc_id, data) for doc_id, data in self._collections.get(collection, {}).items()
+                    if data.get('userId') == user_id and data.get(order_by) is not None]
+        rows.sort(key=lambda row: (row[1][order_by], row[0]), reverse=descending)
+        if start_after:
+            after = (start_after[0], start_after[1])
+            rows = [row for row in rows
+                    if ((row[1][order_by], row[0]) < after if descending else (row[1][order_by], row[0]) > after)]
+        if limit:
+            rows = rows[:limit]
+        return [(doc_id, copy.deepcopy(_project(data, fields))) for doc_id, data in rows]
+
+    def batch(self):
+        return MemoryBatch(self)
+
+    def clear(self):
+        with self._lock:
+            self._collections.clear()
+
+
+class MemoryBatch(BaseBatch):
+
+    def __init__(self, storage):
+        super().__init__()
+        self.storage = storage
+
+    def commit(self):
+        now = datetime.now(timezone.utc)
+        with self.storage._lock:
+            collections = self.storage._collections
+            # Validate first so a failing batch changes nothing
+            for op, collection, doc_id, _ in self.writes:
+                exists = doc_id in collections.get(collection, {})
+                if op == 'create' and exists:
+                    raise DocumentExists(f"{collection}/{doc_id}")
+                if op == 'update' and not exists:
+                    raise DocumentNotFound(f"{collection}/{doc_id}")
+
+            for op, collection, doc_id, data in self.writes:
+                docs = collections.setdefault(collection, {})
+                if op == 'delete':
+                    docs.pop(doc_id, None)
+                elif op == 'update':
+                    docs[doc_id].update(copy.deepcopy(_resolve_timestamps(data, now)))
+                else:
+                    docs[doc_id] = copy.deepcopy(_resolve_timestamps(data, now))
+
+
+# --- Django ORM (sqlite by default) ---
+
+def _encode_value(value):
+    # JSONField can't hold datetimes or bytes, so they are tagged
+    if isinstance(value, datetime):
+        return {'$dt': value.isoformat()}
+    if isinstance(value, bytes):
+        return {'$b64': base64.b64encode(value).decode('ascii')}
+    if isinstance(value, dict):
+        return {key: _encode_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_encode_value(item) for item in value]
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if len(value) == 1 and '$dt' in value:
+            return datetime.fromisoformat(value['$dt'])
+        if len(value) == 1 and '$b64' in value:
+            return base64.b64decode(value['$b64'])
+        return {key: _decode_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_decode_value(item) for item in value]
+    return value
+
+
+class DjangoStorage(BaseStorage):
+    """Stores documents as rows of fns.models.StoredDocument."""
+
+    # Document fields per-user queries can order by, and the indexed column mirroring each
+    ORDER_COLUMNS = {'createdAt': 'sort_key', 'lastUpdated': 'updated_key'}
+
+    def __init__(self):
+        from .models import StoredDocument
+        self.model = StoredDocument
+
+    def get_all(self, keys, fields=None):
+        by_collection = {}
+        for collection, doc_id in keys:
+            by_collection.setdefault(collection, []).append(doc_id)
+
+        found = {}
+        for collection, doc_ids in by_collection.items():
+            rows = self.model.objects.filter(collection=collection, doc_id__in=doc_ids)
+            for row in rows.only('doc_id', 'data'):
+                found[(collection, row.doc_id)] = _project(_decode_value(row.data), fields)
+        return found
+
+    def query_by_user(self, collection, user_id, order_by='createdAt', descending=True,
+                      limit=None, start_after=None, fields=None):
+        from django.db.models import Q
+
+        column = self.ORDER_COLUMNS.get(order_by)
+        if column is None:
+            raise ValueError(f"DjangoStorage can only order by {', '.join(self.ORDER_COLUMNS)}, not {order_by!r}.")
+
+        rows = self.model.objects.filter(collection=collection, user_id=user_id, **{f'{column}__isnull': False})
+        if start_after:
+            order_value, doc_id = start_after
+            if descending:
+                rows = rows.filter(Q(**{f'{column}__lt': order_value}) | Q(**{column: order_value, 'doc_id__lt': doc_id}))
+            else:
+                rows = rows.filter(Q(**{f'{column}__gt': order_value}) | Q(**{column: order_value, 'doc_id__gt': doc_id}))
+        rows = rows.order_by(f'-{column}', '-doc_id') if descending else rows.order_by(column, 'doc_id')
+        if limit:
+            rows = rows[:limit]
+        return [(row.doc_id, _project(_decode_value(row.data), fields)) for row in rows.only('doc_id', 'data')]
+
+    def batch(self):
+        return DjangoBatch(self)
+
+
+class DjangoBatch(BaseBatch):
+
+    def __init__(self, storage):
+        super().__init__()
+        self.storage = storage
+
+    def commit(self):
+        from django.db import transaction
+
+        model = self.storage.model
+        now = datetime.now(timezone.utc)
+        with transaction.atomic():
+            for op, collection, doc_id, data in self.writes:
+                rows = model.objects.filter(collection=collection, doc_id=doc_id)
+                if op == 'delete':
+                    rows.delete()
+                    continue
+
+                data = _resolve_timestamps(data, now)
+                if op == 'update':
+                    row = rows.select_for_update().first()
+                    if row is None:
+                        raise DocumentNotFound(f"{collection}/{doc_id}")
+                    merged = {**_decode_value(row.data), **data}
+                else:
+                    if op == 'create' and rows.exists():
+                        raise DocumentExists(f"{collection}/{doc_id}")
+                    row, merged = model(collection=collection, doc_id=doc_id), data
+
+                row.data = _encode_value(merged)
+                row.user_id = merged.get('userId')
+                for field, column in DjangoStorage.ORDER_COLUMNS.items():
+                    value = merged.get(field)
+                    setattr(row, column, value if isinstance(value, datetime) else None)
+                row.save()
+
+
+BACKENDS = {
+    'firestore': FirestoreStorage,
+    'django': DjangoStorage,
+    'memory': MemoryStorage,
+}
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage():
+    """Returns the process-wide storage backend selected by settings.STORAGE_BACKEND."""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                name = getattr(settings, 'STORAGE_BACKEND', 'firestore')
+                try:
+                    _storage = BACKENDS[name]()
+                except KeyError:
+                    raise ValueError(f"Unknown STORAGE_BACKEND {name!r}; expected one of {sorted(BACKENDS)}")
+    return _storage
+
+
+def set_storage(storage):
+    """Replaces the active backend (used by load tests and benchmarks)."""
+    global _storage
+    with _storage_lock:
+        _storage = storage
@@ -0,0 +1,135 @@
+# fns/templating.py
+
+import re
+from typing import Dict, List, Union
+
+from pydantic import BaseModel, Field
+
+# A placeholder is a bare brace group holding a single identifier, e.g. {summary_section}.
+PLACEHOLDER_RE = re.compile(r"\{([A-Za-z_][A-Za-z0-9_]*)\}")
+# A control word (\begin, \section*) or a control symbol (\%, \{, \\).
+CONTROL_RE = re.compile(r"\\(?:([A-Za-z]+)\*?|.)", re.DOTALL)
+# Control words that take no argument, so a brace group right after them is content: \item{b2}
+NO_ARGUMENT_COMMANDS = frozenset([
+    'item', 'par', 'newline', 'linebreak', 'noindent', 'indent', 'centering', 'raggedright', 'raggedleft',
+    'hfill', 'vfill', 'smallskip', 'medskip', 'bigskip', 'newpage', 'clearpage', 'pagebreak', 'hline',
+    'quad', 'qquad', 'tiny', 'scriptsize', 'footnotesize', 'small', 'normalsize', 'large', 'Large',
+    'LARGE', 'huge', 'Huge', 'bfseries', 'itshape', 'scshape', 'upshape', 'mdseries', 'rmfamily',
+    'sffamily', 'ttfamily', 'today', 'relax', 'protect',
+])
+
+
+class TemplateRender(BaseModel):
+    """Result of rendering a compiled template with a content map."""
+    latex: str
+    unfilled: List[str] = Field(default_factory=list, description="Placeholders in the template with no content.")
+    unused: List[str] = Field(default_factory=list, description="Content keys that have no placeholder in the template.")
+
+
+class CompiledTemplate(BaseModel):
+    """
+    A LaTeX template split once into literal text and placeholder keys.
+
+    `literals` always has exactly one more entry than `keys`, so rendering is
+    literals[0] + value(keys[0]) + literals[1] + ... + literals[-1].
+    """
+    literals: List[str]
+    keys: List[str]
+
+    @classmethod
+    def compile(cls, template: str) -> "CompiledTemplate":
+        """
+        Scans the template a single time and indexes the placeholder positions.
+
+        Brace groups that are arguments of a LaTeX command (the `{itemize}` in
+        `\\begin{itemize}`, or the second group of `\\href{url}{text}`) are
+        left as literal text, as are escaped braces and `%` comments. Commands
+        in NO_ARGUMENT_COMMANDS take no argument, so `\\item{b2}` is a placeholder.
+        """
+        literals, keys = [], []
+        literal_start = 0
+        # True while the next adjacent group would be a command argument.
+        in_args = False
+        # Remembers `in_args` for each open '{' or '[' so it is restored on close.
+        stack = []
+        i, n = 0, len(template)
+
+        while i < n:
+            char = template[i]
+            if char == '\\':
+                match = CONTROL_RE.match(template, i)
+                in_args = match.group(1) is not None and match.group(1) not in NO_ARGUMENT_COMMANDS
+                i = match.end()
+            elif char == '%':
+                newline = template.find('\n', i)
+                i = n if newline == -1 else newline
+                in_args = False
+            elif char == '{':
+                match = PLACEHOLDER_RE.match(template, i)
+                if match and not in_args:
+                    # Right after a control word the braces stay, so `\\item{b2}` can't become `\\itemText`
+                    keep = 1 if i and template[i - 1].isalpha() else 0
+                    literals.append(template[literal_start:i + keep])
+                    keys.append(match.group(1))
+                    i = match.end()
+                    literal_start = i - keep
+                elif match:
+                    i = match.end()
+                else:
+                    stack.append(('{', in_args))
+                    in_args = False
+                    i += 1
+            elif char == '}':
+                in_args = False
+                while stack:
+                    opener, was_in_args = stack.pop()
+                    if opener == '{':
+                        in_args = was_in_args
+                        break
+                i += 1
+            elif char == '[' and in_args:
+                stack.append(('[', True))
+                in_args = False
+                i += 1
+            elif char == ']' and stack and stack[-1][0] == '[':
+                stack.pop()
+                in_args = True
+                i += 1
+            else:
+                in_args = False
+                i += 1
+
+        literals.append(template[literal_start:])
+        return cls(literals=literals, keys=keys)
+
+    @property
+    def placeholders(self) -> List[str]:
+        """Unique placeholder keys, in order of first appearance."""
+        return list(dict.fromkeys(self.keys))
+
+    def render(self, content_map: Dict[str, str]) -> TemplateRender:
+        """
+        Fills every placeholder in one pass. Placeholders without content are
+        left in the output as `{key}` and reported as unfilled.
+        """
+        parts = [self.literals[0]]
+        unfilled = []
+        for key, literal in zip(self.keys, self.literals[1:]):
+            content = content_map.get(key)
+            if content is None:
+                content = "{" + key + "}"
+                if key not in unfilled:
+                    unfilled.append(key)
+            parts.append(content)
+            parts.append(literal)
+
+        known = set(self.keys)
+        unused = [key for key in content_map if key not in known]
+        return TemplateRender(latex=''.join(parts), unfilled=unfilled, unused=unused)
+
+
+def compile_template(template: Union[str, CompiledTemplate]) -> CompiledTemplate:
+    """Accepts a raw template or an already compiled one."""
+    if isinstance(template, CompiledTemplate):
+        return template
+    return CompiledTemplate.compile(template)
@@ -1,3 +1,985 @@
-from django.test import TestCase
+import importlib.util
+import threading
+import time
+import unittest
+from io import StringIO
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+
+# Minimum fraction of synonym choices the int8 embedding model must share with fp32
+SYNONYM_PARITY_THRESHOLD = 0.9
+
+
+class LoadTestHarnessTests(SimpleTestCase):
+    """Runs the offline load-test harness briefly so a broken view shows up as errors."""
+
+    def test_every_operation_succeeds_under_concurrency(self):
+        out = StringIO()
+        call_command(
+            'loadtest', concurrency='1,2', duration=0.5, warmup=0, users=2,
+            gemini_latency=0, compile_latency=0, humanizer='fake', stdout=out,
+        )
+        rows = [line.split() for line in out.getvalue().splitlines() if line.split() and line.split()[0].isdigit()]
+        self.assertEqual([row[0] for row in rows], ['1', '2'])
+        for row in rows:
+            self.assertGreater(int(row[2]), 0, out.getvalue())
+            self.assertEqual(row[3], '0', out.getvalue())
+
+
+class FairSchedulerTests(SimpleTestCase):
+    """A user with a backlog must not delay another user's single job behind all of it, and weights set the shares."""
+
+    def test_light_user_is_served_before_heavy_backlog(self):
+        from fns.scheduler import FairScheduler, QueueFull
+
+        scheduler = FairScheduler(capacity=1, user_concurrency=1, user_burst=4)
+        release = threading.Event()
+        order = []
+
+        def job(user):
+            with scheduler.slot(user, 'refine'):
+                order.append(user)
+                release.wait(5)
+
+        threads = [threading.Thread(target=job, args=('heavy',)) for _ in range(4)]
+        threads[0].start()
+        while scheduler.stats() != (1, 0):
+            time.sleep(0.01)
+        for thread in threads[1:]:
+            thread.start()
+        while scheduler.stats() != (1, 3):
+            time.sleep(0.01)
+        with self.assertRaises(QueueFull):
+            with scheduler.slot('heavy', 'refine'):
+                pass
+        light = threading.Thread(target=job, args=('light',))
+        light.start()
+        while scheduler.stats() != (1, 4):
+            time.sleep(0.01)
+        self.assertEqual(scheduler.status('light')['queued'][0]['position'], 1)
+
+        release.set()
+        for thread in threads + [light]:
+            thread.join(5)
+        self.assertEqual(order[:2], ['heavy', 'light'])
+
+    def test_weighted_user_gets_proportional_share(self):
+        from fns.scheduler import FairScheduler
+
+        scheduler = FairScheduler(capacity=1, user_concurrency=1, user_burst=8, user_weights={'gold': 2})
+        release = threading.Event()
+        order = []
+
+        def job(user):
+            with scheduler.slot(user, 'compile'):
+                order.append(user)
+                if user == 'blocker':
+                    release.wait(5)
+
+        blocker = threading.Thread(target=job, args=('blocker',))
+        blocker.start()
+        while scheduler.stats() != (1, 0):
+            time.sleep(0.01)
+        threads = [threading.Thread(target=job, args=(user,)) for user in ['gold', 'basic'] * 6]
+        for thread in threads:
+            thread.start()
+        while scheduler.stats() != (1, 12):
+            time.sleep(0.01)
+
+        release.set()
+        for thread in threads + [blocker]:
+            thread.join(5)
+        # While both have work queued, gold starts two jobs for each of basic's
+        served = order[1:7]
+        self.assertEqual((served.count('gold'), served.count('basic')), (4, 2))
+        self.assertEqual(order[-3:], ['basic'] * 3)
+
+
+class MemoryStorageTestCase(SimpleTestCase):
+    """Runs each test against a fresh in-memory storage backend with empty repository caches."""
+
+    def setUp(self):
+        from fns import repository, storage
+
+        self.previous_storage = storage._storage
+        self.storage = storage.MemoryStorage()
+        storage.set_storage(self.storage)
+        repository.resume_cache.clear()
+        self.addCleanup(storage.set_storage, self.previous_storage)
+        self.addCleanup(repository.resume_cache.clear)
+
+
+class ResumeCacheTests(MemoryStorageTestCase):
+    """Reads are served from the cache until a write invalidates them; fresh reads always go to storage."""
+
+    def test_projection_and_expiry(self):
+        from fns.repository import ResumeCache
+
+        cache = ResumeCache(ttl_seconds=0.05)
+        cache.put('r1', {'userId': 'u', 'resumeName': 'A', 'latexContent': 'x'}, ['userId', 'resumeName', 'latexContent'])
+        self.assertEqual(cache.get('r1', ['userId']), {'userId': 'u'})
+        self.assertIsNone(cache.get('r1'))
+        self.assertIsNone(cache.get('r1', ['userId', 'versionCount']))
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('r1', ['userId']))
+
+    def test_writes_invalidate_and_fresh_reads_bypass(self):
+        from fns import repository
+
+        resume_id = repository.create_resume({'userId': 'u', 'resumeName': 'A', 'latexContent': 'one'})
+        self.assertEqual(repository.get_owned_resume('u', resume_id, ['latexContent'])['latexContent'], 'one')
+        hits = repository.resume_cache.hits
+        repository.get_owned_resume('u', resume_id, ['latexContent'])
+        self.assertEqual(repository.resume_cache.hits, hits + 1)
+
+        # This process's own write drops the cached copy, without counting a lookup
+        misses = repository.resume_cache.misses
+        repository.update_resume(resume_id, {'latexContent': 'two'})
+        self.assertEqual((repository.resume_cache.hits, repository.resume_cache.misses), (hits + 1, misses))
+        self.assertEqual(repository.get_owned_resume('u', resume_id, ['latexContent'])['latexContent'], 'two')
+
+        # Another process's write: the cached copy is stale until a fresh read refreshes it
+        self.storage.update(repository.RESUMES_COLLECTION, resume_id, {'latexContent': 'three'})
+        self.assertEqual(repository.get_owned_resume('u', resume_id, ['latexContent'])['latexContent'], 'two')
+        current, _ = repository.get_owned_resume_and_user('u', resume_id, ['latexContent'], [], fresh=True)
+        self.assertEqual(current['latexContent'], 'three')
+        self.assertEqual(repository.get_owned_resume('u', resume_id, ['latexContent'])['latexContent'], 'three')
+        with self.assertRaises(repository.ResumePermissionDenied):
+            repository.get_owned_resume('other', resume_id, fresh=True)
+
+
+class VersionHistoryTests(MemoryStorageTestCase):
+    """Every stored version rebuilds exactly, across snapshot boundaries and interval changes."""
+
+    TEXTS = [
+        "\\section{A}\nline one\nline two\n",
+        "\\section{A}\nline one changed\nline two\n",
+        "\\section{A}\nline two\n\\item new",
+        "",
+        "only line",
+        "\\section{B}\nline one\nline two\nline three\n",
+        "\\section{B}\nline three\n",
+        "\\section{B}\nline three\nline four\n",
+    ]
+
+    def test_delta_round_trip_across_snapshots(self):
+        from fns import versioning
+
+        for old, new in zip(self.TEXTS, self.TEXTS[1:]):
+            self.assertEqual(versioning.apply_delta(old, versioning.decode_delta(
+                versioning.encode_delta(versioning.make_delta(old, new)))), new)
+
+        entries, previous, snapshot_version = [], None, None
+        for version, text in enumerate(self.TEXTS):
+            entry = versioning.build_entry(version, text, previous, 3, snapshot_version)
+            entries.append(entry)
+            previous, snapshot_version = text, entry['snapshotVersion']
+        self.assertEqual([entry['kind'] == versioning.SNAPSHOT for entry in entries],
+                         [True, False, False, True, False, False, True, False])
+        for version, text in enumerate(self.TEXTS):
+            self.assertEqual(versioning.reconstruct(entries[:version + 1]), text)
+
+    def test_history_survives_an_interval_change(self):
+        from unittest import mock
+
+        from fns import repository, versioning
+
+        resume_id = repository.create_resume_with_history({'userId': 'u', 'latexContent': self.TEXTS[0]})
+        for number, text in enumerate(self.TEXTS[1:] * 2, start=1):
+            # Versions 1-7 under one interval, the rest under another that doesn't divide it
+            with mock.patch.object(repository, 'SNAPSHOT_INTERVAL', 4 if number < 8 else 3):
+                current = repository.get_owned_resume('u', resume_id, repository.RESUME_VERSIONING_FIELDS, fresh=True)
+                repository.commit_resume_version(resume_id, 'u', current, text)
+
+        expected = self.TEXTS + self.TEXTS[1:]
+        kinds = [version['kind'] for version in repository.list_versions(resume_id, len(expected))]
+        self.assertEqual([number for number, kind in enumerate(kinds) if kind == versioning.SNAPSHOT], [0, 4, 8, 11, 14])
+        for interval in (2, 3, 4, 10):
+            with mock.patch.object(repository, 'SNAPSHOT_INTERVAL', interval):
+                for version, text in enumerate(expected):
+                    self.assertEqual(repository.get_version_text(resume_id, version), text)
+
+        # History written before entries recorded their snapshot is found by stepping back
+        for version in range(len(expected)):
+            doc_id = repository.version_doc_id(resume_id, version)
+            entry = self.storage.get(repository.VERSIONS_COLLECTION, doc_id)
+            entry.pop('snapshotVersion', None)
+            self.storage.set(repository.VERSIONS_COLLECTION, doc_id, entry)
+        with mock.patch.object(repository, 'SNAPSHOT_INTERVAL', 5):
+            for version, text in enumerate(expected):
+                self.assertEqual(repository.get_version_text(resume_id, version), text)
+        with self.assertRaises(repository.ResumeNotFound):
+            repository.get_version_text(resume_id, len(expected))
+
+
+class ResumeListTests(MemoryStorageTestCase):
+    """The list's 304 is decided from a narrow query, and any change on the page changes its ETag."""
+
+    def setUp(self):
+        super().setUp()
+        from unittest import mock
+        from fns import decorators, fakes, prewarm
+
+        for target, name, value in [(decorators, 'verify_token', fakes.fake_verify_token),
+                                    (prewarm.prewarmer, 'enabled', False)]:
+            patcher = mock.patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {fakes.fake_token("u1")}'}
+
+    def test_not_modified_from_ids_and_timestamps(self):
+        from fns import repository
+        from fns.storage import SERVER_TIMESTAMP
+
+        ids = [repository.create_resume({'userId': 'u1', 'resumeName': f'R{i}', 'createdAt': SERVER_TIMESTAMP,
+                                          'lastUpdated': SERVER_TIMESTAMP}) for i in range(3)]
+        first = self.client.get('/api/resumes/?limit=2', **self.auth)
+        self.assertEqual(first.status_code, 200)
+        etag = first['ETag']
+        self.assertEqual(etag, repository.resume_page_etag('u1', limit=2))
+
+        queried = []
+        query = self.storage.query_by_user
+
+        def spy(*args, **kwargs):
+            queried.append(kwargs.get('fields'))
+            return query(*args, **kwargs)
+
+        self.storage.query_by_user = spy
+        again = self.client.get('/api/resumes/?limit=2', HTTP_IF_NONE_MATCH=f'W/{etag}', **self.auth)
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(queried, [['createdAt', 'lastUpdated']])
+
+        repository.update_resume(ids[-1], {'resumeName': 'Renamed', 'lastUpdated': SERVER_TIMESTAMP})
+        changed = self.client.get('/api/resumes/?limit=2', HTTP_IF_NONE_MATCH=etag, **self.auth)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+        self.assertEqual(changed.json()['resumes'][0]['resumeName'], 'Renamed')
+
+    def test_plain_refresh_sees_other_processes_writes(self):
+        from fns import repository
+        from fns.storage import SERVER_TIMESTAMP
+
+        resume_id = repository.create_resume({'userId': 'u1', 'resumeName': 'Before', 'createdAt': SERVER_TIMESTAMP,
+                                              'lastUpdated': SERVER_TIMESTAMP})
+        self.assertEqual(self.client.get('/api/resumes/', **self.auth).json()['resumes'][0]['resumeName'], 'Before')
+        # Written straight to storage, as by another worker process
+        self.storage.update(repository.RESUMES_COLLECTION, resume_id, {'resumeName': 'After'})
+        self.assertEqual(self.client.get('/api/resumes/', **self.auth).json()['resumes'][0]['resumeName'], 'After')
+        self.storage.delete(repository.RESUMES_COLLECTION, resume_id)
+        self.assertEqual(self.client.get('/api/resumes/', **self.auth).json()['resumes'], [])
+
+
+class PrewarmTests(MemoryStorageTestCase):
+    """Sessions are warmed once, interactive work preempts a warming step, and no model is ever loaded."""
+
+    LATEX = "\\documentclass{article}\\begin{document}Prewarm test\\end{document}"
+
+    def setUp(self):
+        super().setUp()
+        import tempfile
+        from unittest import mock
+        from fns import artifacts, prewarm, scoring
+        from fns.scheduler import FairScheduler
+
+        self.scheduler = FairScheduler(capacity=1)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        for target, name, value in [(prewarm, 'scheduler', self.scheduler),
+                                    (prewarm, 'IDLE_POLL_SECONDS', 0.01),
+                                    (artifacts, 'pdf_cache', artifacts.PdfCache(directory.name, 10**7)),
+                                    (scoring, '_model', None)]:
+            patcher = mock.patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_new_session_queues_user_once(self):
+        from unittest import mock
+        from fns.prewarm import Prewarmer
+
+        warmer = Prewarmer(session_idle_seconds=60)
+        with mock.patch.object(warmer, '_start'):
+            warmer.note_request('u1', {'auth_time': 1})
+            warmer.note_request('u1', {'auth_time': 1})
+            self.assertEqual(warmer.stats()['queued'], 1)
+            warmer._queue.clear()
+            warmer.note_request('u1', {'auth_time': 1})
+            self.assertEqual(warmer.stats()['queued'], 0)
+            warmer.note_request('u1', {'auth_time': 2})
+            warmer.note_request('u1', {'auth_time': 2})
+            self.assertEqual(list(warmer._queue), ['u1'])
+
+    def test_interactive_job_preempts_and_requeues(self):
+        from unittest import mock
+        from fns import deadlines, repository, views
+        from fns.prewarm import Prewarmer
+        from fns.storage import SERVER_TIMESTAMP
+
+        repository.create_resume({'userId': 'u1', 'latexContent': self.LATEX, 'createdAt': SERVER_TIMESTAMP,
+                                  'lastUpdated': SERVER_TIMESTAMP})
+        started, calls = threading.Event(), []
+
+        def compile_stub(latex):
+            calls.append(latex)
+            if len(calls) == 1:
+                started.set()
+                cancelled = threading.Event()
+                deadlines.current().on_cancel(cancelled.set)
+                cancelled.wait(5)
+                deadlines.checkpoint()
+            return b'%PDF-stub'
+
+        warmer = Prewarmer(cpu_budget=1.0)
+        with mock.patch.object(views, 'compile_latex_to_pdf_bytes', compile_stub):
+            warmer.note_request('u1', {'auth_time': 1})
+            self.assertTrue(started.wait(5))
+            with self.scheduler.slot('u2', 'compile'):
+                deadline = time.monotonic() + 5
+                while warmer.stats()['preempted'] == 0 and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                # Re-queued, but not retried while interactive work runs
+                time.sleep(0.1)
+                self.assertEqual((warmer.stats()['preempted'], len(calls)), (1, 1))
+            deadline = time.monotonic() + 5
+            while warmer.stats()['warmed'] == 0 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        self.assertEqual(warmer.stats(), {'queued': 0, 'warmed': 1, 'compiled': 1, 'preempted': 1, 'dropped': 0})
+        self.assertEqual(len(calls), 2)
+
+    def test_warm_index_never_loads_a_model(self):
+        from unittest import mock
+        from fns import scoring
+
+        with mock.patch.object(scoring, 'get_model', side_effect=AssertionError('loaded a model')), \
+                mock.patch.object(scoring, 'refresh_index', side_effect=AssertionError('refreshed the index')):
+            self.assertFalse(scoring.warm_index('u1'))
+
+
+class ConditionalTests(MemoryStorageTestCase):
+    """ETag matching, single-read 304s, and which Range headers are honoured."""
+
+    def test_etag_matching(self):
+        from django.test import RequestFactory
+        from fns.conditional import etag_matches
+
+        def matches(header, etag='"abc"'):
+            return etag_matches(RequestFactory().get('/', HTTP_IF_NONE_MATCH=header), etag)
+
+        self.assertTrue(matches('"abc"'))
+        self.assertTrue(matches('"x", W/"abc"'))
+        self.assertTrue(matches('*'))
+        self.assertFalse(matches('"abcd"'))
+        self.assertFalse(matches('abc'))
+        self.assertFalse(matches('*', etag=None))
+
+    def test_conditional_read_is_one_fresh_read(self):
+        from django.test import RequestFactory
+        from fns import conditional, repository
+
+        resume_id = repository.create_resume({'userId': 'u', 'resumeName': 'A', 'latexContent': 'x'})
+        fields = conditional.with_etag_fields(['latexContent'])
+        data, etag, not_modified = conditional.read_resume(RequestFactory().get('/'), 'u', resume_id, 'tex', fields)
+        self.assertIsNone(not_modified)
+        self.assertEqual(data['latexContent'], 'x')
+
+        reads = []
+        get_all = self.storage.get_all
+
+        def spy(keys, fields=None):
+            reads.append(keys)
+            return get_all(keys, fields)
+
+        self.storage.get_all = spy
+        request = RequestFactory().get('/', HTTP_IF_NONE_MATCH=etag)
+        _, _, not_modified = conditional.read_resume(request, 'u', resume_id, 'tex', fields)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(len(reads), 1)
+
+    def test_ranges(self):
+        from django.test import RequestFactory
+        from fns.conditional import ranged_response
+
+        body = b'0123456789'
+
+        def fetch(range_header, **headers):
+            request = RequestFactory().get('/', HTTP_RANGE=range_header, **headers)
+            response = ranged_response(request, body, 'application/pdf', etag='"e"')
+            return response.status_code, response.content
+
+        self.assertEqual(fetch('bytes=2-4'), (206, b'234'))
+        self.assertEqual(fetch('bytes=7-'), (206, b'789'))
+        self.assertEqual(fetch('bytes=-3'), (206, b'789'))
+        self.assertEqual(fetch('bytes=5-100'), (206, b'56789'))
+        self.assertEqual(fetch('bytes=10-')[0], 416)
+        self.assertEqual(fetch('bytes=-0')[0], 416)
+        for ignored in ('bytes=-', 'bytes=5-2', 'bytes=0-1,4-5', 'items=0-1', ''):
+            self.assertEqual(fetch(ignored), (200, body), ignored)
+        self.assertEqual(fetch('bytes=2-4', HTTP_IF_RANGE='"old"'), (200, body))
+        self.assertEqual(fetch('bytes=2-4', HTTP_IF_RANGE='"e"'), (206, b'234'))
+
+
+class MetricsTests(SimpleTestCase):
+    """Histograms are cumulative, spans land in the request trace, and collectors are scraped."""
+
+    def test_histogram_and_label_rendering(self):
+        from fns.metrics import Counter, Histogram
+
+        histogram = Histogram('h', 'Help.', ['stage'], buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value, 'a')
+        self.assertEqual(histogram.render(), [
+            '# HELP h Help.', '# TYPE h histogram',
+            'h_bucket{stage="a",le="0.1"} 2', 'h_bucket{stage="a",le="1.0"} 3', 'h_bucket{stage="a",le="+Inf"} 4',
+            'h_sum{stage="a"} 3.65', 'h_count{stage="a"} 4',
+        ])
+        counter = Counter('c', 'Help.', ['path'])
+        counter.inc('say "hi"\\\n')
+        counter.inc('say "hi"\\\n', amount=2)
+        self.assertEqual(counter.render()[-1], 'c{path="say \\"hi\\"\\\\\\n"} 3')
+
+    def test_spans_trace_round_trips_and_errors(self):
+        from fns import metrics
+
+        trace, token = metrics.start_trace()
+        try:
+            with metrics.span('test.ok'):
+                metrics.count_round_trip(2)
+            with self.assertRaises(KeyError), metrics.span('test.fail'):
+                raise KeyError('x')
+        finally:
+            metrics.end_trace(token)
+        self.assertIsNone(metrics.current_trace())
+        self.assertEqual([(stage, trips) for stage, _, trips in trace.spans], [('test.ok', 2), ('test.fail', 0)])
+        self.assertIn('test.ok=', trace.summary())
+        self.assertIn('(2 round trips)', trace.summary())
+
+        rendered = metrics.render_prometheus()
+        self.assertIn('hireinator_stage_round_trips_total{stage="test.ok"}', rendered)
+        self.assertIn('hireinator_stage_errors_total{stage="test.fail"}', rendered)
+        self.assertIn('hireinator_stage_duration_seconds_count{stage="test.fail"}', rendered)
+
+    def test_collectors_are_called_at_scrape_time(self):
+        from unittest import mock
+        from fns import metrics
+
+        values = iter([1, 2])
+        with mock.patch.object(metrics, '_collectors', []):
+            metrics.register_collector(lambda: [('test_gauge', 'gauge', 'A test gauge.', next(values))])
+            self.assertIn('# TYPE test_gauge gauge\ntest_gauge 1\n', metrics.render_prometheus())
+            self.assertTrue(metrics.render_prometheus().endswith('test_gauge 2\n'))
+
+
+class DeadlineTests(SimpleTestCase):
+    """Cancelled work stops promptly, and the middleware answers 504 or 499 for it."""
+
+    def test_call_returns_on_cancellation(self):
+        from fns import deadlines
+
+        release = threading.Event()
+        self.addCleanup(release.set)
+        deadline = deadlines.Deadline()
+        threading.Timer(0.05, deadline.cancel, args=('disconnected',)).start()
+        started = time.monotonic()
+        with deadlines.running_under(deadline), self.assertRaises(deadlines.RequestCancelled) as raised:
+            deadlines.call(release.wait, 5)
+        self.assertEqual(raised.exception.reason, 'disconnected')
+        self.assertLess(time.monotonic() - started, 2)
+
+        with deadlines.running_under(deadlines.Deadline(0.05)), self.assertRaises(deadlines.RequestCancelled) as raised:
+            deadlines.call(release.wait, 5)
+        self.assertEqual(raised.exception.reason, 'deadline')
+        with self.assertRaises(deadlines.RequestCancelled):
+            with deadlines.running_under(deadline):
+                deadlines.checkpoint()
+        self.assertEqual(deadlines.call(lambda: 'done'), 'done')
+
+    def test_run_process_is_killed(self):
+        import subprocess
+        from fns import deadlines
+
+        for seconds, cancel_after, reason in [(None, 0.1, 'disconnected'), (0.1, None, 'deadline')]:
+            deadline = deadlines.Deadline(seconds)
+            if cancel_after:
+                threading.Timer(cancel_after, deadline.cancel, args=(reason,)).start()
+            started = time.monotonic()
+            with deadlines.running_under(deadline), self.assertRaises(deadlines.RequestCancelled) as raised:
+                deadlines.run_process(['sleep', '10'])
+            self.assertEqual(raised.exception.reason, reason)
+            self.assertLess(time.monotonic() - started, 5)
+
+        with deadlines.running_under(deadlines.Deadline(5)):
+            self.assertEqual(deadlines.run_process(['echo', 'ok']).stdout, b'ok\n')
+            with self.assertRaises(subprocess.CalledProcessError):
+                deadlines.run_process(['false'])
+
+    def test_middleware_maps_cancellation_to_status(self):
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+        from fns import deadlines
+
+        def view(reason):
+            def get_response(request):
+                self.assertIsNotNone(deadlines.current())
+                if reason:
+                    deadlines.current().cancel(reason)
+                    deadlines.checkpoint()
+                return HttpResponse('ok')
+            return get_response
+
+        request = RequestFactory().get('/api/resumes/')
+        for reason, status in [('deadline', 504), ('disconnected', 499), (None, 200)]:
+            response = deadlines.DeadlineMiddleware(view(reason))(request)
+            self.assertEqual(response.status_code, status)
+        self.assertIsNone(deadlines.current())
+
+
+class PreviewTests(SimpleTestCase):
+    """Previews render the supported subset, flag the rest, and are cached by content."""
+
+    LATEX = ("\\documentclass{article}\\begin{document}\\section{Work}\\textbf{Bold} \\& more"
+             "\\begin{itemize}\\item One\\end{itemize}\\end{document}")
+
+    def test_render_and_unsupported(self):
+        from fns.preview import render_preview
+
+        preview = render_preview(self.LATEX)
+        self.assertTrue(preview.complete)
+        self.assertIn('<h2>Work</h2><strong>Bold</strong> &amp; more<ul><li>One</li></ul>', preview.html)
+
+        partial = render_preview(self.LATEX.replace('\\end{document}', '\\mycmd{x}\\begin{tabular}{l}a\\end{tabular}'
+                                                                        '\\end{document}'))
+        self.assertFalse(partial.complete)
+        self.assertEqual(partial.unsupported, ['\\mycmd', '\\begin{tabular}'])
+
+    def test_get_or_render_caches_by_content(self):
+        from unittest import mock
+        from fns import preview
+        from fns.preview import PreviewCache
+
+        cache = PreviewCache(max_entries=2)
+        with mock.patch.object(preview, 'render_preview', wraps=preview.render_preview) as render:
+            first = cache.get_or_render(self.LATEX)
+            self.assertIs(cache.get_or_render(self.LATEX), first)
+            self.assertEqual((cache.hits, cache.misses, render.call_count), (1, 1, 1))
+
+            # Least recently used goes first
+            other, third = self.LATEX.replace('Work', 'Other'), self.LATEX.replace('Work', 'Third')
+            cache.get_or_render(other)
+            cache.get_or_render(self.LATEX)
+            cache.get_or_render(third)
+            self.assertEqual(render.call_count, 3)
+            self.assertIs(cache.get_or_render(self.LATEX), first)
+            self.assertIn('<h2>Other</h2>', cache.get_or_render(other).html)
+            self.assertEqual((cache.hits, cache.misses, render.call_count), (3, 4, 4))
+
+
+class ProfilingMiddlewareTests(SimpleTestCase):
+    """Users are selected from the verified-token cache only, and report ids are always generated here."""
+
+    def test_user_selection_and_server_side_ids(self):
+        import tempfile
+        from unittest import mock
+        from django.http import HttpResponse
+        from django.test import RequestFactory, override_settings
+        from fns import decorators, profiling
+
+        token = 'cached-token'
+        key = decorators.token_cache.key(token)
+        decorators.token_cache.put(key, {'uid': 'watched', 'exp': time.time() + 60})
+        self.addCleanup(decorators.token_cache._entries.pop, key, None)
+
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(PROFILING_ENABLED=True, PROFILING_USER_IDS=['watched'], PROFILING_TRACE_MEMORY=False), \
+                mock.patch.object(profiling, 'report_store', profiling.ReportStore(directory)), \
+                mock.patch.object(decorators, 'verify_token', side_effect=AssertionError('verified a token')):
+            middleware = profiling.ProfilingMiddleware(lambda request: HttpResponse('ok'))
+
+            response = middleware(RequestFactory().get('/api/resumes/', HTTP_AUTHORIZATION=f'Bearer {token}',
+                                                       HTTP_X_REQUEST_ID='../chosen-name'))
+            request_id = response['X-Request-Id']
+            self.assertNotEqual(request_id, '../chosen-name')
+            self.assertRegex(request_id, profiling.REQUEST_ID_PATTERN)
+            self.assertEqual(profiling.report_store.get(request_id)['reason'], 'user')
+
+            # An uncached token isn't verified by the middleware, just not selected
+            response = middleware(RequestFactory().get('/api/resumes/', HTTP_AUTHORIZATION='Bearer other-token'))
+            self.assertNotIn('X-Request-Id', response)
+            self.assertEqual(len(profiling.report_store.list()), 1)
+
+
+class CertificateRefreshTests(SimpleTestCase):
+    """Cache misses are verified against the refreshed certificates, and a failing refresh backs off."""
+
+    def test_backoff_then_recovery(self):
+        from unittest import mock
+        from fns import decorators
+
+        class Response:
+            def __init__(self, status, data=b'{}'):
+                self.status, self.data = status, data
+
+        responses = [Response(503), Response(503), RuntimeError('offline'), Response(200, b'{"kid": "PEM"}')]
+
+        def request(url, method='GET', timeout=None):
+            self.assertEqual(url, decorators.PUBLIC_CERTIFICATES_URL)
+            response = responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+        state = {'certs': {}, 'fetched_at': 0.0, 'failures': 0}
+        delays, failures = [], 0
+        with mock.patch.object(decorators, 'public_certificates', state):
+            for _ in range(4):
+                delay, failures = decorators._refresh_once(request, failures)
+                delays.append(delay)
+        self.assertEqual(delays, [5, 10, 20, decorators.CERT_REFRESH_SECONDS])
+        self.assertEqual(failures, 0)
+        self.assertEqual(state['certs'], {'kid': 'PEM'})
+        self.assertEqual(state['failures'], 3)
+
+    def test_cache_misses_are_verified_with_the_fetched_certificates(self):
+        import datetime
+        from unittest import mock
+
+        from cryptography import x509
+        from cryptography.hazmat.primitives import hashes, serialization
+        from cryptography.hazmat.primitives.asymmetric import rsa
+        from cryptography.x509.oid import NameOID
+        from firebase_admin import auth
+        from google.auth import crypt, jwt
+        from fns import decorators
+
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'test')])
+        now = datetime.datetime.now(datetime.timezone.utc)
+        cert = (x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+                .serial_number(1).not_valid_before(now - datetime.timedelta(days=1))
+                .not_valid_after(now + datetime.timedelta(days=1)).sign(key, hashes.SHA256()))
+        pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                serialization.NoEncryption())
+        signer = crypt.RSASigner.from_string(pem, key_id='k1')
+
+        def token(signer=signer, **claims):
+            issued = int(time.time()) - 10
+            payload = {'iss': 'https://securetoken.google.com/proj', 'aud': 'proj', 'sub': 'u1',
+                       'iat': issued, 'exp': issued + 3600, 'auth_time': issued, **claims}
+            return jwt.encode(signer, payload).decode()
+
+        state = {'certs': {'k1': cert.public_bytes(serialization.Encoding.PEM).decode()},
+                 'fetched_at': time.time(), 'failures': 0}
+        with mock.patch.object(decorators, 'public_certificates', state), \
+                mock.patch.object(decorators, '_project_id', return_value='proj'), \
+                mock.patch.object(auth, 'verify_id_token', return_value={'uid': 'sdk'}) as sdk:
+            self.assertEqual(decorators._verify_id_token(token())['uid'], 'u1')
+            with self.assertRaises(auth.ExpiredIdTokenError):
+                decorators._verify_id_token(token(exp=int(time.time()) - 5))
+            for bad in (token(aud='other'), token(iss='https://securetoken.google.com/other'), token(sub='')):
+                with self.assertRaises(auth.InvalidIdTokenError):
+                    decorators._verify_id_token(bad)
+            self.assertEqual(sdk.call_count, 0)
+
+            # A key the refresher hasn't fetched yet, or certificates too old to trust, go through the SDK
+            unknown = crypt.RSASigner.from_string(pem, key_id='k2')
+            self.assertEqual(decorators._verify_id_token(token(signer=unknown))['uid'], 'sdk')
+            state['fetched_at'] = time.time() - decorators.CERT_MAX_AGE_SECONDS - 1
+            self.assertEqual(decorators._verify_id_token(token(), check_revoked=True)['uid'], 'sdk')
+            sdk.assert_called_with(mock.ANY, check_revoked=True)
+            self.assertEqual(sdk.call_count, 2)
+
+    def test_refresher_is_off_in_tests(self):
+        from django.conf import settings
+
+        self.assertFalse(settings.FIREBASE_CERT_REFRESH_ENABLED)
+
+
+class StorageParityTests(TestCase):
+    """The memory and django backends give the same results for the same operations."""
+
+    def exercise(self, storage):
+        from datetime import datetime, timedelta, timezone
+        from fns.storage import SERVER_TIMESTAMP, DocumentExists, DocumentNotFound
+
+        base = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        with storage.batch() as batch:
+            for i in range(5):
+                batch.set('resumes', f'r{i}', {
+                    'userId': 'u1' if i < 4 else 'u2', 'resumeName': f'R{i}', 'blob': b'\x00\x01',
+                    'createdAt': base + timedelta(days=i), 'lastUpdated': base + timedelta(days=10 - i),
+                })
+            batch.set('resumes', 'undated', {'userId': 'u1', 'resumeName': 'No dates'})
+        storage.update('resumes', 'r1', {'lastUpdated': base + timedelta(days=30), 'resumeName': 'Edited'})
+        storage.delete('resumes', 'r3')
+        with self.assertRaises(DocumentExists), storage.batch() as batch:
+            batch.create('resumes', 'r0', {'userId': 'u1'})
+        with self.assertRaises(DocumentNotFound):
+            storage.update('resumes', 'nope', {'resumeName': 'x'})
+
+        results = {}
+        results['get'] = storage.get_all([('resumes', 'r1'), ('resumes', 'r3'), ('resumes', 'r2')],
+                                         ['resumeName', 'blob'])
+        results['newest'] = storage.query_by_user('resumes', 'u1', limit=2, fields=['resumeName'])
+        results['after'] = storage.query_by_user('resumes', 'u1', start_after=(base + timedelta(days=2), 'r2'),
+                                                 fields=['resumeName'])
+        results['updated'] = storage.query_by_user('resumes', 'u1', order_by='lastUpdated', descending=False,
+                                                   fields=['resumeName'])
+        storage.set('resumes', 'stamped', {'userId': 'u3', 'createdAt': SERVER_TIMESTAMP})
+        stamped = storage.query_by_user('resumes', 'u3')
+        results['stamped'] = [(doc_id, isinstance(data['createdAt'], datetime)) for doc_id, data in stamped]
+        return results
+
+    def test_memory_and_django_agree(self):
+        from fns.storage import DjangoStorage, MemoryStorage
+
+        memory, django = self.exercise(MemoryStorage()), self.exercise(DjangoStorage())
+        self.assertEqual(memory, django)
+        self.assertEqual([doc_id for doc_id, _ in memory['newest']], ['r2', 'r1'])
+        self.assertEqual([doc_id for doc_id, _ in memory['updated']], ['r2', 'r0', 'r1'])
+        with self.assertRaises(ValueError):
+            DjangoStorage().query_by_user('resumes', 'u1', order_by='resumeName')
+
+
+class ScoringPassagesTests(SimpleTestCase):
+    """Every word of a resume ends up in some passage, however long its lines are."""
+
+    def test_long_lines_are_split_not_truncated(self):
+        from fns.scoring import passages
+
+        long_line = ' '.join(f'w{i}' for i in range(25))
+        result = passages(f"short one\n\n{long_line}\nlast line", max_words=10)
+        self.assertEqual(result[0], 'short one')
+        self.assertEqual([len(passage.split()) for passage in result], [2, 10, 10, 7])
+        self.assertEqual(' '.join(result).split(), ['short', 'one', *long_line.split(), 'last', 'line'])
+
+
+class UploadIngestTests(SimpleTestCase):
+    """Oversized uploads are refused without reading them whole, and slow extraction falls back in time."""
+
+    def test_oversized_uploads_are_refused(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.test import RequestFactory
+        from fns import ingest
+
+        with self.assertRaises(ingest.UploadTooLarge):
+            ingest.spool_upload(SimpleUploadedFile('r.pdf', b'%PDF-1.4' + b'x' * 2048), '/nonexistent', max_bytes=1024)
+
+        body = b'%PDF-1.4' + b'x' * (200 * 1024)
+        request = RequestFactory().post('/upload', {'resume_pdf': SimpleUploadedFile('r.pdf', body)})
+        with self.assertRaises(ingest.UploadTooLarge):
+            ingest.limit_upload(request, max_bytes=100 * 1024)
+
+        # Content-Length within the multipart allowance: the handler stops reading part way through the file
+        request = RequestFactory().post('/upload', {'resume_pdf': SimpleUploadedFile('r.pdf', body)})
+        handler = ingest.limit_upload(request, max_bytes=150 * 1024)
+        self.assertNotIn('resume_pdf', request.FILES)
+        self.assertTrue(handler.exceeded)
+        self.assertLess(handler.received, len(body))
+
+    @unittest.skipUnless(importlib.util.find_spec('pypdf'), "pypdf is not installed")
+    def test_extraction_timeout_applies_within_a_page(self):
+        from unittest import mock
+        from fns import ingest
+
+        class SlowPage:
+            def extract_text(self, visitor_operand_before=None, visitor_text=None):
+                for _ in range(1000):
+                    time.sleep(0.01)
+                    visitor_operand_before(b'Tj', [], [1, 0, 0, 1, 0, 0], [1, 0, 0, 1, 0, 0])
+                return 'never reached'
+
+        class SlowReader:
+            is_encrypted = False
+
+            def __init__(self, path):
+                self.pages = [SlowPage()]
+
+        started = time.perf_counter()
+        with mock.patch('pypdf.PdfReader', SlowReader):
+            text, page_count, reason = ingest.extract_structured_text('unused.pdf', timeout=0.1)
+        self.assertLess(time.perf_counter() - started, 2)
+        self.assertIsNone(text)
+        self.assertEqual(page_count, 1)
+        self.assertIn('exceeded', reason)
+
+
+class ContextCacheTests(SimpleTestCase):
+    """A second tailor of the same resume sends only what changed; the resume comes from the context cache."""
+
+    def test_second_tailor_reuses_the_cached_resume(self):
+        from unittest import mock
+        from fns import fakes, views
+        from fns.context_cache import ContextCache
+
+        def tailor_twice(client):
+            cache = ContextCache()
+            with mock.patch.object(views, 'gemini_client', client), mock.patch.object(views, 'context_cache', cache):
+                self.assertIsNotNone(views.get_tailored_template_and_chunks(fakes.SAMPLE_RESUME_TEX, 'Go', 'Brief.'))
+                before = (client.uncached_prompt_tokens, client.cached_prompt_tokens)
+                self.assertIsNotNone(views.get_tailored_template_and_chunks(fakes.SAMPLE_RESUME_TEX, 'SQL', 'Brief.'))
+            return client.uncached_prompt_tokens - before[0], client.cached_prompt_tokens - before[1], cache
+
+        # A client that refuses every context cache gets the whole prompt inline
+        inline_uncached, inline_cached, _ = tailor_twice(fakes.FakeGeminiClient(jitter=0, min_cache_tokens=10 ** 9))
+        uncached, cached, cache = tailor_twice(fakes.FakeGeminiClient(jitter=0))
+
+        self.assertEqual(inline_cached, 0)
+        self.assertGreater(cached, 0)
+        self.assertLess(uncached, inline_uncached)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+
+class ExportArchiveTests(SimpleTestCase):
+    """The streamed ZIP holds every resume, lists failed compiles, and keeps few compiles in flight."""
+
+    def test_archive_members_and_errors(self):
+        import io
+        import uuid
+        import zipfile
+        from fns import export
+
+        marker = uuid.uuid4().hex
+        resumes = [(f'id{i}', {'resumeName': f'Resume {i}', 'latexContent': f'% {marker} {i}'}) for i in range(6)]
+        in_flight, peak, lock = [0], [0], threading.Lock()
+
+        def compile_fn(latex):
+            with lock:
+                in_flight[0] += 1
+                peak[0] = max(peak[0], in_flight[0])
+            time.sleep(0.02)
+            with lock:
+                in_flight[0] -= 1
+            return None if latex.endswith(' 3') else b'%PDF-' + latex.encode()
+
+        data = b''.join(export.stream_resume_archive(resumes, compile_fn, window=2))
+        archive = zipfile.ZipFile(io.BytesIO(data))
+        names = archive.namelist()
+        self.assertEqual(sorted(name for name in names if name.endswith('.tex')),
+                         [f'Resume {i}.tex' for i in range(6)])
+        self.assertEqual(sorted(name for name in names if name.endswith('.pdf')),
+                         [f'Resume {i}.pdf' for i in range(6) if i != 3])
+        self.assertEqual(archive.read('Resume 0.pdf'), f'%PDF-% {marker} 0'.encode())
+        self.assertIn('Resume 3', archive.read('export-errors.txt').decode())
+        self.assertLessEqual(peak[0], 2)
+
+    def test_throttled_compiles_are_retried_not_reported(self):
+        import io
+        import subprocess
+        import uuid
+        import zipfile
+        from fns import export
+        from fns.scheduler import QueueFull
+
+        marker = uuid.uuid4().hex
+        resumes = [(f'id{i}', {'resumeName': f'Resume {i}', 'latexContent': f'% {marker} {i}'}) for i in range(3)]
+        refusals = {'0': 2}
+
+        def compile_fn(latex):
+            index = latex[-1]
+            if refusals.get(index):
+                refusals[index] -= 1
+                raise QueueFull(0.01)
+            if index == '2':
+                raise subprocess.CalledProcessError(1, ['pdflatex'])
+            return b'%PDF-' + latex.encode()
+
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(export.stream_resume_archive(resumes, compile_fn, ['pdf']))))
+        self.assertEqual(sorted(archive.namelist()), ['Resume 0.pdf', 'Resume 1.pdf', 'export-errors.txt'])
+        self.assertEqual(archive.read('export-errors.txt').decode().splitlines()[1:], ['Resume 2'])
+        self.assertEqual(refusals['0'], 0)
+
+        def broken(latex):
+            raise OSError('pdflatex not installed')
+
+        with self.assertRaises(OSError):
+            b''.join(export.stream_resume_archive([('x', {'latexContent': f'% {marker} x'})], broken, ['pdf']))
+
+
+class TemplatingTests(SimpleTestCase):
+    """Placeholders are filled in one pass; command arguments, escapes and comments are left alone."""
+
+    def test_placeholders_and_command_arguments(self):
+        from fns.templating import compile_template
+
+        template = (
+            "\\section*{Summary}\n{summary}\n"
+            "\\begin{itemize}\n  \\item {b1}\n  \\item{b2}\n  \\item[--]{b3}\n\\end{itemize}\n"
+            "\\href{https://x.dev}{site} \\{literal\\} % {commented}\n{b1}"
+        )
+        compiled = compile_template(template)
+        self.assertEqual(compiled.placeholders, ['summary', 'b1', 'b2', 'b3'])
+
+        rendered = compiled.render({'summary': 'S', 'b1': 'One', 'b2': 'Two', 'extra': 'X'})
+        self.assertIn("\\item One\n  \\item{Two}\n", rendered.latex)
+        self.assertIn("\\item[--]{b3}", rendered.latex)
+        self.assertIn("\\begin{itemize}", rendered.latex)
+        self.assertIn("\\href{https://x.dev}{site} \\{literal\\} % {commented}", rendered.latex)
+        self.assertTrue(rendered.latex.endswith("One"))
+        self.assertEqual(rendered.unfilled, ['b3'])
+        self.assertEqual(rendered.unused, ['extra'])
+
+
+class LiteHumanizerTests(SimpleTestCase):
+    """The lite tier must expand contractions and swap synonyms without touching LaTeX."""
+
+    def test_rules_leave_latex_alone(self):
+        from transformer.lite import LiteTextHumanizer, fix_escapes
+
+        humanizer = LiteTextHumanizer(p_synonym_replacement=0.0, p_academic_transition=0.0)
+        self.assertEqual(
+            humanizer.expand_contractions("We didn't stop; it's the team's tool and I've USED it. Can't fail."),
+            "We did not stop; it is the team's tool and I have USED it. Cannot fail.",
+        )
+        text = r"Used \textbf{fast} caches to cut costs by 40\% \& more."
+        for _ in range(20):
+            replaced = humanizer.replace_with_synonyms(text)
+            self.assertIn(r"\textbf{", replaced)
+            self.assertIn(r"40\% \&", replaced)
+        self.assertEqual(fix_escapes(r"40\ % and R\ &D"), r"40\% and R\&D")
+
+    def test_phrasal_verbs_keep_their_inflection(self):
+        from transformer.lite import LiteTextHumanizer
+
+        humanizer = LiteTextHumanizer(p_synonym_replacement=0.0, p_academic_transition=0.0, seed=1)
+        text = "We set up CI. She sets up alerts while setting up dashboards to speed up releases."
+        replaced = text
+        for _ in range(30):
+            replaced = humanizer.replace_with_synonyms(replaced)
+        self.assertEqual(replaced, "We establish CI. She establishes alerts while establishing dashboards "
+                                   "to accelerate releases.")
+
+    def test_full_tier_is_refused_on_a_lite_deployment(self):
+        from unittest import mock
+        from fns import views
+
+        with mock.patch.object(views, 'AVAILABLE_HUMANIZER_TIERS', ('lite',)):
+            self.assertIsNone(views.humanizer_tier_error(None))
+            self.assertIsNone(views.humanizer_tier_error('lite'))
+            self.assertEqual(views.humanizer_tier_error('full').status_code, 400)
+            self.assertEqual(views.humanizer_tier_error('fancy').status_code, 400)
+
+
+@unittest.skipUnless(importlib.util.find_spec('sentence_transformers'), "sentence-transformers is not installed")
+class QuantizedEmbeddingParityTests(SimpleTestCase):
+    """The int8 backend must choose (almost) the same synonyms as the fp32 model."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        from transformer import embeddings
+        cls.embeddings = embeddings
+        cls.reference = embeddings.load_sentence_model(backend='fp32')
+        cls.quantized = embeddings.load_sentence_model(backend='int8')
+
+    def test_synonym_choices_agree_with_fp32(self):
+        agreement = self.embeddings.synonym_agreement(self.reference, self.quantized)
+        self.assertGreaterEqual(agreement, SYNONYM_PARITY_THRESHOLD)
+
+    def test_embeddings_stay_close_to_fp32(self):
+        from sentence_transformers import util
+        sentences = ["Led a team of five engineers.", "Cut API latency by forty percent."]
+        similarity = util.cos_sim(self.reference.encode(sentences, convert_to_tensor=True),
+                                  self.quantized.encode(sentences, convert_to_tensor=True))
+        for index in range(len(sentences)):
+            self.assertGreater(similarity[index][index].item(), 0.95)
@@ -8,13 +8,25 @@ urlpatterns = [
     # Add the new path
     path('test-firebase/', views.test_firebase_connection, name='test_firebase'),
     path('profile/', views.get_user_profile, name='get_user_profile'),
+    path('metrics/', views.metrics_view, name='metrics'),
+    path('ready/', views.ready_view, name='ready'),
+    path('queue/', views.queue_status_view, name='queue_status'),
+    path('profiles/', views.profile_list_view, name='profile_list'),
+    path('profiles/<str:request_id>/', views.profile_detail_view, name='profile_detail'),
     path('upload-resume/', views.upload_resume_view, name='upload_resume'),
     path('upload-tex/', views.upload_tex_view, name='upload_tex'),
     path('resumes/<str:resume_id>/download/', views.download_resume_pdf_view, name='download_resume_pdf'),
     path('tailor-resume/', views.tailor_resume_view, name='tailor_resume'),
+    path('resumes/', views.list_resumes_view, name='list_resumes'),
+    path('resumes/export/', views.export_resumes_view, name='export_resumes'),
+    path('resumes/rank/', views.rank_resumes_view, name='rank_resumes'),
     path('resumes/<str:resume_id>/', views.get_resume_details_view, name='get_resume_details'),
     path('resumes/<str:resume_id>/refine/', views.refine_resume_view, name='refine_resume'),
     path('resumes/<str:resume_id>/delete/', views.delete_resume_view, name='delete_resume'),
     path('resumes/<str:resume_id>/download-tex/', views.download_resume_tex_view, name='download_resume_tex'),
+    path('resumes/<str:resume_id>/preview/', views.preview_resume_view, name='preview_resume'),
     path('resumes/<str:resume_id>/rename/', views.rename_resume_view, name='rename_resume'),
+    path('resumes/<str:resume_id>/versions/', views.list_resume_versions_view, name='list_resume_versions'),
+    path('resumes/<str:resume_id>/versions/<int:version>/', views.get_resume_version_view, name='get_resume_version'),
+    path('resumes/<str:resume_id>/versions/<int:version>/restore/', views.restore_resume_version_view, name='restore_resume_version'),
 ]
\ No newline at end of file
@@ -0,0 +1,146 @@
+# fns/versioning.py
+"""
+Compact storage format for resume version history.
+
+Every version is stored as one entry. Every `interval`-th version is a
+zlib-compressed snapshot of the full LaTeX; the versions in between are
+compressed line deltas against the previous version. Rebuilding any
+version therefore needs at most one snapshot plus `interval - 1` deltas.
+
+Each entry records in `snapshotVersion` the snapshot its chain starts
+from, and the next snapshot is written `interval` versions after that one
+rather than on a fixed multiple. Changing the interval therefore never
+leaves a chain pointing at a version that was stored as a delta.
+"""
+
+import difflib
+import json
+import zlib
+
+SNAPSHOT = 'snapshot'
+DELTA = 'delta'
+
+DEFAULT_SNAPSHOT_INTERVAL = 10
+
+
+def compress_text(text: str) -> bytes:
+    return zlib.compress(text.encode('utf-8'), 9)
+
+
+def decompress_text(blob: bytes) -> str:
+    return zlib.decompress(blob).decode('utf-8')
+
+
+def make_delta(old: str, new: str) -> list:
+    """
+    Line-level delta turning `old` into `new`, as a list of ops:
+      ['=', n]      copy the next n lines of old
+      ['-', n]      skip the next n lines of old
+      ['+', lines]  insert the given lines
+    """
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    ops = []
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append(['=', i2 - i1])
+            continue
+        if tag in ('replace', 'delete'):
+            ops.append(['-', i2 - i1])
+        if tag in ('replace', 'insert'):
+            ops.append(['+', new_lines[j1:j2]])
+    return ops
+
+
+def apply_delta(old: str, ops: list) -> str:
+    old_lines = old.splitlines(keepends=True)
+    out, pos = [], 0
+    for op, arg in ops:
+        if op == '=':
+            out.extend(old_lines[pos:pos + arg])
+            pos += arg
+        elif op == '-':
+            pos += arg
+        elif op == '+':
+            out.extend(arg)
+        else:
+            raise ValueError(f"Unknown delta op: {op!r}")
+    return ''.join(out)
+
+
+def encode_delta(ops: list) -> bytes:
+    return zlib.compress(json.dumps(ops, separators=(',', ':')).encode('utf-8'), 9)
+
+
+def decode_delta(blob: bytes) -> list:
+    return json.loads(zlib.decompress(blob))
+
+
+def is_snapshot_version(version: int, interval: int = DEFAULT_SNAPSHOT_INTERVAL) -> bool:
+    return version % interval == 0
+
+
+def needs_snapshot(version: int, snapshot_version: int = None, interval: int = DEFAULT_SNAPSHOT_INTERVAL) -> bool:
+    """
+    Whether `version` must be a snapshot, given the snapshot the previous
+    version's chain starts from (None when unknown, for history written
+    before entries recorded it: then the interval boundaries decide).
+    """
+    if snapshot_version is None:
+        return is_snapshot_version(version, interval)
+    return version - snapshot_version >= interval
+
+
+def build_entry(version: int, new_text: str, previous_text: str = None,
+                interval: int = DEFAULT_SNAPSHOT_INTERVAL, snapshot_version: int = None) -> dict:
+    """
+    Builds the stored form of `version`. `snapshot_version` is the previous
+    version's `snapshotVersion`. A snapshot is written once the chain would
+    reach `interval` entries, or when there is no previous text to diff
+    against.
+    """
+    if previous_text is None or needs_snapshot(version, snapshot_version, interval):
+        kind, data, snapshot_version = SNAPSHOT, compress_text(new_text), version
+    else:
+        kind, data = DELTA, encode_delta(make_delta(previous_text, new_text))
+    entry = {
+        'version': version,
+        'kind': kind,
+        'data': data,
+        'storedBytes': len(data),
+        'textBytes': len(new_text.encode('utf-8')),
+    }
+    if snapshot_version is not None:
+        entry['snapshotVersion'] = snapshot_version
+    return entry
+
+
+def chain_for(version: int, interval: int = DEFAULT_SNAPSHOT_INTERVAL) -> list:
+    """
+    Version numbers that must be loaded to rebuild `version`, oldest first,
+    if the interval has never changed. Entries' `snapshotVersion` is the
+    authority (see fns/repository.py:get_version_text).
+    """
+    base = version - version % interval
+    return list(range(base, version + 1))
+
+
+def reconstruct(entries: list) -> str:
+    """
+    Rebuilds the text of the last entry. `entries` must be consecutive
+    versions, oldest first, and the chain must contain a snapshot; entries
+    before the latest snapshot are ignored.
+    """
+    start = None
+    for index in range(len(entries) - 1, -1, -1):
+        if entries[index]['kind'] == SNAPSHOT:
+            start = index
+            break
+    if start is None:
+        raise ValueError("Version chain has no snapshot to start from.")
+
+    text = decompress_text(entries[start]['data'])
+    for entry in entries[start + 1:]:
+        text = apply_delta(text, decode_delta(entry['data']))
+    return text
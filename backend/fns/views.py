@@ -2,9 +2,15 @@ from django.shortcuts import render
 from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
 
-from django.http import HttpResponse, JsonResponse
-from firebase_admin import firestore
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
 from .decorators import firebase_auth_required
+from . import conditional, deadlines, export, ingest, preview, profiling, repository, scoring, warmup
+from .scheduler import QueueFull, busy_response, scheduler
+from .artifacts import pdf_cache
+from .context_cache import context_cache, record_usage
+from .repository import InvalidCursor, ResumeNotFound, ResumePermissionDenied
+from .metrics import render_prometheus, span, timed
+from .storage import SERVER_TIMESTAMP, get_storage
 
 from google import genai
 from google.genai import types
@@ -15,11 +21,33 @@ import subprocess
 import os        
 import tempfile   
 
-from transformer.app import AcademicTextHumanizer
+from transformer.lite import TIERS as HUMANIZER_TIERS, LiteTextHumanizer, fix_escapes
+from .templating import compile_template
 import re
 
 
-humanizer = AcademicTextHumanizer(p_passive=0.3, p_synonym_replacement=0.3, p_academic_transition=0.4)
+RESUME_PAGE_SIZE = 20
+MAX_RESUME_PAGE_SIZE = 100
+# Single-resume reads also fetch what their ETag is computed from (see fns/conditional.py)
+CONTENT_READ_FIELDS = conditional.with_etag_fields(repository.RESUME_CONTENT_FIELDS)
+DETAIL_READ_FIELDS = conditional.with_etag_fields(repository.RESUME_DETAIL_FIELDS)
+
+# The model-free tier is always available; the full one is only loaded (spaCy, NLTK, embeddings) when it is the default
+lite_humanizer = LiteTextHumanizer(p_synonym_replacement=0.3, p_academic_transition=0.4)
+if settings.HUMANIZER_TIER == 'lite':
+    humanizer = lite_humanizer
+    # Asking for 'full' is refused rather than quietly served by the lite tier
+    AVAILABLE_HUMANIZER_TIERS = ('lite',)
+else:
+    AVAILABLE_HUMANIZER_TIERS = HUMANIZER_TIERS
+    from transformer.app import AcademicTextHumanizer
+    humanizer = AcademicTextHumanizer(
+        p_passive=0.3, p_synonym_replacement=0.3, p_academic_transition=0.4,
+        embedding_backend=settings.HUMANIZER_EMBEDDING_BACKEND,
+        num_threads=settings.HUMANIZER_TORCH_THREADS or None,
+    )
+    # Job-fit scoring reuses the humanizer's embedding model instead of loading a second copy
+    scoring.set_model(humanizer.model)
 gemini_client = genai.Client(api_key=settings.GEMINI_API_KEY)
 
 class ContentChunk(BaseModel):
@@ -40,10 +68,7 @@ def home(request):
 
 def test_firebase_connection(request):
     try:
-        db = firestore.client()
-
-        doc_ref = db.collection('test_logs').document('log_from_django')
-        doc_ref.set({
+        get_storage().set('test_logs', 'log_from_django', {
             'message': 'Hello from Django!',
             'status': 'success'
         })
@@ -52,6 +77,58 @@ def test_firebase_connection(request):
     except Exception as e:
         return JsonResponse({"status": "error", "message": str(e)}, status=500)
     
+def metrics_view(request):
+    """Prometheus scrape endpoint. Requires `Authorization: Bearer <METRICS_TOKEN>` when that setting is set."""
+    metrics_token = getattr(settings, 'METRICS_TOKEN', '')
+    if metrics_token and request.headers.get('Authorization') != f'Bearer {metrics_token}':
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def ready_view(request):
+    """Readiness probe: 200 once this process has finished warm-up, 503 until then."""
+    if warmup.is_ready():
+        return JsonResponse({'status': 'ready', **warmup.status()})
+    warmup.warm_up_in_background()
+    return JsonResponse({'status': 'warming_up', **warmup.status()}, status=503)
+
+def profile_list_view(request):
+    """Stored request profiles, newest first (see fns/profiling.py). Requires `Authorization: Bearer <PROFILING_TOKEN>`."""
+    if not settings.PROFILING_ENABLED:
+        return JsonResponse({'error': 'Profiling is disabled.'}, status=404)
+    if not profiling.is_admin(request):
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    return JsonResponse({'profiles': profiling.report_store.list()})
+
+def profile_detail_view(request, request_id: str):
+    """
+    One request profile: stage timings, top functions by cumulative and own
+    time and top allocation sites. `?format=pstats` downloads the raw
+    cProfile dump. Same access rules as profile_list_view.
+    """
+    if not settings.PROFILING_ENABLED:
+        return JsonResponse({'error': 'Profiling is disabled.'}, status=404)
+    if not profiling.is_admin(request):
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+
+    if request.GET.get('format') == 'pstats':
+        path = profiling.report_store.pstats_path(request_id) if profiling.REQUEST_ID_PATTERN.match(request_id) else None
+        if path is None:
+            return JsonResponse({'error': 'Profile not found'}, status=404)
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=f'{request_id}.prof',
+                            content_type='application/octet-stream')
+
+    report = profiling.report_store.get(request_id) if profiling.REQUEST_ID_PATTERN.match(request_id) else None
+    if report is None:
+        return JsonResponse({'error': 'Profile not found'}, status=404)
+    return JsonResponse(report)
+
+@firebase_auth_required
+def queue_status_view(request):
+    """The caller's expensive jobs in this worker: how many are running, and each queued one's position and estimated wait."""
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Only GET method is allowed'}, status=405)
+    return JsonResponse(scheduler.status(request.user_id))
+
 @firebase_auth_required
 def get_user_profile(request):
     """
@@ -69,39 +146,53 @@ def get_user_profile(request):
     })
 
 
-def convert_pdf_to_latex(pdf_bytes):
+PDF_TO_LATEX_INSTRUCTIONS = (
+    "Instructions:\n"
+    "1. Use the 'article' document class.\n"
+    "2. Use the 'geometry' package for appropriate margins (e.g., `\\usepackage[a4paper, margin=1in]{geometry}`).\n"
+    "3. Preserve the sections, layout, and text formatting (like bold or itemized lists) as closely as possible.\n"
+    "4. The entire output in the 'resume_tex' field must be a single raw string of LaTeX code, "
+    "starting with `\\documentclass` and ending with `\\end{document}`."
+)
+
+def convert_pdf_to_latex(document: ingest.IngestedPdf):
     """
-    Converts PDF bytes to a LaTeX string using the Gemini API,
-    following the original working script's logic.
+    Converts an ingested PDF to a LaTeX string using the Gemini API. Sends the
+    extracted text layer when there is one, and the binary PDF otherwise.
     """
     class Res(BaseModel):
         ai_response: str
         resume_tex: str
 
-    client = genai.Client(api_key=settings.GEMINI_API_KEY)
-    
-    prompt = (
-        "Analyze the provided PDF resume and convert it into a complete, single, and compilable "
-        "LaTeX document. \n\n"
-        "Instructions:\n"
-        "1. Use the 'article' document class.\n"
-        "2. Use the 'geometry' package for appropriate margins (e.g., `\\usepackage[a4paper, margin=1in]{geometry}`).\n"
-        "3. Preserve the sections, layout, and text formatting (like bold or itemized lists) as closely as possible.\n"
-        "4. The entire output in the 'resume_tex' field must be a single raw string of LaTeX code, "
-        "starting with `\\documentclass` and ending with `\\end{document}`."
-    )
+    if document.has_text:
+        stage = 'gemini.convert_text'
+        contents = [
+            "Convert the resume below, extracted from a PDF, into a complete, single, and compilable "
+            "LaTeX document. Lines starting with '## ' are section headings, lines starting with '- ' "
+            "are bullet points, and 'Links:' lists the hyperlink targets on that page.\n\n"
+            + PDF_TO_LATEX_INSTRUCTIONS
+            + "\n\n--- EXTRACTED RESUME TEXT ---\n"
+            + document.text
+        ]
+    else:
+        stage = 'gemini.convert_pdf'
+        contents = [
+            types.Part.from_bytes(data=document.read_bytes(), mime_type='application/pdf'),
+            "Analyze the provided PDF resume and convert it into a complete, single, and compilable "
+            "LaTeX document. \n\n" + PDF_TO_LATEX_INSTRUCTIONS,
+        ]
 
-    response = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=[
-            types.Part.from_bytes(data=pdf_bytes, mime_type='application/pdf'),
-            prompt
-        ],
-        config={
-            "response_mime_type": "application/json",
-            "response_schema": Res,
-        },
-    )
+    with span(stage):
+        response = deadlines.call(
+            gemini_client.models.generate_content,
+            model="gemini-2.5-flash",
+            contents=contents,
+            config={
+                "response_mime_type": "application/json",
+                "response_schema": Res,
+                "http_options": {"timeout": deadlines.timeout_ms(settings.GEMINI_CONVERT_TIMEOUT_SECONDS)},
+            },
+        )
     
     parsed_response: Res = response.parsed
     return parsed_response.resume_tex
@@ -114,10 +205,18 @@ def upload_resume_view(request):
     if request.method != 'POST':
         return JsonResponse({'error': 'Only POST method is allowed'}, status=405)
 
-    if 'resume_pdf' not in request.FILES:
+    # Before request.FILES is touched, so an oversized body is never read whole
+    try:
+        upload_limit = ingest.limit_upload(request)
+    except ingest.UploadTooLarge as e:
+        return JsonResponse({'error': str(e)}, status=413)
+    uploaded_files = request.FILES
+    if upload_limit.exceeded:
+        return JsonResponse({'error': f"Upload exceeds the {upload_limit.max_bytes} byte limit."}, status=413)
+    if 'resume_pdf' not in uploaded_files:
         return JsonResponse({'error': 'No PDF file found in request'}, status=400)
 
-    uploaded_file = request.FILES['resume_pdf']
+    uploaded_file = uploaded_files['resume_pdf']
     user_uid = request.user_id
 
     resume_name = request.POST.get('resume_name', '').strip()
@@ -128,33 +227,43 @@ def upload_resume_view(request):
 
     try:
         print(f"Processing '{uploaded_file.name}' for user {user_uid}...")
-        pdf_bytes = uploaded_file.read()
-        
-        print("Sending to Gemini for conversion...")
-        latex_code = convert_pdf_to_latex(pdf_bytes)
+        with tempfile.TemporaryDirectory() as workdir:
+            try:
+                document = ingest.ingest_pdf(uploaded_file, workdir)
+            except ingest.UploadTooLarge as e:
+                return JsonResponse({'error': str(e)}, status=413)
+            except ingest.InvalidPdf as e:
+                return JsonResponse({'error': str(e)}, status=400)
+
+            if document.has_text:
+                print(f"Sending {len(document.text)} chars of extracted text to Gemini for conversion...")
+            else:
+                print(f"Sending the binary PDF to Gemini for conversion ({document.fallback_reason})...")
+            latex_code = scheduler.run(user_uid, 'convert', convert_pdf_to_latex, document)
         print("Conversion successful.")
 
         print("Saving to Firestore...")
-        db = firestore.client()
         resume_data = {
             'userId': user_uid,
             'resumeName': resume_name, 
             'originalFilename': uploaded_file.name,
             'latexContent': latex_code,
-            'createdAt': firestore.SERVER_TIMESTAMP,
-            'lastUpdated': firestore.SERVER_TIMESTAMP,
+            'createdAt': SERVER_TIMESTAMP,
+            'lastUpdated': SERVER_TIMESTAMP,
         }
         
-        doc_ref = db.collection('resumes').add(resume_data)
+        resume_id = repository.create_resume_with_history(resume_data)
         
-        print(f"Resume saved with ID: {doc_ref[1].id}")
+        print(f"Resume saved with ID: {resume_id}")
 
         return JsonResponse({
             'status': 'success', 
             'message': 'Resume converted and saved successfully!',
-            'resumeId': doc_ref[1].id
+            'resumeId': resume_id
         })
 
+    except QueueFull as e:
+        return busy_response(e)
     except Exception as e:
         print(f"An error occurred: {e}")
         return JsonResponse({'error': str(e)}, status=500)
@@ -180,23 +289,22 @@ def upload_tex_view(request):
         latex_content = uploaded_file.read().decode('utf-8')
 
         print(f"Saving uploaded .tex file to Firestore with name: '{resume_name}'")
-        db = firestore.client()
         
         resume_data = {
             'userId': user_uid,
             'resumeName': resume_name,
             'originalFilename': uploaded_file.name,
             'latexContent': latex_content,
-            'createdAt': firestore.SERVER_TIMESTAMP,
-            'lastUpdated': firestore.SERVER_TIMESTAMP,
+            'createdAt': SERVER_TIMESTAMP,
+            'lastUpdated': SERVER_TIMESTAMP,
         }
         
-        doc_ref = db.collection('resumes').add(resume_data)
+        resume_id = repository.create_resume_with_history(resume_data)
         
         return JsonResponse({
             'status': 'success', 
             'message': 'TeX file saved successfully!',
-            'resumeId': doc_ref[1].id
+            'resumeId': resume_id
         })
 
     except UnicodeDecodeError:
@@ -205,6 +313,7 @@ def upload_tex_view(request):
         print(f"An error occurred: {e}")
         return JsonResponse({'error': str(e)}, status=500)
     
+@timed('pdflatex')
 def compile_latex_to_pdf_bytes(latex_content: str):
     """
     Takes a string of LaTeX content, compiles it in a temporary directory,
@@ -232,7 +341,8 @@ def compile_latex_to_pdf_bytes(latex_content: str):
             # 3. Run the compiler command. We run it twice for complex docs (e.g., table of contents)
             for i in range(1):
                 print(f"Running pdflatex pass {i+1}...")
-                subprocess.run(command, check=True, capture_output=True, text=True)
+                # Killed if the download is abandoned or out of time
+                deadlines.run_process(command, text=True)
 
             # 4. If compilation was successful, read the PDF bytes
             if os.path.exists(pdf_filepath):
@@ -255,41 +365,41 @@ def download_resume_pdf_view(request, resume_id: str):
         return JsonResponse({'error': 'Only GET method is allowed'}, status=405)
 
     user_uid = request.user_id
-    db = firestore.client()
 
     try:
-        # 1. Fetch the resume document from Firestore
-        resume_ref = db.collection('resumes').document(resume_id)
-        resume_doc = resume_ref.get()
-
-        if not resume_doc.exists:
-            return JsonResponse({'error': 'Resume not found'}, status=404)
-
-        resume_data = resume_doc.to_dict()
-
-        # 2. SECURITY CHECK: Ensure the user owns this resume
-        if resume_data.get('userId') != user_uid:
-            return JsonResponse({'error': 'Permission denied'}, status=403)
+        # 1. Fetch the resume and ensure the user owns it; no compile if the client's copy is still current
+        resume_data, etag, not_modified = conditional.read_resume(
+            request, user_uid, resume_id, 'pdf', CONTENT_READ_FIELDS
+        )
+        if not_modified:
+            return not_modified
 
-        # 3. Get the LaTeX content and compile it
+        # 2. Get the LaTeX content and compile it (unchanged sources come from the PDF cache)
         latex_content = resume_data.get('latexContent')
-        pdf_bytes = compile_latex_to_pdf_bytes(latex_content)
+        pdf_bytes = pdf_cache.get_or_compile(
+            latex_content, lambda latex: scheduler.run(user_uid, 'compile', compile_latex_to_pdf_bytes, latex)
+        )
 
         if pdf_bytes:
-            # 4. If compilation is successful, create the HTTP response
-            response = HttpResponse(pdf_bytes, content_type='application/pdf')
+            # 3. If compilation is successful, send it (or the requested byte range)
+            response = conditional.ranged_response(request, pdf_bytes, 'application/pdf', etag)
             response['Content-Disposition'] = f'attachment; filename="{resume_data.get("resumeName", "resume")}.pdf"'
             return response
         else:
             return JsonResponse({'error': 'Failed to compile LaTeX into PDF.'}, status=500)
 
+    except ResumeNotFound:
+        return JsonResponse({'error': 'Resume not found'}, status=404)
+    except ResumePermissionDenied:
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    except QueueFull as e:
+        return busy_response(e)
     except Exception as e:
         print(f"An error occurred during PDF download: {e}")
         return JsonResponse({'error': 'An internal server error occurred.'}, status=500)
     
-def get_tailored_template_and_chunks(base_latex, job_desc, instructions):
-    print("\n🤖 Sending request to Gemini for template and content generation...")
-    prompt = f"""
+# The fixed part of the tailor/refine prompt; sent as the system instruction so it can be context-cached
+TAILOR_SYSTEM_PROMPT = """
     You are an expert resume editor. Your task is to update the 'BASE LATEX RESUME' based on the provided 'JOB DESCRIPTION' and 'USER INSTRUCTIONS'.Try to make the content in the resume more human like(dont need to use complex language , just simple english).
     make the entire resume fit in one page (only add details that are relevent to the JOB DESCRIPTION if need). try to maintain the formating of the BASE LATEX
 
@@ -297,71 +407,114 @@ def get_tailored_template_and_chunks(base_latex, job_desc, instructions):
     1.  **PRESERVE PERSONAL DETAILS:** You MUST preserve all personal details from the base resume (Name, Contact, Education, etc.). DO NOT replace them with generic information.
     2.  **ADAPT, DO NOT REPLACE:** Adapt the phrasing of the Summary and Experience sections to match the job description. Do not write a new resume from scratch.
     3.  **MAINTAIN STRUCTURE:** The output `latex_template` must maintain the exact LaTeX structure and commands of the original.
-    4.  **ESCAPE SPECIAL CHARACTERS:** This is crucial for the final document to compile. Within the generated text content, you MUST escape any special LaTeX characters. For example, a hash symbol '#' MUST be written as `\#`. An ampersand '&' MUST be written as `\&`. A percentage sign '%' MUST be written as `\%`.
+    4.  **ESCAPE SPECIAL CHARACTERS:** This is crucial for the final document to compile. Within the generated text content, you MUST escape any special LaTeX characters. For example, a hash symbol '#' MUST be written as `\\#`. An ampersand '&' MUST be written as `\\&`. A percentage sign '%' MUST be written as `\\%`.
     5.  **BOLD LABELS:** Fix this LaTeX code by properly formatting bold labels in list items and correcting any character issues that might cause compilation errors. Ensure each label is bolded cleanly and any problematic symbols are handled safely for LaTeX.
     6.  **LIST FORMATING** Ensure all bullet points are wrapped inside the correct LaTeX list environments using begin and end blocks like beginitemize and enditemize with itemize in curly backets, with each entry starting with item.
     7. **PDF COMPILATION SAFETY:** Your output must be clean and compile without LaTeX errors. This means avoiding unescaped characters, broken lists, or malformed sectioning commands.
 
     Your response MUST be in two parts:
-    1.  `latex_template`: A complete LaTeX document that preserves the original structure and formatting. For any long-form text or paragraph (like a summary or a job description bullet point), you MUST replace the text with a unique placeholder in the format `{{placeholder_key}}`. For example, `\section*{{Summary}} \n {{summary_section}}`. The bullet points for each job experience should be rewritten to sound natural and human, tailored to the job description.
+    1.  `latex_template`: A complete LaTeX document that preserves the original structure and formatting. For any long-form text or paragraph (like a summary or a job description bullet point), you MUST replace the text with a unique placeholder in the format `{placeholder_key}`. For example, `\\section*{Summary} \n {summary_section}`. The bullet points for each job experience should be rewritten to sound natural and human, tailored to the job description.
     2.  `content_chunks`: A list of JSON objects. Each object must contain two keys: `title` (the exact `placeholder_key` used in the template) and `content` (the detailed, AI-generated paragraph or text that should go into that placeholder).
+"""
 
-    --- BASE LATEX RESUME ---
-    {base_latex}
-
-    --- JOB DESCRIPTION ---
-    {job_desc}
-
-    --- USER INSTRUCTIONS ---
-    {instructions}
+@timed('gemini.tailor')
+def get_tailored_template_and_chunks(base_latex, job_desc, instructions, session=None):
     """
+    Tailors `base_latex` with Gemini. The part of the prompt that repeats
+    across calls is served from a context cache: the base resume for tailor
+    (one resume, many jobs), or the job description for a refine `session`
+    (one job, a new draft every turn).
+    """
+    print("\n🤖 Sending request to Gemini for template and content generation...")
+    resume_section = f"--- BASE LATEX RESUME ---\n{base_latex}\n"
+    job_section = f"--- JOB DESCRIPTION ---\n{job_desc}\n"
+    instructions_section = f"--- USER INSTRUCTIONS ---\n{instructions}\n"
+    if session is None:
+        stable, varying = resume_section, [job_section, instructions_section]
+    else:
+        stable, varying = job_section, [resume_section, instructions_section]
+
+    config = {
+        "response_mime_type": "application/json",
+        "response_schema": TailoredResumeResponse,
+        "http_options": {"timeout": deadlines.timeout_ms(settings.GEMINI_TAILOR_TIMEOUT_SECONDS)},
+    }
     try:
-        response = gemini_client.models.generate_content(
+        cache_name = context_cache.cached_content(
+            gemini_client, "gemini-2.5-flash", TAILOR_SYSTEM_PROMPT, [stable], session=session
+        )
+        if cache_name is not None:
+            try:
+                # Abandoned as soon as the client goes away or the request runs out of time
+                response = deadlines.call(
+                    gemini_client.models.generate_content,
+                    model="gemini-2.5-flash",
+                    contents=varying,
+                    config={**config, "cached_content": cache_name},
+                )
+                record_usage(response)
+                return response.parsed
+            except Exception as e:
+                # Most likely the cache expired or was deleted; fall back to the full prompt once
+                print(f"⚠️ Gemini call with context cache {cache_name} failed, retrying inline: {e}")
+                context_cache.invalidate(gemini_client, cache_name)
+
+        # Stable section first, so the inline prompt still shares a prefix with the previous call
+        response = deadlines.call(
+            gemini_client.models.generate_content,
             model="gemini-2.5-flash",
-            contents=[prompt],
-            config={"response_mime_type": "application/json", "response_schema": TailoredResumeResponse},
+            contents=[stable, *varying],
+            config={**config, "system_instruction": TAILOR_SYSTEM_PROMPT},
         )
+        record_usage(response)
         return response.parsed
     except Exception as e:
         print(f"❌ Gemini API Error: {e}")
         return None
 
-def humanize_content_chunks(chunks: List[ContentChunk]) -> Dict[str, str]:
+def humanizer_tier_error(tier):
+    """A 400 response when the request asks for a humanizer tier this server doesn't run, else None."""
+    if tier is None or tier in AVAILABLE_HUMANIZER_TIERS:
+        return None
+    if tier in HUMANIZER_TIERS:
+        return JsonResponse({'error': f"The {tier} humanizer is not available on this server; "
+                                      f"use one of {', '.join(AVAILABLE_HUMANIZER_TIERS)}."}, status=400)
+    return JsonResponse({'error': f"humanizer must be one of {', '.join(AVAILABLE_HUMANIZER_TIERS)}."}, status=400)
+
+@timed('humanize')
+def humanize_content_chunks(chunks: List[ContentChunk], tier=None) -> Dict[str, str]:
+    """`tier` 'lite' uses the model-free humanizer; anything else the deployment's default (HUMANIZER_TIER)."""
     print("\n⚙️ Running humanization process on all chunks...")
+    chunk_humanizer = lite_humanizer if tier == 'lite' else humanizer
     humanized_map = {}
-    special_chars = ['#', '$', '%', '&', '_', '{', '}']
     for chunk in chunks:
-        humanized_text = humanizer.humanize_text(
+        # Nobody will see the rest if the request was abandoned
+        deadlines.checkpoint()
+        humanized_text = chunk_humanizer.humanize_text(
                             chunk.content,
                             use_passive=True,
                             use_synonyms=True
                         )
-        for char in special_chars:
-            broken_escape = f'\\ {char}'  
-            correct_escape = f'\\{char}'   
-            if broken_escape in humanized_text:
-                humanized_text = humanized_text.replace(broken_escape, correct_escape)
-        humanized_map[chunk.title] = humanized_text
+        humanized_map[chunk.title] = fix_escapes(humanized_text)
         print(f"  - Humanized '{chunk.title}'")
     
     print("✅ Dummy humanization complete.")
     return humanized_map
 
-def populate_template(template: str, content_map: Dict[str, str]) -> str:
+@timed('populate')
+def populate_template(template, content_map: Dict[str, str]) -> str:
     print("\n🧩 Stitching humanized content into the final template...")
-    
-    final_latex = template
-    
-    for placeholder_key, content in content_map.items():
-        placeholder_to_find = "{" + placeholder_key + "}"
-        
-        if placeholder_to_find in final_latex:
-            final_latex = final_latex.replace(placeholder_to_find, content)
-        else:
-            print(f"⚠️ WARNING: Placeholder '{placeholder_to_find}' not found in the template. Skipping.")
-            
+
+    compiled = compile_template(template)
+    rendered = compiled.render(content_map)
+
+    for placeholder_key in rendered.unused:
+        print(f"⚠️ WARNING: Placeholder '{{{placeholder_key}}}' not found in the template. Skipping.")
+    for placeholder_key in rendered.unfilled:
+        print(f"⚠️ WARNING: No content generated for placeholder '{{{placeholder_key}}}'.")
+
     print("✅ Stitching complete.")
-    return final_latex
+    return rendered.latex
 
 @csrf_exempt
 @firebase_auth_required
@@ -370,54 +523,57 @@ def tailor_resume_view(request):
         return JsonResponse({'error': 'Only POST method is allowed'}, status=405)
 
     user_uid = request.user_id
-    db = firestore.client()
     
     # --- Step 1: Get all inputs from the frontend request ---
     base_resume_id = request.POST.get('base_resume_id')
     job_description = request.POST.get('job_description')
     new_resume_name = request.POST.get('new_resume_name', '').strip()
+    humanizer_tier = request.POST.get('humanizer') or None
 
     # --- Step 2: Validate all required inputs ---
     if not base_resume_id or not job_description or not new_resume_name:
         return JsonResponse({
             'error': 'base_resume_id, job_description, and new_resume_name are all required.'
         }, status=400)
+    tier_error = humanizer_tier_error(humanizer_tier)
+    if tier_error:
+        return tier_error
 
     try:
-        # --- Step 3: Fetch base resume and user instructions from Firestore ---
+        # --- Step 3: Fetch base resume and user instructions from Firestore in one round trip ---
         print("Fetching base data from Firestore...")
-        resume_ref = db.collection('resumes').document(base_resume_id)
-        base_resume_doc = resume_ref.get()
-        if not base_resume_doc.exists or base_resume_doc.to_dict().get('userId') != user_uid:
+        try:
+            base_resume, user_data = repository.get_owned_resume_and_user(
+                user_uid, base_resume_id, ['latexContent'], ['customInstructions']
+            )
+        except (ResumeNotFound, ResumePermissionDenied):
             return JsonResponse({'error': 'Base resume not found or permission denied.'}, status=404)
         
-        user_ref = db.collection('users').document(user_uid)
-        user_doc = user_ref.get()
+        base_latex = base_resume.get('latexContent', '')
+        user_instructions = user_data.get('customInstructions', '')
         
-        base_latex = base_resume_doc.to_dict().get('latexContent', '')
-        user_instructions = user_doc.to_dict().get('customInstructions', '')
+        # --- Step 4: Run the full AI + Humanize + Stitch process (when it's this user's turn) ---
+        with scheduler.slot(user_uid, 'tailor'):
+            tailored_response = get_tailored_template_and_chunks(base_latex, job_description, user_instructions)
+            if not tailored_response:
+                raise Exception("Failed to get a valid response from the Gemini API.")
+
+            humanized_map = humanize_content_chunks(tailored_response.content_chunks, humanizer_tier)
+            final_latex = populate_template(tailored_response.latex_template, humanized_map)
         
-        # --- Step 4: Run the full AI + Humanize + Stitch process ---
-        tailored_response = get_tailored_template_and_chunks(base_latex, job_description, user_instructions)
-        if not tailored_response:
-            raise Exception("Failed to get a valid response from the Gemini API.")
-            
-        humanized_map = humanize_content_chunks(tailored_response.content_chunks)
-        final_latex = populate_template(tailored_response.latex_template, humanized_map)
-        
-        # --- Step 5: Save the result as a NEW resume in Firestore ---
+        # --- Step 5: Save the result as a NEW resume in Firestore (unless the client gave up) ---
+        deadlines.checkpoint()
         print(f"Saving tailored resume to Firestore with new name: '{new_resume_name}'")
         new_resume_data = {
             'userId': user_uid,
             'resumeName': new_resume_name, # Use the name provided by the user
             'latexContent': final_latex,
             'isDraft': True,
-            'createdAt': firestore.SERVER_TIMESTAMP,
-            'lastUpdated': firestore.SERVER_TIMESTAMP,
+            'createdAt': SERVER_TIMESTAMP,
+            'lastUpdated': SERVER_TIMESTAMP,
             'jobDescription': job_description,
         }
-        new_doc_ref = db.collection('resumes').add(new_resume_data)
-        new_resume_id = new_doc_ref[1].id
+        new_resume_id = repository.create_resume_with_history(new_resume_data)
         
         # --- Step 6: Return the ID of the new draft resume to the frontend ---
         return JsonResponse({
@@ -426,36 +582,128 @@ def tailor_resume_view(request):
             'newResumeId': new_resume_id
         })
 
+    except QueueFull as e:
+        return busy_response(e)
     except Exception as e:
         print(f"An error occurred during tailoring: {e}")
         return JsonResponse({'error': str(e)}, status=500)
     
 @csrf_exempt
 @firebase_auth_required
-def get_resume_details_view(request, resume_id: str):
-    """Fetches the current data of a single resume document."""
+def list_resumes_view(request):
+    """
+    Lists the user's resumes (metadata only, newest first) one page at a time.
+    Pass `cursor` from the previous page's `nextCursor` to get the next page.
+    """
     if request.method != 'GET':
         return JsonResponse({'error': 'Only GET method is allowed'}, status=405)
 
     user_uid = request.user_id
-    db = firestore.client()
 
     try:
-        resume_ref = db.collection('resumes').document(resume_id)
-        resume_doc = resume_ref.get()
+        limit = min(max(int(request.GET.get('limit', RESUME_PAGE_SIZE)), 1), MAX_RESUME_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({'error': 'limit must be an integer.'}, status=400)
+    cursor = request.GET.get('cursor') or None
+
+    try:
+        # Unchanged page: checked from ids and timestamps only, without building the body
+        if 'If-None-Match' in request.headers:
+            etag = repository.resume_page_etag(user_uid, limit=limit, cursor=cursor)
+            if conditional.etag_matches(request, etag):
+                return conditional.with_validators(HttpResponse(status=304), etag)
+
+        page = repository.list_user_resumes_page(user_uid, limit=limit, cursor=cursor)
+        response = JsonResponse({'resumes': page['resumes'], 'nextCursor': page['nextCursor']})
+        return conditional.with_validators(response, page['etag'])
+
+    except InvalidCursor:
+        return JsonResponse({'error': 'Invalid cursor.'}, status=400)
+    except Exception as e:
+        print(f"An error occurred while listing resumes: {e}")
+        return JsonResponse({'error': 'An internal server error occurred.'}, status=500)
+
+
+@csrf_exempt
+@firebase_auth_required
+def rank_resumes_view(request):
+    """Ranks the user's resumes by how well they fit a job description, without calling Gemini."""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Only POST method is allowed'}, status=405)
+
+    job_description = request.POST.get('job_description', '').strip()
+    if not job_description:
+        return JsonResponse({'error': 'A job_description is required.'}, status=400)
+    try:
+        k = min(max(int(request.POST.get('k', 5)), 1), 50)
+    except ValueError:
+        return JsonResponse({'error': 'k must be an integer.'}, status=400)
+
+    try:
+        ranked = scoring.rank_resumes(request.user_id, job_description, k)
+        return JsonResponse({'resumes': ranked})
+    except Exception as e:
+        print(f"An error occurred during job-fit scoring: {e}")
+        return JsonResponse({'error': str(e)}, status=500)
+
+@csrf_exempt
+@firebase_auth_required
+def export_resumes_view(request):
+    """
+    Streams a ZIP of all the user's resumes. `?format=pdf`, `?format=tex` or
+    both (the default); PDFs are compiled in parallel and cached.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Only GET method is allowed'}, status=405)
+
+    formats = [name.strip() for name in request.GET.get('format', 'pdf,tex').split(',') if name.strip()]
+    if not formats or any(name not in export.FORMATS for name in formats):
+        return JsonResponse({'error': "format must be 'pdf', 'tex' or 'pdf,tex'."}, status=400)
+
+    try:
+        resumes = repository.list_user_resumes(request.user_id, ['resumeName', 'latexContent'])
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+    if not resumes:
+        return JsonResponse({'error': 'You have no resumes to export.'}, status=404)
+
+    # Compiles go through the fair-share scheduler like downloads; more in flight than the user may run would only queue
+    user_uid = request.user_id
+    response = StreamingHttpResponse(
+        export.stream_resume_archive(
+            resumes, lambda latex: scheduler.run(user_uid, 'compile', compile_latex_to_pdf_bytes, latex), formats,
+            window=scheduler.user_concurrency,
+        ),
+        content_type='application/zip',
+    )
+    response['Content-Disposition'] = f'attachment; filename="resumes-{datetime.now().strftime("%Y-%m-%d")}.zip"'
+    return response
 
-        if not resume_doc.exists:
-            return JsonResponse({'error': 'Resume not found'}, status=404)
+@csrf_exempt
+@firebase_auth_required
+def get_resume_details_view(request, resume_id: str):
+    """Fetches the current data of a single resume document."""
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Only GET method is allowed'}, status=405)
 
-        resume_data = resume_doc.to_dict()
+    user_uid = request.user_id
 
+    try:
         # Security Check: Ensure the user owns this resume
-        if resume_data.get('userId') != user_uid:
-            return JsonResponse({'error': 'Permission denied'}, status=403)
-        
-        # Return all the data
-        return JsonResponse(resume_data)
+        resume_data, etag, not_modified = conditional.read_resume(
+            request, user_uid, resume_id, 'detail', DETAIL_READ_FIELDS
+        )
+        if not_modified:
+            return not_modified
+
+        # Return all the user-facing data
+        resume_data = {key: value for key, value in resume_data.items() if key != 'contentHash'}
+        return conditional.with_validators(JsonResponse(resume_data), etag)
 
+    except ResumeNotFound:
+        return JsonResponse({'error': 'Resume not found'}, status=404)
+    except ResumePermissionDenied:
+        return JsonResponse({'error': 'Permission denied'}, status=403)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
     
@@ -468,51 +716,61 @@ def refine_resume_view(request, resume_id: str):
         return JsonResponse({'error': 'Only POST method is allowed'}, status=405)
 
     user_uid = request.user_id
-    db = firestore.client()
 
     # Get the new instruction from the request
     new_instruction = request.POST.get('instruction')
     job_description = request.POST.get('job_description')
+    humanizer_tier = request.POST.get('humanizer') or None
 
     if not new_instruction:
         return JsonResponse({'error': 'An instruction is required.'}, status=400)
+    tier_error = humanizer_tier_error(humanizer_tier)
+    if tier_error:
+        return tier_error
 
     try:
-        # 1. Fetch the CURRENT resume document and user instructions
-        resume_ref = db.collection('resumes').document(resume_id)
-        base_resume_doc = resume_ref.get()
-        if not base_resume_doc.exists or base_resume_doc.to_dict().get('userId') != user_uid:
+        # 1. Fetch the CURRENT resume document and user instructions in one round trip
+        try:
+            current_resume, user_data = repository.get_owned_resume_and_user(
+                user_uid, resume_id, repository.RESUME_VERSIONING_FIELDS + ['jobDescription'], ['customInstructions'],
+                fresh=True,
+            )
+        except (ResumeNotFound, ResumePermissionDenied):
             return JsonResponse({'error': 'Resume not found or permission denied.'}, status=404)
-        
-        user_ref = db.collection('users').document(user_uid)
-        user_doc = user_ref.get()
 
-        current_latex = base_resume_doc.to_dict().get('latexContent', '')
-        base_instructions = user_doc.to_dict().get('customInstructions', '')
+        current_latex = current_resume.get('latexContent', '')
+        job_description = job_description or current_resume.get('jobDescription', '')
+        base_instructions = user_data.get('customInstructions', '')
         combined_instructions = f"{base_instructions}\n\nFurther refinement: {new_instruction}"
         
-        # 2. Run the full AI pipeline again with the new instruction
-        tailored_response = get_tailored_template_and_chunks(current_latex, job_description, combined_instructions)
-        if not tailored_response:
-            raise Exception("Failed to get response from Gemini during refinement.")
-        
-        humanized_map = humanize_content_chunks(tailored_response.content_chunks)
-        refined_latex = populate_template(tailored_response.latex_template, humanized_map)
-
-        # 3. UPDATE the existing document in Firestore
+        # 2. Run the full AI pipeline again with the new instruction (when it's this user's turn)
+        with scheduler.slot(user_uid, 'refine'):
+            tailored_response = get_tailored_template_and_chunks(
+                current_latex, job_description, combined_instructions, session=resume_id
+            )
+            if not tailored_response:
+                raise Exception("Failed to get response from Gemini during refinement.")
+
+            humanized_map = humanize_content_chunks(tailored_response.content_chunks, humanizer_tier)
+            refined_latex = populate_template(tailored_response.latex_template, humanized_map)
+
+        # 3. UPDATE the existing document and append the new version to its history
+        deadlines.checkpoint()
         print(f"Updating resume {resume_id} in Firestore...")
-        resume_ref.update({
-            'latexContent': refined_latex,
-            'lastUpdated': firestore.SERVER_TIMESTAMP,
+        version = repository.commit_resume_version(resume_id, user_uid, current_resume, refined_latex, {
+            'lastUpdated': SERVER_TIMESTAMP,
         })
 
         # 4. Return the newly generated LaTeX content
         return JsonResponse({
             'status': 'success',
             'message': 'Resume refined successfully!',
-            'newLatexContent': refined_latex
+            'newLatexContent': refined_latex,
+            'version': version,
         })
 
+    except QueueFull as e:
+        return busy_response(e)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
     
@@ -524,25 +782,21 @@ def delete_resume_view(request, resume_id: str):
         return JsonResponse({'error': 'Only DELETE method is allowed'}, status=405)
 
     user_uid = request.user_id
-    db = firestore.client()
 
     try:
-        resume_ref = db.collection('resumes').document(resume_id)
-        resume_doc = resume_ref.get()
-
-        if not resume_doc.exists:
-            return JsonResponse({'error': 'Resume not found'}, status=404)
-
         # CRITICAL SECURITY CHECK: Ensure the user owns this resume before deleting
-        if resume_doc.to_dict().get('userId') != user_uid:
-            return JsonResponse({'error': 'Permission denied'}, status=403)
+        resume_data = repository.get_owned_resume(user_uid, resume_id, ['versionCount'], fresh=True)
         
-        # If checks pass, delete the document
-        resume_ref.delete()
+        # If checks pass, delete the document and its version history
+        repository.delete_resume(resume_id, resume_data.get('versionCount', 0))
         print(f"User {user_uid} deleted resume {resume_id}")
         
         return JsonResponse({'status': 'success', 'message': 'Resume deleted successfully.'})
 
+    except ResumeNotFound:
+        return JsonResponse({'error': 'Resume not found'}, status=404)
+    except ResumePermissionDenied:
+        return JsonResponse({'error': 'Permission denied'}, status=403)
     except Exception as e:
         print(f"An error occurred during resume deletion: {e}")
         return JsonResponse({'error': 'An internal server error occurred.'}, status=500)
@@ -555,21 +809,15 @@ def download_resume_tex_view(request, resume_id: str):
         return JsonResponse({'error': 'Only GET method is allowed'}, status=405)
 
     user_uid = request.user_id
-    db = firestore.client()
 
     try:
-        resume_ref = db.collection('resumes').document(resume_id)
-        resume_doc = resume_ref.get()
-
-        if not resume_doc.exists:
-            return JsonResponse({'error': 'Resume not found'}, status=404)
-
-        resume_data = resume_doc.to_dict()
-
         # CRITICAL SECURITY CHECK: Ensure the user owns this resume
-        if resume_data.get('userId') != user_uid:
-            return JsonResponse({'error': 'Permission denied'}, status=403)
-        
+        resume_data, etag, not_modified = conditional.read_resume(
+            request, user_uid, resume_id, 'tex', CONTENT_READ_FIELDS
+        )
+        if not_modified:
+            return not_modified
+
         latex_content = resume_data.get('latexContent', '')
         resume_name = resume_data.get('resumeName', 'resume')
 
@@ -579,13 +827,54 @@ def download_resume_tex_view(request, resume_id: str):
         # This header tells the browser to download the file with a .tex extension
         response['Content-Disposition'] = f'attachment; filename="{resume_name}.tex"'
         
-        return response
+        return conditional.with_validators(response, etag)
 
+    except ResumeNotFound:
+        return JsonResponse({'error': 'Resume not found'}, status=404)
+    except ResumePermissionDenied:
+        return JsonResponse({'error': 'Permission denied'}, status=403)
     except Exception as e:
         print(f"An error occurred during TeX download: {e}")
         return JsonResponse({'error': 'An internal server error occurred.'}, status=500)
     
 
+@csrf_exempt
+@firebase_auth_required
+def preview_resume_view(request, resume_id: str):
+    """
+    Renders the resume to HTML in-process for the editor. `complete` is false
+    when it uses LaTeX the preview can't render (listed in `unsupported`);
+    the client should show the compiled PDF instead.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Only GET method is allowed'}, status=405)
+
+    user_uid = request.user_id
+
+    try:
+        resume_data, etag, not_modified = conditional.read_resume(
+            request, user_uid, resume_id, 'preview', CONTENT_READ_FIELDS
+        )
+        if not_modified:
+            return not_modified
+
+        with span('preview'):
+            rendered = preview.preview_cache.get_or_render(resume_data.get('latexContent', ''))
+        return conditional.with_validators(JsonResponse({
+            'html': rendered.html,
+            'complete': rendered.complete,
+            'unsupported': rendered.unsupported,
+        }), etag)
+
+    except ResumeNotFound:
+        return JsonResponse({'error': 'Resume not found'}, status=404)
+    except ResumePermissionDenied:
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    except Exception as e:
+        print(f"An error occurred during preview: {e}")
+        return JsonResponse({'error': 'An internal server error occurred.'}, status=500)
+
+
 @csrf_exempt
 @firebase_auth_required
 def rename_resume_view(request, resume_id: str):
@@ -593,7 +882,6 @@ def rename_resume_view(request, resume_id: str):
         return JsonResponse({'error': 'Only POST method is allowed'}, status=405)
 
     user_uid = request.user_id
-    db = firestore.client()
 
     new_name = request.POST.get('new_name', '').strip()
 
@@ -601,27 +889,104 @@ def rename_resume_view(request, resume_id: str):
         return JsonResponse({'error': 'A new name is required.'}, status=400)
 
     try:
-        resume_ref = db.collection('resumes').document(resume_id)
-        resume_doc = resume_ref.get()
-
-        if not resume_doc.exists:
-            return JsonResponse({'error': 'Resume not found'}, status=404)
-
         # SECURITY CHECK: Ensure the user owns this resume
-        if resume_doc.to_dict().get('userId') != user_uid:
-            return JsonResponse({'error': 'Permission denied'}, status=403)
+        repository.get_owned_resume(user_uid, resume_id, repository.OWNER_FIELDS)
         
         # If checks pass, update the document with the new name
-        resume_ref.update({
+        repository.update_resume(resume_id, {
             'resumeName': new_name,
-            'lastUpdated': firestore.SERVER_TIMESTAMP
+            'lastUpdated': SERVER_TIMESTAMP
         })
         
         print(f"User {user_uid} renamed resume {resume_id} to '{new_name}'")
         
         return JsonResponse({'status': 'success', 'message': 'Resume renamed successfully.'})
 
+    except ResumeNotFound:
+        return JsonResponse({'error': 'Resume not found'}, status=404)
+    except ResumePermissionDenied:
+        return JsonResponse({'error': 'Permission denied'}, status=403)
     except Exception as e:
         print(f"An error occurred during resume rename: {e}")
         return JsonResponse({'error': 'An internal server error occurred.'}, status=500)
-    
+
+
+@csrf_exempt
+@firebase_auth_required
+def list_resume_versions_view(request, resume_id: str):
+    """Lists the stored versions of a resume (metadata only)."""
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Only GET method is allowed'}, status=405)
+
+    user_uid = request.user_id
+
+    try:
+        resume_data = repository.get_owned_resume(user_uid, resume_id, ['versionCount'])
+        versions = repository.list_versions(resume_id, resume_data.get('versionCount', 0))
+        return JsonResponse({'versions': versions})
+
+    except ResumeNotFound:
+        return JsonResponse({'error': 'Resume not found'}, status=404)
+    except ResumePermissionDenied:
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    except Exception as e:
+        print(f"An error occurred while listing versions: {e}")
+        return JsonResponse({'error': 'An internal server error occurred.'}, status=500)
+
+
+@csrf_exempt
+@firebase_auth_required
+def get_resume_version_view(request, resume_id: str, version: int):
+    """Returns the LaTeX content of one stored version."""
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Only GET method is allowed'}, status=405)
+
+    user_uid = request.user_id
+
+    try:
+        repository.get_owned_resume(user_uid, resume_id, repository.OWNER_FIELDS)
+        latex_content = repository.get_version_text(resume_id, version)
+        return JsonResponse({'version': version, 'latexContent': latex_content})
+
+    except ResumeNotFound:
+        return JsonResponse({'error': 'Version not found'}, status=404)
+    except ResumePermissionDenied:
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    except Exception as e:
+        print(f"An error occurred while loading a version: {e}")
+        return JsonResponse({'error': 'An internal server error occurred.'}, status=500)
+
+
+@csrf_exempt
+@firebase_auth_required
+def restore_resume_version_view(request, resume_id: str, version: int):
+    """Undo: makes an earlier version current again by saving it as a new version."""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Only POST method is allowed'}, status=405)
+
+    user_uid = request.user_id
+
+    try:
+        current_resume = repository.get_owned_resume(user_uid, resume_id, repository.RESUME_VERSIONING_FIELDS,
+                                                     fresh=True)
+        restored_latex = repository.get_version_text(resume_id, version)
+
+        new_version = repository.commit_resume_version(resume_id, user_uid, current_resume, restored_latex, {
+            'lastUpdated': SERVER_TIMESTAMP,
+        })
+        print(f"User {user_uid} restored resume {resume_id} to version {version}")
+
+        return JsonResponse({
+            'status': 'success',
+            'message': f'Restored version {version}.',
+            'newLatexContent': restored_latex,
+            'version': new_version,
+        })
+
+    except ResumeNotFound:
+        return JsonResponse({'error': 'Version not found'}, status=404)
+    except ResumePermissionDenied:
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    except Exception as e:
+        print(f"An error occurred while restoring a version: {e}")
+        return JsonResponse({'error': 'An internal server error occurred.'}, status=500)
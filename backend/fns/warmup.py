@@ -0,0 +1,66 @@
+# fns/warmup.py
+"""
+Process warm-up and readiness.
+
+`warm_up()` imports fns.views (which builds the humanizer and the Gemini
+client) and runs each model once. Under gunicorn.conf.py it runs in the
+master before any worker is forked, so every worker shares the loaded
+models copy-on-write and starts out ready. Other servers warm up in a
+background thread the first time /api/ready/ is probed.
+"""
+
+import threading
+import time
+
+_state = {'ready': False, 'started': False, 'error': None, 'seconds': None}
+_lock = threading.Lock()
+
+
+def warm_up():
+    """Loads and exercises every model a request can touch. Safe to call more than once."""
+    with _lock:
+        if _state['ready']:
+            return
+        _state['started'] = True
+        _state['error'] = None
+        started = time.perf_counter()
+        try:
+            from . import views
+            from .templating import compile_template
+
+            warm_humanizer = getattr(views.humanizer, 'warm_up', None)
+            if warm_humanizer:
+                warm_humanizer()
+            compile_template("\\section*{Summary}\n{summary_section}\n").render({'summary_section': 'Ready.'})
+        except Exception as e:
+            _state['error'] = f"{type(e).__name__}: {e}"
+            _state['started'] = False  # the next readiness probe retries
+            print(f"❌ ERROR during warm-up: {_state['error']}")
+            raise
+        _state['seconds'] = time.perf_counter() - started
+        _state['ready'] = True
+        print(f"✅ Warm-up complete in {_state['seconds']:.1f}s.")
+
+
+def warm_up_in_background():
+    """Starts warm_up() on a daemon thread unless it is already running or done."""
+    with _lock:
+        if _state['started']:
+            return
+        _state['started'] = True
+
+    def run():
+        try:
+            warm_up()
+        except Exception:
+            pass  # reported by status() to the readiness probe
+
+    threading.Thread(target=run, name='warm-up', daemon=True).start()
+
+
+def is_ready():
+    return _state['ready']
+
+
+def status():
+    return dict(_state)
@@ -0,0 +1,66 @@
+# gunicorn.conf.py
+"""
+Preload-and-fork production server:
+
+    cd backend && gunicorn -c gunicorn.conf.py
+
+The master imports Django and fns.views and warms every model once
+(fns.warmup), then forks the workers, which share those pages copy-on-write
+instead of each loading spaCy and the SentenceTransformer again. The GC is
+kept off in the master and everything loaded is frozen before forking, so
+collections in the workers don't write to (and unshare) the shared pages.
+
+For ASGI set GUNICORN_APP=backend.asgi:application and
+GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker.
+"""
+
+import gc
+import multiprocessing
+import os
+import random
+
+# A torch/OpenMP thread pool started in the master does not survive fork, so
+# the warm-up runs single-threaded; each worker is one process anyway.
+os.environ.setdefault('OMP_NUM_THREADS', '1')
+os.environ.setdefault('TOKENIZERS_PARALLELISM', 'false')
+
+# Objects allocated while preloading stay out of the young generations
+gc.disable()
+
+wsgi_app = os.environ.get('GUNICORN_APP', 'backend.wsgi:application')
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+# Tailoring waits on Gemini, the humanizer and pdflatex
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 180))
+preload_app = True
+
+
+def when_ready(server):
+    """Runs in the master after the app is loaded and before the first worker is forked."""
+    from django.db import connections
+    from fns import warmup
+
+    try:
+        warmup.warm_up()
+    except Exception as e:
+        # Workers still start; /api/ready/ reports the error and retries
+        server.log.error("Warm-up failed: %s", e)
+
+    # Sockets must not be shared between forked workers
+    connections.close_all()
+    gc.collect()
+    gc.freeze()
+    server.log.info("Preloaded app frozen (%d objects); forking %d workers.", gc.get_freeze_count(), server.num_workers)
+
+
+def post_fork(server, worker):
+    from django.conf import settings
+    from transformer.embeddings import set_inference_threads, worker_threads
+
+    # The humanizer draws from `random`; don't let every worker replay the master's sequence
+    random.seed()
+    # The master ran single-threaded; each worker gets its share of the CPUs
+    set_inference_threads(settings.HUMANIZER_TORCH_THREADS or worker_threads(server.num_workers))
+    gc.enable()
@@ -6,7 +6,8 @@ import nltk
 import spacy
 from nltk.tokenize import word_tokenize
 from nltk.corpus import wordnet
-from sentence_transformers import SentenceTransformer, util
+
+from .embeddings import DEFAULT_MODEL, choose_synonym, default_threads, load_sentence_model, set_inference_threads
 
 warnings.filterwarnings("ignore", category=FutureWarning)
 
@@ -44,17 +45,21 @@ class AcademicTextHumanizer:
 
     def __init__(
         self,
-        model_name='paraphrase-MiniLM-L6-v2',
+        model_name=DEFAULT_MODEL,
         p_passive=0.2,
         p_synonym_replacement=0.3,
         p_academic_transition=0.3,
-        seed=None
+        seed=None,
+        embedding_backend='fp32',
+        num_threads=None
     ):
         if seed is not None:
             random.seed(seed)
 
         self.nlp = spacy.load("en_core_web_sm")
-        self.model = SentenceTransformer(model_name)
+        # 'int8' uses a dynamically quantized copy of the model (see transformer/embeddings.py)
+        set_inference_threads(num_threads or default_threads())
+        self.model = load_sentence_model(model_name, embedding_backend)
 
         # Transformation probabilities
         self.p_passive = p_passive
@@ -67,6 +72,19 @@ class AcademicTextHumanizer:
             "Therefore,", "Consequently,", "Nonetheless,", "Nevertheless,"
         ]
 
+    def warm_up(self):
+        """
+        Runs every lazily loaded resource once (spaCy pipeline, NLTK tokenizer,
+        tagger and WordNet, the sentence-embedding model) so the first real
+        request doesn't pay for loading them.
+        """
+        sentence = "The team didn't ship the new feature on time."
+        self.expand_contractions(sentence)
+        self.convert_to_passive(sentence)
+        nltk.pos_tag(word_tokenize(sentence))
+        synonyms = self._get_synonyms('build', 'VB')
+        self._select_closest_synonym('build', synonyms or ['construct'])
+
     def humanize_text(self, text, use_passive=False, use_synonyms=False):
         doc = self.nlp(text)
         transformed_sentences = []
@@ -178,13 +196,4 @@ class AcademicTextHumanizer:
         return list(synonyms)
 
     def _select_closest_synonym(self, original_word, synonyms):
-        if not synonyms:
-            return None
-        original_emb = self.model.encode(original_word, convert_to_tensor=True)
-        synonym_embs = self.model.encode(synonyms, convert_to_tensor=True)
-        cos_scores = util.cos_sim(original_emb, synonym_embs)[0]
-        max_score_index = cos_scores.argmax().item()
-        max_score = cos_scores[max_score_index].item()
-        if max_score >= 0.5:
-            return synonyms[max_score_index]
-        return None
\ No newline at end of file
+        return choose_synonym(self.model, original_word, synonyms)
\ No newline at end of file
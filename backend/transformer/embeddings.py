@@ -0,0 +1,187 @@
+# transformer/embeddings.py
+"""
+Sentence-embedding backends for the humanizer's synonym scoring.
+
+  'fp32' - the SentenceTransformer as published
+  'int8' - the same model with every nn.Linear dynamically quantized to int8
+           weights (activations stay float): faster CPU forward passes and
+           a quarter of the Linear weight memory (see `manage.py bench_embeddings`)
+
+Inference threads are bounded to the process's CPU share (cgroup quota or
+CPU affinity, divided among the server's workers) instead of torch's
+default of every core on the machine.
+"""
+
+import math
+import os
+import time
+
+import torch
+from sentence_transformers import SentenceTransformer, util
+
+BACKENDS = ('fp32', 'int8')
+DEFAULT_MODEL = 'paraphrase-MiniLM-L6-v2'
+# Below this cosine similarity the original word is kept
+MIN_SYNONYM_SCORE = 0.5
+
+
+def load_sentence_model(model_name=DEFAULT_MODEL, backend='fp32'):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r}; expected one of {BACKENDS}")
+    model = SentenceTransformer(model_name, device='cpu')
+    model.eval()
+    if backend == 'int8':
+        engines = torch.backends.quantized.supported_engines
+        if 'fbgemm' in engines:
+            torch.backends.quantized.engine = 'fbgemm'
+        elif 'qnnpack' in engines:
+            torch.backends.quantized.engine = 'qnnpack'
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+
+def cpu_share():
+    """CPUs this process may use: the cgroup CPU quota if there is one, else its affinity mask."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    quota = None
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            limit, period = f.read().split()
+            if limit != 'max':
+                quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            # cgroup v1
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+                limit = int(f.read())
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+                period = int(f.read())
+            if limit > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+
+    if quota:
+        cpus = min(cpus, max(1, math.floor(quota)))
+    return cpus
+
+
+def worker_threads(workers=1):
+    """Intra-op threads for one of `workers` processes sharing this machine's CPU share."""
+    return max(1, cpu_share() // max(1, workers))
+
+
+def default_threads():
+    """OMP_NUM_THREADS when it is set (gunicorn.conf.py pins the master to 1), else this process's share."""
+    configured = os.environ.get('OMP_NUM_THREADS')
+    if configured and configured.isdigit() and int(configured) > 0:
+        return int(configured)
+    return worker_threads(int(os.environ.get('WEB_CONCURRENCY', 1)))
+
+
+def set_inference_threads(threads):
+    torch.set_num_threads(max(1, int(threads)))
+
+
+def choose_synonym(model, word, synonyms, min_score=MIN_SYNONYM_SCORE):
+    """The synonym whose embedding is closest to `word`'s, or None if none is similar enough."""
+    if not synonyms:
+        return None
+    with torch.inference_mode():
+        original_emb = model.encode(word, convert_to_tensor=True)
+        synonym_embs = model.encode(synonyms, convert_to_tensor=True)
+    cos_scores = util.cos_sim(original_emb, synonym_embs)[0]
+    max_score_index = cos_scores.argmax().item()
+    if cos_scores[max_score_index].item() >= min_score:
+        return synonyms[max_score_index]
+    return None
+
+
+# --- Accuracy parity ---
+
+# (word, candidate synonyms) pairs typical of resume text
+PARITY_PROBES = [
+    ('built', ['constructed', 'made', 'assembled', 'established']),
+    ('led', ['headed', 'guided', 'directed', 'conducted']),
+    ('improved', ['enhanced', 'bettered', 'amended', 'ameliorated']),
+    ('reduced', ['cut', 'decreased', 'lowered', 'shrank']),
+    ('designed', ['planned', 'engineered', 'devised', 'intended']),
+    ('managed', ['handled', 'oversaw', 'ran', 'supervised']),
+    ('developed', ['created', 'evolved', 'formulated', 'produced']),
+    ('increased', ['raised', 'boosted', 'grew', 'augmented']),
+    ('launched', ['started', 'initiated', 'introduced', 'released']),
+    ('analyzed', ['examined', 'studied', 'analysed', 'evaluated']),
+    ('implemented', ['executed', 'carried out', 'applied', 'enforced']),
+    ('delivered', ['provided', 'supplied', 'handed over', 'rescued']),
+    ('optimized', ['optimised', 'streamlined', 'tuned', 'perfected']),
+    ('collaborated', ['cooperated', 'worked together', 'partnered', 'joined forces']),
+    ('maintained', ['kept', 'preserved', 'sustained', 'asserted']),
+    ('created', ['made', 'produced', 'generated', 'originated']),
+    ('supported', ['backed', 'assisted', 'helped', 'supported by']),
+    ('achieved', ['accomplished', 'attained', 'reached', 'realized']),
+    ('experience', ['expertise', 'background', 'knowledge', 'see']),
+    ('team', ['group', 'squad', 'crew', 'unit']),
+    ('project', ['undertaking', 'initiative', 'task', 'plan']),
+    ('customer', ['client', 'consumer', 'buyer', 'patron']),
+    ('skills', ['abilities', 'competencies', 'accomplishments', 'science']),
+    ('fast', ['quick', 'rapid', 'speedy', 'firm']),
+    ('strong', ['solid', 'robust', 'powerful', 'potent']),
+    ('large', ['big', 'extensive', 'heavy', 'orotund']),
+    ('efficient', ['effective', 'productive', 'economical', 'streamlined']),
+    ('reliable', ['dependable', 'trustworthy', 'sure', 'authentic']),
+    ('growth', ['expansion', 'increase', 'development', 'outgrowth']),
+    ('goal', ['objective', 'aim', 'target', 'end']),
+    ('responsible', ['accountable', 'in charge', 'creditworthy', 'liable']),
+    ('problem', ['issue', 'challenge', 'trouble', 'job']),
+]
+
+
+def synonym_agreement(reference_model, candidate_model, probes=PARITY_PROBES):
+    """Fraction of probes for which both models pick the same synonym (or both keep the word)."""
+    matches = sum(
+        choose_synonym(reference_model, word, synonyms) == choose_synonym(candidate_model, word, synonyms)
+        for word, synonyms in probes
+    )
+    return matches / len(probes)
+
+
+# --- Benchmarking (run in a fresh process per backend so memory is comparable) ---
+
+def _rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def benchmark_backend(backend, texts, model_name=DEFAULT_MODEL, threads=None, repeat=5, batch_size=32):
+    """Loads one backend and returns its load time, RSS growth and encode throughput."""
+    set_inference_threads(threads or default_threads())
+    rss_before = _rss_mb()
+    started = time.perf_counter()
+    model = load_sentence_model(model_name, backend)
+    load_seconds = time.perf_counter() - started
+    rss_loaded = _rss_mb()
+
+    with torch.inference_mode():
+        model.encode(texts[:batch_size], batch_size=batch_size)  # warm-up
+        started = time.perf_counter()
+        for _ in range(repeat):
+            model.encode(texts, batch_size=batch_size)
+        encode_seconds = time.perf_counter() - started
+
+    return {
+        'backend': backend,
+        'threads': torch.get_num_threads(),
+        'load_seconds': load_seconds,
+        'model_rss_mb': rss_loaded - rss_before,
+        'peak_rss_mb': _rss_mb(),
+        'texts_per_second': len(texts) * repeat / encode_seconds,
+    }
@@ -0,0 +1,196 @@
+# transformer/lite.py
+"""
+Model-free "lite" humanizer.
+
+Does the purely lexical part of AcademicTextHumanizer (transformer/app.py)
+straight on the raw text, with precompiled regexes and lookup tables and
+no spaCy, NLTK or sentence-embedding model:
+
+  - contraction expansion, from a table of irregular forms plus suffix rules
+    (the full tier tokenizes every sentence and loops over a dict per token);
+  - academic transitions, prepended to regex-split sentences;
+  - synonym substitution from a fixed table, matched by one alternation
+    regex, instead of WordNet candidates ranked by embeddings.
+
+Passive-voice conversion needs a dependency parse and is not done. Text
+keeps its original spacing, so LaTeX escapes are never split apart, and
+LaTeX commands are never rewritten. `manage.py bench_humanizer` compares
+latency and memory with the full tier on the same inputs.
+"""
+
+import os
+import random
+import re
+import time
+
+TIERS = ('full', 'lite')
+
+ACADEMIC_TRANSITIONS = [
+    "Moreover,", "Additionally,", "Furthermore,", "Hence,",
+    "Therefore,", "Consequently,", "Nonetheless,", "Nevertheless,"
+]
+
+# Whole-word forms the suffix rules would get wrong
+IRREGULAR_CONTRACTIONS = {
+    "can't": "cannot", "won't": "will not", "shan't": "shall not", "ain't": "is not",
+    "let's": "let us", "y'all": "you all",
+}
+CONTRACTION_SUFFIXES = {"n't": " not", "'re": " are", "'ll": " will", "'ve": " have", "'m": " am", "'d": " would"}
+# "'s" is only expanded after these; elsewhere it is a possessive
+S_IS_STEMS = frozenset([
+    'it', 'that', 'there', 'here', 'what', 'who', 'where', 'when', 'how', 'he', 'she', 'this',
+])
+
+# Plain word -> more formal word, per inflection so no morphology is needed
+SYNONYMS = {
+    'use': 'utilize', 'uses': 'utilizes', 'used': 'utilized', 'using': 'utilizing',
+    'help': 'assist', 'helps': 'assists', 'helped': 'assisted', 'helping': 'assisting',
+    'show': 'demonstrate', 'shows': 'demonstrates', 'showed': 'demonstrated', 'showing': 'demonstrating',
+    'build': 'develop', 'builds': 'develops', 'built': 'developed', 'building': 'developing',
+    'make': 'create', 'makes': 'creates', 'made': 'created', 'making': 'creating',
+    'get': 'obtain', 'gets': 'obtains', 'got': 'obtained', 'getting': 'obtaining',
+    'fix': 'resolve', 'fixes': 'resolves', 'fixed': 'resolved', 'fixing': 'resolving',
+    'start': 'initiate', 'starts': 'initiates', 'started': 'initiated', 'starting': 'initiating',
+    'need': 'require', 'needs': 'requires', 'needed': 'required', 'needing': 'requiring',
+    'try': 'attempt', 'tries': 'attempts', 'tried': 'attempted', 'trying': 'attempting',
+    'keep': 'maintain', 'keeps': 'maintains', 'kept': 'maintained', 'keeping': 'maintaining',
+    'check': 'verify', 'checks': 'verifies', 'checked': 'verified', 'checking': 'verifying',
+    'improve': 'enhance', 'improves': 'enhances', 'improved': 'enhanced', 'improving': 'enhancing',
+    'change': 'modify', 'changed': 'modified', 'changing': 'modifying',
+    # 'set up' is also the past tense; the base form reads right in more sentences ('helped set up')
+    'set up': 'establish', 'sets up': 'establishes', 'setting up': 'establishing',
+    'speed up': 'accelerate', 'speeds up': 'accelerates', 'sped up': 'accelerated', 'speeding up': 'accelerating',
+    'big': 'substantial', 'large': 'substantial', 'many': 'numerous', 'fast': 'rapid', 'quick': 'rapid',
+    'quickly': 'rapidly', 'main': 'primary', 'important': 'significant', 'enough': 'sufficient',
+    'also': 'additionally', 'easy': 'straightforward',
+}
+
+_CONTRACTION = re.compile(r"(?<![\\\w])([A-Za-z]+)['’]([A-Za-z]+)\b")
+_SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+(?=[A-Z"(])')
+# Longest first, so phrases win over their first word; never inside a LaTeX command name
+_SYNONYM = re.compile(
+    r'(?<![\\\w])(' + '|'.join(re.escape(word) for word in sorted(SYNONYMS, key=len, reverse=True)) + r')\b',
+    re.IGNORECASE,
+)
+_BROKEN_ESCAPE = re.compile(r'\\ ([#$%&_{}])')
+
+
+def fix_escapes(text):
+    """Rejoins LaTeX escapes a tokenizer split apart (`\\ #` -> `\\#`)."""
+    return _BROKEN_ESCAPE.sub(r'\\\1', text)
+
+
+def _match_case(original, replacement):
+    if len(original) > 1 and original.isupper():
+        return replacement.upper()
+    if original[0].isupper():
+        return replacement[0].upper() + replacement[1:]
+    return replacement
+
+
+def _expand(match):
+    token = match.group(0)
+    normalized = token.lower().replace('’', "'")
+    expansion = IRREGULAR_CONTRACTIONS.get(normalized)
+    if expansion is None:
+        stem, suffix = match.group(1).lower(), "'" + match.group(2).lower()
+        if suffix == "'t" and stem.endswith('n'):
+            expansion = stem[:-1] + CONTRACTION_SUFFIXES["n't"]
+        elif suffix in CONTRACTION_SUFFIXES:
+            expansion = stem + CONTRACTION_SUFFIXES[suffix]
+        elif suffix == "'s" and stem in S_IS_STEMS:
+            expansion = stem + ' is'
+        else:
+            return token
+    return _match_case(token, expansion)
+
+
+class LiteTextHumanizer:
+    """Drop-in for AcademicTextHumanizer's humanize_text() without any model (see the module docstring)."""
+
+    def __init__(self, p_synonym_replacement=0.3, p_academic_transition=0.3, seed=None):
+        self.p_synonym_replacement = p_synonym_replacement
+        self.p_academic_transition = p_academic_transition
+        self.academic_transitions = ACADEMIC_TRANSITIONS
+        self._random = random.Random(seed)
+
+    def warm_up(self):
+        """Nothing to load; runs the rules once so a broken table fails at start-up rather than on a request."""
+        self.humanize_text("The team didn't ship it. It's built to scale.", use_synonyms=True)
+
+    def humanize_text(self, text, use_passive=False, use_synonyms=False):
+        # use_passive is accepted for interface parity; it needs a parser
+        sentences = []
+        for sentence in _SENTENCE_BREAK.split(text.strip()):
+            sentence = self.expand_contractions(sentence)
+            if self._random.random() < self.p_academic_transition:
+                sentence = self.add_academic_transitions(sentence)
+            if use_synonyms and self._random.random() < self.p_synonym_replacement:
+                sentence = self.replace_with_synonyms(sentence)
+            sentences.append(sentence)
+        return ' '.join(sentences)
+
+    def expand_contractions(self, sentence):
+        return _CONTRACTION.sub(_expand, sentence)
+
+    def add_academic_transitions(self, sentence):
+        return f"{self._random.choice(self.academic_transitions)} {sentence}"
+
+    def replace_with_synonyms(self, sentence):
+        def substitute(match):
+            word = match.group(0)
+            # Like the full tier, each candidate word is replaced half the time
+            if self._random.random() < 0.5:
+                return _match_case(word, SYNONYMS[word.lower()])
+            return word
+        return _SYNONYM.sub(substitute, sentence)
+
+
+# --- Benchmarking (manage.py bench_humanizer) ---
+
+def _rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError):
+        return _peak_rss_mb()
+
+
+def _peak_rss_mb():
+    import resource
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def benchmark_tier(tier, texts, repeat=3, seed=0):
+    """Builds one tier in this process and returns its load time, RSS growth and per-text latency."""
+    if tier not in TIERS:
+        raise ValueError(f"Unknown humanizer tier {tier!r}; expected one of {TIERS}")
+    rss_before = _rss_mb()
+    started = time.perf_counter()
+    if tier == 'lite':
+        humanizer = LiteTextHumanizer(seed=seed)
+    else:
+        from .app import AcademicTextHumanizer
+        humanizer = AcademicTextHumanizer(seed=seed)
+    humanizer.warm_up()
+    load_seconds = time.perf_counter() - started
+    rss_loaded = _rss_mb()
+
+    latencies = []
+    for _ in range(repeat):
+        for text in texts:
+            started = time.perf_counter()
+            humanizer.humanize_text(text, use_passive=True, use_synonyms=True)
+            latencies.append(time.perf_counter() - started)
+    latencies.sort()
+
+    return {
+        'tier': tier,
+        'load_seconds': load_seconds,
+        'model_rss_mb': rss_loaded - rss_before,
+        'peak_rss_mb': _peak_rss_mb(),
+        'mean_ms': sum(latencies) / len(latencies) * 1000,
+        'p95_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000,
+        'texts_per_second': len(latencies) / sum(latencies),
+    }
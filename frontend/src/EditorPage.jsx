@@ -12,6 +12,7 @@ const EditorPage = () => {
     const { resumeId } = useParams();
     const [resumeData, setResumeData] = useState(null);
     const [pdfUrl, setPdfUrl] = useState('');
+    const [previewHtml, setPreviewHtml] = useState('');
     const [chatInput, setChatInput] = useState('');
     const [isLoading, setIsLoading] = useState(true);
     const [isRefining, setIsRefining] = useState(false);
@@ -32,12 +33,50 @@ const EditorPage = () => {
             }
             const url = window.URL.createObjectURL(blob);
             setPdfUrl(url);
+            return url;
         } catch (err) {
             console.error(err);
             setError("Could not generate PDF preview. Check for LaTeX compilation errors.");
+            return '';
         }
     };
 
+    // Fast HTML preview rendered by the backend; falls back to compiling the PDF
+    // when the resume uses LaTeX the preview can't render.
+    const refreshPreview = async () => {
+        if (!auth.currentUser) return;
+        try {
+            const token = await auth.currentUser.getIdToken();
+            const response = await fetch(`${config.API_BASE_URL}/api/resumes/${resumeId}/preview/`, {
+                headers: { 'Authorization': 'Bearer ' + token }
+            });
+            if (!response.ok) throw new Error('Failed to fetch preview.');
+            const data = await response.json();
+            if (data.complete) {
+                setPreviewHtml(data.html);
+                if (pdfUrl) {
+                    window.URL.revokeObjectURL(pdfUrl);
+                    setPdfUrl('');
+                }
+                return;
+            }
+            console.info('Preview incomplete, compiling PDF instead:', data.unsupported);
+        } catch (err) {
+            console.error(err);
+        }
+        setPreviewHtml('');
+        await refreshPdf();
+    };
+
+    const handleDownloadPdf = async () => {
+        const url = pdfUrl || await refreshPdf();
+        if (!url) return;
+        const link = document.createElement('a');
+        link.href = url;
+        link.download = `${resumeData?.resumeName || 'resume'}.pdf`;
+        link.click();
+    };
+
     useEffect(() => {
         const loadInitialData = async () => {
             if (!auth.currentUser) return;
@@ -50,7 +89,7 @@ const EditorPage = () => {
                 if (!response.ok) throw new Error('Failed to fetch resume data.');
                 const data = await response.json();
                 setResumeData(data);
-                await refreshPdf();
+                await refreshPreview();
             } catch (err) {
                 console.error(err);
                 setError(err.message);
@@ -77,7 +116,7 @@ const EditorPage = () => {
             const data = await response.json();
             if (!response.ok) throw new Error(data.error || 'Failed to refine resume.');
             setChatInput('');
-            await refreshPdf();
+            await refreshPreview();
         } catch (err) {
             console.error(err);
             setError(err.message);
@@ -86,7 +125,7 @@ const EditorPage = () => {
         }
     };
 
-    if (isLoading) return <h1 className="editor-header">Generating Initial PDF Preview...</h1>;
+    if (isLoading) return <h1 className="editor-header">Generating Initial Preview...</h1>;
 
     return (
         <div className="editor-container">
@@ -98,7 +137,10 @@ const EditorPage = () => {
             <div className="editor-layout">
                 {/* PDF Viewer Column */}
                 <div className="pdf-viewer-panel">
-                    {pdfUrl ? (
+                    {previewHtml ? (
+                        <iframe srcDoc={previewHtml} sandbox="allow-popups allow-popups-to-escape-sandbox"
+                                width="100%" height="100%" title="Resume Preview"></iframe>
+                    ) : pdfUrl ? (
                         <iframe src={pdfUrl} width="100%" height="100%" title="Resume Preview"></iframe>
                     ) : (
                         <div className="pdf-viewer-placeholder">
@@ -126,9 +168,7 @@ const EditorPage = () => {
 
                     <h3>Finalize-inator</h3>
                     <button className="btn btn-secondary">Save and Finalize</button>
-                    <a href={pdfUrl} download={`${resumeData?.resumeName || 'resume'}.pdf`}>
-                        <button className="btn btn-secondary" disabled={!pdfUrl}>Download Current PDF</button>
-                    </a>
+                    <button className="btn btn-secondary" onClick={handleDownloadPdf}>Download Current PDF</button>
                 </div>
             </div>
         </div>
@@ -1,6 +1,6 @@
 // src/ProfilePage.jsx
 
-import { collection, doc, getDoc, getDocs, orderBy, query, setDoc, where } from 'firebase/firestore';
+import { doc, getDoc, setDoc } from 'firebase/firestore';
 import { useEffect, useState } from 'react';
 import { Link } from 'react-router-dom';
 import { auth, db } from './firebaseConfig';
@@ -21,12 +21,41 @@ const ProfilePage = () => {
     const [profileData, setProfileData] = useState({ displayName: '', customInstructions: '' });
     const [formData, setFormData] = useState({ displayName: '', customInstructions: '' });
     const [resumes, setResumes] = useState([]);
+    const [nextCursor, setNextCursor] = useState(null);
+    const [loadingMore, setLoadingMore] = useState(false);
 
     const handleEditResumeName = (resume) => {
         setEditingResumeId(resume.id);
         setNewResumeName(resume.resumeName);
     };
 
+    // Fetches one page of resume metadata from the backend (no LaTeX content)
+    const fetchResumePage = async (cursor) => {
+        const token = await auth.currentUser.getIdToken();
+        const params = new URLSearchParams({ limit: '20' });
+        if (cursor) params.append('cursor', cursor);
+        const response = await fetch(`${config.API_BASE_URL}/api/resumes/?${params}`, {
+            headers: { 'Authorization': 'Bearer ' + token },
+        });
+        const data = await response.json();
+        if (!response.ok) throw new Error(data.error || 'Could not fetch resumes.');
+        return data;
+    };
+
+    const handleLoadMore = async () => {
+        if (!nextCursor) return;
+        setLoadingMore(true);
+        try {
+            const page = await fetchResumePage(nextCursor);
+            setResumes(current => [...current, ...page.resumes]);
+            setNextCursor(page.nextCursor);
+        } catch (err) {
+            setError("Could not fetch resumes.");
+            console.error("Fetch resumes error:", err);
+        }
+        setLoadingMore(false);
+    };
+
     // --- Data Fetching Effect ---
     useEffect(() => {
         if (!auth.currentUser) {
@@ -56,10 +85,9 @@ const ProfilePage = () => {
         };
         const fetchResumes = async () => {
             try {
-                const q = query(collection(db, 'resumes'), where("userId", "==", auth.currentUser.uid), orderBy("createdAt", "desc"));
-                const querySnapshot = await getDocs(q);
-                const userResumes = querySnapshot.docs.map(doc => ({ id: doc.id, ...doc.data() }));
-                setResumes(userResumes);
+                const page = await fetchResumePage(null);
+                setResumes(page.resumes);
+                setNextCursor(page.nextCursor);
             } catch (err) {
                 setError("Could not fetch resumes.");
                 console.error("Fetch resumes error:", err);
@@ -222,7 +250,7 @@ const ProfilePage = () => {
                             <li key={resume.id} className="resume-item">
                                 <div className="resume-info">
                                     <strong>{resume.resumeName}</strong>
-                                    <small>Last Updated: {resume.lastUpdated ? resume.lastUpdated.toDate().toLocaleDateString() : 'N/A'}</small>
+                                    <small>Last Updated: {resume.lastUpdated ? new Date(resume.lastUpdated).toLocaleDateString() : 'N/A'}</small>
                                 </div>
                                 <div className="resume-actions">
                                     <button className="btn btn-secondary" onClick={() => handleDownloadTex(resume.id, resume.resumeName)}>Download .tex</button>
@@ -237,6 +265,11 @@ const ProfilePage = () => {
                 ) : (
                     <p>You haven't uploaded any resumes yet. Go to the "Upload Resume" page to get started!</p>
                 )}
+                {nextCursor && (
+                    <button className="btn btn-secondary" onClick={handleLoadMore} disabled={loadingMore}>
+                        {loadingMore ? 'Loading...' : 'Load More'}
+                    </button>
+                )}
             </div>
         </div>
     );
@@ -1,9 +1,8 @@
 // src/TailorPage.jsx
 
-import { collection, getDocs, orderBy, query, where } from 'firebase/firestore';
 import { useEffect, useState } from 'react';
 import { Link, useNavigate } from 'react-router-dom';
-import { auth, db } from './firebaseConfig';
+import { auth } from './firebaseConfig';
 import './TailorPage.css';
 
 import config from "./config";
@@ -23,13 +22,21 @@ const TailorPage = () => {
         if (!auth.currentUser) return;
         const fetchResumes = async () => {
             try {
-                const q = query(
-                    collection(db, 'resumes'),
-                    where("userId", "==", auth.currentUser.uid),
-                    orderBy("createdAt", "desc")
-                );
-                const querySnapshot = await getDocs(q);
-                const userResumes = querySnapshot.docs.map(doc => ({ id: doc.id, ...doc.data() }));
+                // Resume metadata only, following the list endpoint's cursor until the last page
+                const token = await auth.currentUser.getIdToken();
+                const userResumes = [];
+                let cursor = null;
+                do {
+                    const params = new URLSearchParams({ limit: '100' });
+                    if (cursor) params.append('cursor', cursor);
+                    const response = await fetch(`${config.API_BASE_URL}/api/resumes/?${params}`, {
+                        headers: { 'Authorization': 'Bearer ' + token },
+                    });
+                    const data = await response.json();
+                    if (!response.ok) throw new Error(data.error || 'Could not fetch your resumes.');
+                    userResumes.push(...data.resumes);
+                    cursor = data.nextCursor;
+                } while (cursor);
                 setResumes(userResumes);
                 if (userResumes.length > 0) {
                     setSelectedResumeId(userResumes[0].id);
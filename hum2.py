@@ -1,14 +1,51 @@
-import nltk
-from textblob import TextBlob
+"""
+TextBlob/WordNet humanizer, usable as a batch tool for large corpora.
+
+Replaces adjectives and adverbs with their most common WordNet synonym.
+Input is newline-delimited text or JSONL, from files or stdin; records are
+humanized across a process pool and written out in input order as they
+finish.
+
+    python hum2.py bullets.txt -o humanized.txt
+    python hum2.py corpus.jsonl --field text --output-field humanized -j 8
+    cat bullets.txt | python hum2.py > humanized.txt
+    python hum2.py bullets.txt --benchmark
+    python hum2.py --demo
+"""
+
+import argparse
+import functools
+import itertools
+import json
+import multiprocessing
+import os
 import re
+import sys
+import time
+
+import nltk
 from nltk.corpus import wordnet
+from textblob import TextBlob
+
+NLTK_RESOURCES = {
+    'punkt': 'tokenizers/punkt',
+    'punkt_tab': 'tokenizers/punkt_tab',
+    'averaged_perceptron_tagger': 'taggers/averaged_perceptron_tagger',
+    'averaged_perceptron_tagger_eng': 'taggers/averaged_perceptron_tagger_eng',
+    'wordnet': 'corpora/wordnet',
+}
 
 
-nltk.download('punkt')
-nltk.download('averaged_perceptron_tagger')
-nltk.download('wordnet')
+def ensure_nltk_data():
+    """Downloads only the NLTK resources that aren't installed yet."""
+    for resource, path in NLTK_RESOURCES.items():
+        try:
+            nltk.data.find(path)
+        except LookupError:
+            nltk.download(resource, quiet=True)
+
 
-def replace_word(word, pos):
+def _replace_word_uncached(word, pos):
     synonyms = []
     for syn in wordnet.synsets(word, pos=pos):
         for lemma in syn.lemmas():
@@ -22,6 +59,11 @@ def replace_word(word, pos):
     else:
         return word
 
+
+# The result only depends on (word, pos), so each pair is looked up in WordNet once per process
+replace_word = functools.lru_cache(maxsize=200_000)(_replace_word_uncached)
+
+
 def clean_symbols(humanized_text):
     # Remove extra spaces and unusual symbol placement
     humanized_text = re.sub(r'\s+', ' ', humanized_text)
@@ -29,9 +71,10 @@ def clean_symbols(humanized_text):
     humanized_text = re.sub(r'([^\w\s])\s', r'\1', humanized_text)
     return humanized_text
 
-def humanize_text(text):
+
+def humanize_text(text, replace=None):
+    replace = replace or replace_word
     # Split text into sentences while preserving symbols
-    # sentences = re.findall(r'[^.!?]+[.!?]+|[^\w\s]|\n', text)
     newline_placeholder = "庄周"
     text = text.replace('\n', newline_placeholder)
 
@@ -47,18 +90,18 @@ def humanize_text(text):
         try:
             tags = TextBlob(sentence).tags
         except Exception as e:
-            print(f"Error processing sentence: {e}")
+            # Keep the sentence as it was rather than losing it from the output
+            print(f"Error processing sentence, leaving it unchanged: {e}", file=sys.stderr)
+            humanized_sentences.append(sentence)
             continue
 
         # Replace adjectives and adverbs with more human-like alternatives
         humanized_words = []
         for word, tag in tags:
             if tag.startswith('JJ'):
-                humanized_word = replace_word(word, 'a')
-                humanized_words.append(humanized_word)
+                humanized_words.append(replace(word, 'a'))
             elif tag.startswith('RB'):
-                humanized_word = replace_word(word, 'r')
-                humanized_words.append(humanized_word)
+                humanized_words.append(replace(word, 'r'))
             else:
                 humanized_words.append(word)
 
@@ -72,7 +115,6 @@ def humanize_text(text):
 
         humanized_sentences.append(humanized_sentence)
 
-
     # Join the humanized sentences back into a single text with symbols
     humanized_text = ''.join(humanized_sentences)
 
@@ -81,8 +123,107 @@ def humanize_text(text):
 
     return humanized_text.strip()
 
-# Example usage
-ai_generated_text = """Government is one of the most foundational institutions in human civilization. At its core, a government is an organized system by which a community, state, or nation is governed. It is responsible for maintaining order, enforcing laws, ensuring security, and providing essential services to its citizens. Governments exist to manage public resources, settle disputes, and establish frameworks that allow society to function cohesively and peacefully. Without government, societies would lack structure, leading to chaos and lawlessness.
+
+# --- Batch processing ---
+
+def read_records(paths, fmt, field):
+    """Yields (record, text): record is the parsed JSON object for JSONL, None for plain lines."""
+    streams = paths or ['-']
+    for path in streams:
+        stream = sys.stdin if path == '-' else open(path, encoding='utf-8')
+        record_format = fmt
+        if record_format == 'auto':
+            record_format = 'jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'lines'
+        try:
+            for line_number, line in enumerate(stream, start=1):
+                line = line.rstrip('\n')
+                if record_format == 'lines':
+                    yield None, line
+                    continue
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise SystemExit(f"{path}:{line_number}: invalid JSON ({e})")
+                if not isinstance(record, dict):
+                    raise SystemExit(f"{path}:{line_number}: expected a JSON object, got {type(record).__name__}")
+                yield record, str(record.get(field, ''))
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+
+def _process(item):
+    record, text, output_field = item
+    humanized = humanize_text(text) if text.strip() else text
+    if record is None:
+        return humanized.replace('\n', ' ')
+    return json.dumps({**record, output_field: humanized}, ensure_ascii=False)
+
+
+def _init_worker():
+    ensure_nltk_data()
+
+
+def run_batch(items, out, processes, chunksize):
+    """
+    Humanizes `items` on a process pool, writing each output line in input order.
+    Input is fed one window at a time so memory stays bounded however large it is.
+    """
+    window = max(1, processes * chunksize * 4)
+    count = 0
+    started = time.perf_counter()
+    with multiprocessing.Pool(processes, initializer=_init_worker) as pool:
+        items = iter(items)
+        while True:
+            batch = list(itertools.islice(items, window))
+            if not batch:
+                break
+            for line in pool.imap(_process, batch, chunksize):
+                out.write(line + '\n')
+                count += 1
+            out.flush()
+    return count, time.perf_counter() - started
+
+
+def benchmark(texts, processes, chunksize):
+    """Times the original single-process, unmemoized path against the batch path on the same texts."""
+    print(f"Benchmarking on {len(texts)} records...", file=sys.stderr)
+
+    started = time.perf_counter()
+    baseline = [humanize_text(text, replace=_replace_word_uncached) for text in texts]
+    baseline_seconds = time.perf_counter() - started
+
+    replace_word.cache_clear()
+    started = time.perf_counter()
+    memoized = [humanize_text(text) for text in texts]
+    memoized_seconds = time.perf_counter() - started
+
+    class _Collect:
+        def __init__(self):
+            self.lines = []
+
+        def write(self, line):
+            self.lines.append(line.rstrip('\n'))
+
+        def flush(self):
+            pass
+
+    collected = _Collect()
+    _, pooled_seconds = run_batch(((None, text, None) for text in texts), collected, processes, chunksize)
+
+    same = [text.replace('\n', ' ') for text in baseline] == collected.lines and baseline == memoized
+    for label, seconds in (('original (1 process, no memo)', baseline_seconds),
+                           ('memoized (1 process)', memoized_seconds),
+                           (f'memoized + pool ({processes} processes)', pooled_seconds)):
+        print(f"{label:<36} {seconds:8.2f}s  {len(texts) / seconds:9.1f} records/s "
+              f"({baseline_seconds / seconds:.1f}x)", file=sys.stderr)
+    print(f"Outputs identical: {'yes' if same else 'NO'}", file=sys.stderr)
+    return same
+
+
+SAMPLE_TEXT = """Government is one of the most foundational institutions in human civilization. At its core, a government is an organized system by which a community, state, or nation is governed. It is responsible for maintaining order, enforcing laws, ensuring security, and providing essential services to its citizens. Governments exist to manage public resources, settle disputes, and establish frameworks that allow society to function cohesively and peacefully. Without government, societies would lack structure, leading to chaos and lawlessness.
 
 Governments can take various forms depending on the political philosophy and historical context of a country. The most common forms include democracies, monarchies, authoritarian regimes, and communistic systems. In democracies, power is held by the people, either directly or through elected representatives. This system emphasizes participation, individual freedoms, and equal rights. In contrast, authoritarian governments centralize power in the hands of a single ruler or a small elite, often restricting civil liberties. Monarchies, once the dominant form of government, rely on hereditary succession, with power passed down through royal families. Modern monarchies are often constitutional, meaning the monarch's powers are limited by law. Communist governments seek to eliminate class distinctions by placing control of all resources in the hands of the state, ideally representing the will of the working class.
 
@@ -93,6 +234,47 @@ A good government operates transparently and is accountable to its people. In de
 The role of government continues to evolve, especially in the face of global challenges such as climate change, pandemics, economic inequality, and technological disruption. Modern governments must balance national interests with global cooperation, adapt to digital innovation, and meet the growing expectations of an informed and connected populace.
 
 In conclusion, government is an indispensable structure that enables organized society to function. It upholds the rule of law, protects rights, delivers services, and fosters progress. While its form may vary, its purpose remains largely the same: to serve the public good and create conditions where people can live safely, freely, and with dignity."""
-print("here's the result!")
-humanized_text = humanize_text(ai_generated_text)
-print(humanized_text)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Humanize newline-delimited or JSONL text in parallel.")
+    parser.add_argument('inputs', nargs='*', help="Input files ('-' or nothing for stdin).")
+    parser.add_argument('-o', '--output', help="Output file (default: stdout).")
+    parser.add_argument('--format', choices=['auto', 'lines', 'jsonl'], default='auto',
+                        help="Input format; 'auto' treats .jsonl/.ndjson files as JSONL and everything else as lines.")
+    parser.add_argument('--field', default='text', help="JSONL field to humanize.")
+    parser.add_argument('--output-field', default=None, help="JSONL field to write the result to (default: --field).")
+    parser.add_argument('-j', '--processes', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunksize', type=int, default=64, help="Records sent to a worker at a time.")
+    parser.add_argument('--benchmark', action='store_true',
+                        help="Compare throughput with the original implementation instead of writing output.")
+    parser.add_argument('--limit', type=int, default=2000, help="Records used by --benchmark.")
+    parser.add_argument('--demo', action='store_true', help="Humanize the built-in sample text.")
+    args = parser.parse_args(argv)
+
+    ensure_nltk_data()
+
+    if args.demo:
+        print("here's the result!")
+        print(humanize_text(SAMPLE_TEXT))
+        return 0
+
+    records = read_records(args.inputs, args.format, args.field)
+    if args.benchmark:
+        texts = [text for _, text in itertools.islice(records, args.limit)]
+        return 0 if benchmark(texts, args.processes, args.chunksize) else 1
+
+    output_field = args.output_field or args.field
+    items = ((record, text, output_field) for record, text in records)
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        count, seconds = run_batch(items, out, args.processes, args.chunksize)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"Humanized {count} records in {seconds:.1f}s ({count / max(seconds, 1e-9):.1f}/s).", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())